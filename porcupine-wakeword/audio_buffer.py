@@ -0,0 +1,216 @@
+"""Preallocated audio buffers for framing PCM without per-frame copies."""
+import math
+from typing import Optional
+
+
+class AudioRingBuffer:
+    """Fixed-capacity ring buffer that hands out whole frames as zero-copy views.
+
+    The backing store is twice the capacity and every write lands in both
+    halves, so any run of buffered frames is contiguous in memory even when
+    it wraps around the end of the ring. Reads are therefore plain
+    memoryview slices, never copies.
+
+    When a write would exceed ``max_frames`` of backlog, whole frames are
+    dropped from the oldest end (drop-oldest) and counted in
+    ``dropped_samples``.
+    """
+
+    def __init__(self, frame_length: int, max_frames: int, sample_width: int = 2) -> None:
+        if frame_length < 1 or max_frames < 1:
+            raise ValueError("frame_length and max_frames must be positive")
+
+        self.frame_length = frame_length
+        self.sample_width = sample_width
+        self.frame_bytes = frame_length * sample_width
+        self.capacity = self.frame_bytes * max_frames
+        self._buffer = bytearray(2 * self.capacity)
+        self._view = memoryview(self._buffer)
+
+        # Absolute byte positions since the last clear()
+        self._read = 0
+        self._write = 0
+        self.dropped_samples = 0
+
+    @classmethod
+    def for_duration(
+        cls, frame_length: int, sample_rate: int, max_backlog_ms: float
+    ) -> "AudioRingBuffer":
+        """Buffer holding at least ``max_backlog_ms`` of audio (and one frame)."""
+        max_frames = math.ceil(max_backlog_ms * sample_rate / 1000 / frame_length)
+        return cls(frame_length, max(1, max_frames))
+
+    def __len__(self) -> int:
+        """Number of buffered bytes."""
+        return self._write - self._read
+
+    @property
+    def available_frames(self) -> int:
+        return len(self) // self.frame_bytes
+
+    @property
+    def read_position(self) -> int:
+        """Stream sample index of the next sample to be read (drops included)."""
+        return self._read // self.sample_width
+
+    def clear(self) -> None:
+        self._read = 0
+        self._write = 0
+
+    def write(self, data) -> int:
+        """Append PCM bytes, dropping the oldest frames on overflow.
+
+        Returns the number of samples dropped by this write.
+        """
+        data = memoryview(data).cast("B")
+        size = len(data)
+        if size == 0:
+            return 0
+
+        dropped = 0
+        overflow = len(self) + size - self.capacity
+        if overflow > 0:
+            # Drop whole frames so the stream stays sample aligned
+            drop = math.ceil(overflow / self.frame_bytes) * self.frame_bytes
+            from_buffer = min(drop, len(self))
+            self._read += from_buffer
+            from_data = drop - from_buffer
+            if from_data:
+                data = data[from_data:]
+                self._read += from_data
+                self._write += from_data
+            dropped = drop // self.sample_width
+            self.dropped_samples += dropped
+            size = len(data)
+
+        start = self._write % self.capacity
+        first = min(size, self.capacity - start)
+        self._copy_in(start, data[:first])
+        if first < size:
+            self._copy_in(0, data[first:])
+
+        self._write += size
+        return dropped
+
+    def _copy_in(self, offset: int, data: memoryview) -> None:
+        end = offset + len(data)
+        self._buffer[offset:end] = data
+        self._buffer[offset + self.capacity : end + self.capacity] = data
+
+    def read_frames(self, max_frames: int = 0) -> memoryview:
+        """Consume up to ``max_frames`` whole frames (all if 0) as one int16 view.
+
+        The view aliases the ring and is only valid until the next write.
+        """
+        count = self.available_frames
+        if max_frames > 0:
+            count = min(count, max_frames)
+
+        start = self._read % self.capacity
+        size = count * self.frame_bytes
+        self._read += size
+        return self._view[start : start + size].cast("h")
+
+    def peek_frames(self, max_frames: int = 0) -> memoryview:
+        """Like ``read_frames`` but without consuming the frames."""
+        position = self._read
+        frames = self.read_frames(max_frames)
+        self._read = position
+        return frames
+
+    def skip_frames(self, count: int) -> int:
+        """Discard up to ``count`` of the oldest whole frames; returns how many."""
+        count = min(count, self.available_frames)
+        self._read += count * self.frame_bytes
+        return count
+
+    def frames(self):
+        """Yield each buffered whole frame as a zero-copy int16 view."""
+        while self.available_frames:
+            yield self.read_frames(1)
+
+
+class SampleClock:
+    """Maps stream sample positions to milliseconds on the client's clock.
+
+    The clock is anchored at the AudioStart timestamp and re-anchored on
+    every AudioChunk that carries a timestamp, so positions are reported in
+    the same time base the satellite and Home Assistant use.
+    """
+
+    def __init__(self, sample_rate: int) -> None:
+        self.sample_rate = sample_rate
+        self.samples_received = 0
+        self._anchor_sample = 0
+        self._anchor_ms = 0
+
+    def reset(self, timestamp_ms: Optional[int] = None) -> None:
+        """Start a new stream at ``timestamp_ms`` (0 if unknown)."""
+        self.samples_received = 0
+        self._anchor_sample = 0
+        self._anchor_ms = timestamp_ms or 0
+
+    def add_chunk(self, num_samples: int, timestamp_ms: Optional[int] = None) -> None:
+        """Account for a received chunk that starts at ``timestamp_ms``."""
+        if timestamp_ms is not None:
+            self._anchor_sample = self.samples_received
+            self._anchor_ms = timestamp_ms
+        self.samples_received += num_samples
+
+    def to_ms(self, sample: int) -> int:
+        """Timestamp in milliseconds of the stream position ``sample``."""
+        return self._anchor_ms + (
+            (sample - self._anchor_sample) * 1000 // self.sample_rate
+        )
+
+
+class AudioHistory:
+    """Fixed-size circular history of the most recent PCM bytes.
+
+    Used to keep the last few seconds of audio per session so the audio
+    that triggered a detection can be exported. Appends overwrite the
+    oldest audio; nothing is allocated after construction except by
+    ``snapshot``.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._buffer = bytearray(max_bytes)
+        self._write = 0
+        self._size = 0
+
+    @classmethod
+    def for_duration(
+        cls, sample_rate: int, seconds: float, sample_width: int = 2
+    ) -> "AudioHistory":
+        return cls(max(sample_width, int(seconds * sample_rate) * sample_width))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        self._write = 0
+        self._size = 0
+
+    def append(self, data) -> None:
+        data = memoryview(data).cast("B")
+        if len(data) >= self.max_bytes:
+            self._buffer[:] = data[len(data) - self.max_bytes :]
+            self._write = 0
+            self._size = self.max_bytes
+            return
+
+        first = min(len(data), self.max_bytes - self._write)
+        self._buffer[self._write : self._write + first] = data[:first]
+        rest = len(data) - first
+        if rest:
+            self._buffer[:rest] = data[first:]
+        self._write = (self._write + len(data)) % self.max_bytes
+        self._size = min(self.max_bytes, self._size + len(data))
+
+    def snapshot(self) -> bytes:
+        """Copy of the buffered audio, oldest first."""
+        start = (self._write - self._size) % self.max_bytes
+        if start + self._size <= self.max_bytes:
+            return bytes(self._buffer[start : start + self._size])
+        return bytes(self._buffer[start:]) + bytes(self._buffer[: self._write])
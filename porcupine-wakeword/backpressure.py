@@ -0,0 +1,97 @@
+"""Real-time lag tracking and overload policies for detection sessions."""
+import math
+from typing import Optional
+
+from audio_buffer import AudioRingBuffer
+from vad import dbfs_to_power, frame_power
+
+OVERLOAD_POLICIES = ("drop_oldest", "skip_silence", "shed")
+
+# Satellite clocks may run this much slower than ours without counting as lag
+CLOCK_DRIFT = 0.005
+
+
+class LagTracker:
+    """How far a session's processing runs behind real time.
+
+    The stream origin is the wall time at which its first sample would
+    have been captured if the audio arrived in real time. It moves
+    earlier whenever audio arrives sooner than that (a burst after network
+    jitter, a client sending faster than real time) and relaxes by
+    ``CLOCK_DRIFT`` so a slightly slow satellite clock does not add up to
+    lag over hours. Lag is the wall time since the origin minus the audio
+    consumed so far (processed, skipped or dropped), so audio waiting in
+    the ring buffer or still queued in the socket both count.
+    """
+
+    def __init__(self, sample_rate: int) -> None:
+        self.sample_rate = sample_rate
+        self.reset()
+
+    def reset(self) -> None:
+        self._origin: Optional[float] = None
+        self._updated = 0.0
+        self._received = 0
+
+    def receive(self, num_samples: int, now: float) -> None:
+        """Account for ``num_samples`` of audio received at ``now``."""
+        self._received += num_samples
+        start = now - self._received / self.sample_rate
+        if self._origin is None:
+            self._origin = start
+        else:
+            relaxed = self._origin + CLOCK_DRIFT * (now - self._updated)
+            self._origin = min(relaxed, start)
+        self._updated = now
+
+    def lag(self, consumed_samples: int, now: float) -> float:
+        """Seconds of audio not yet consumed that real time has already passed."""
+        if self._origin is None:
+            return 0.0
+        return max(0.0, now - self._origin - consumed_samples / self.sample_rate)
+
+
+class OverloadPolicy:
+    """What a session does with its backlog once it lags more than ``max_lag``.
+
+    ``drop_oldest`` drops the oldest buffered frames to bring the lag back
+    to half the limit. ``skip_silence`` only drops the quiet frames (below
+    ``silence_dbfs``) at the head of the backlog, keeping speech, and falls
+    back to ``drop_oldest`` beyond twice the limit. ``shed`` ends the
+    session so the capacity goes to the others.
+    """
+
+    def __init__(
+        self,
+        policy: str = "drop_oldest",
+        max_lag: float = 0.5,
+        silence_dbfs: float = -45.0,
+    ) -> None:
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+
+        self.policy = policy
+        self.max_lag = max_lag
+        self._silence = dbfs_to_power(silence_dbfs)
+
+    def relieve(
+        self, buffer: AudioRingBuffer, lag: float, sample_rate: int
+    ) -> tuple[Optional[str], int]:
+        """Apply the policy to ``buffer`` for a session ``lag`` seconds behind.
+
+        Returns the action taken (None within the limit) and the number of
+        frames it dropped. The caller ends the session on ``shed``.
+        """
+        if lag <= self.max_lag:
+            return None, 0
+        if self.policy == "shed":
+            return "shed", 0
+
+        excess = math.ceil((lag - self.max_lag / 2) * sample_rate / buffer.frame_length)
+        if self.policy == "skip_silence" and lag <= 2 * self.max_lag:
+            quiet = frame_power(buffer.peek_frames(excess), buffer.frame_length)
+            quiet = quiet < self._silence
+            leading = len(quiet) if quiet.all() else int(quiet.argmin())
+            return "skip_silence", buffer.skip_frames(leading)
+
+        return "drop_oldest", buffer.skip_frames(excess)
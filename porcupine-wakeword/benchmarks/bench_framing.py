@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-frame framing overhead, legacy bytearray slicing vs ring buffer.
+
+Feeds the same PCM stream through both framing paths using a range of chunk
+sizes (a typical 20 ms satellite chunk up to a multi-second burst after a
+network hiccup) and reports the cost per 512-sample frame. Inference is not
+included; only buffering and frame extraction are measured.
+
+    python benchmarks/bench_framing.py
+"""
+import argparse
+import struct
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audio_buffer import AudioRingBuffer  # noqa: E402
+
+FRAME_LENGTH = 512
+SAMPLE_RATE = 16000
+
+
+def legacy_framing(chunks: list[bytes]) -> int:
+    """The original _process_audio_chunk framing: slice-copy and struct.unpack."""
+    audio_buffer = bytearray()
+    frame_length_bytes = FRAME_LENGTH * 2
+    frames = 0
+    for chunk in chunks:
+        audio_buffer.extend(chunk)
+        while len(audio_buffer) >= frame_length_bytes:
+            frame_bytes = audio_buffer[:frame_length_bytes]
+            audio_buffer = audio_buffer[frame_length_bytes:]
+            frame = struct.unpack(f"{FRAME_LENGTH}h", frame_bytes)
+            frames += len(frame) // FRAME_LENGTH
+    return frames
+
+
+def ring_framing(chunks: list[bytes], max_backlog_ms: float) -> int:
+    """Ring buffer framing: one write per chunk, zero-copy int16 frame views."""
+    ring = AudioRingBuffer.for_duration(FRAME_LENGTH, SAMPLE_RATE, max_backlog_ms)
+    frames = 0
+    for chunk in chunks:
+        ring.write(chunk)
+        for frame in ring.frames():
+            frames += len(frame) // FRAME_LENGTH
+    return frames
+
+
+def _bench(func, *args, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    frames = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, frames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0, help="Audio per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    total_bytes = int(args.seconds * SAMPLE_RATE) * 2
+    stream = bytes(range(256)) * (total_bytes // 256 + 1)
+    stream = stream[:total_bytes]
+
+    print(f"{'chunk':>10} {'legacy ns/frame':>16} {'ring ns/frame':>14} {'speedup':>8}")
+    for chunk_ms in (20, 100, 1000, 5000):
+        chunk_bytes = int(chunk_ms * SAMPLE_RATE / 1000) * 2
+        chunks = [
+            stream[i : i + chunk_bytes] for i in range(0, len(stream), chunk_bytes)
+        ]
+        # Backlog large enough that neither path drops audio
+        legacy_s, legacy_frames = _bench(legacy_framing, chunks, repeat=args.repeat)
+        ring_s, ring_frames = _bench(
+            ring_framing, chunks, chunk_ms + 100, repeat=args.repeat
+        )
+        assert legacy_frames == ring_frames, (legacy_frames, ring_frames)
+
+        legacy_ns = legacy_s / legacy_frames * 1e9
+        ring_ns = ring_s / ring_frames * 1e9
+        print(
+            f"{chunk_ms:>8}ms {legacy_ns:>16.0f} {ring_ns:>14.0f} "
+            f"{legacy_ns / ring_ns:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
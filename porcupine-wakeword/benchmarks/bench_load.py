@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Load test: N concurrent Wyoming clients streaming audio with injected wake words.
+
+Each client sends Describe, Detect and AudioStart, then streams AudioChunks
+at real-time pace (or faster with --speed, or unpaced with --speed 0) from
+a background WAV file, or quiet noise, with a wake word clip mixed in at
+known offsets. Reports throughput, Detection latency (Detection received
+minus the send time of the chunk holding the detected audio), missed and
+unexpected detections, and sessions rejected by the server. Results can be
+saved as JSON to compare releases.
+
+Start a server locally first, for example:
+
+    python wyoming_porcupine.py --access-key KEY --keywords albert \\
+        --keyword-paths ../models/albert.ppn --pool-size 64
+    python benchmarks/bench_load.py --clients 32 --wake albert.wav --json load.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import wave
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from wyoming.audio import AudioChunk, AudioStart, AudioStop
+from wyoming.client import AsyncTcpClient
+from wyoming.error import Error
+from wyoming.info import Describe, Info
+from wyoming.wake import Detect, Detection
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from resample import StreamingConverter  # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def load_wav(path: str) -> np.ndarray:
+    """Read any PCM WAV file as 16 kHz mono int16."""
+    with wave.open(path, "rb") as wav:
+        converter = StreamingConverter(
+            wav.getframerate(), wav.getsampwidth(), wav.getnchannels()
+        )
+        audio = converter.process(wav.readframes(wav.getnframes()))
+    return np.frombuffer(audio, dtype="<i2")
+
+
+def build_stream(
+    background: Optional[np.ndarray],
+    wake: Optional[np.ndarray],
+    seconds: float,
+    first_wake_s: float,
+    wake_every_s: float,
+    seed: int,
+) -> tuple[bytes, list[tuple[int, int]]]:
+    """Mix the wake clip into the background; returns PCM and (start, end) ms."""
+    num_samples = int(seconds * SAMPLE_RATE)
+    if background is not None and len(background):
+        audio = np.resize(background, num_samples).astype(np.int32)
+    else:
+        rng = np.random.default_rng(seed)
+        audio = rng.normal(0, 100, num_samples).astype(np.int32)
+
+    injections = []
+    if wake is not None and len(wake) and wake_every_s > 0:
+        start = int(first_wake_s * SAMPLE_RATE)
+        while start + len(wake) <= num_samples:
+            audio[start : start + len(wake)] += wake
+            injections.append(
+                (
+                    start * 1000 // SAMPLE_RATE,
+                    (start + len(wake)) * 1000 // SAMPLE_RATE,
+                )
+            )
+            start += int(wake_every_s * SAMPLE_RATE)
+
+    return audio.clip(-32768, 32767).astype("<i2").tobytes(), injections
+
+
+async def run_client(
+    index: int,
+    args: argparse.Namespace,
+    audio: bytes,
+    injections: list[tuple[int, int]],
+    start_delay: float,
+) -> dict:
+    """Stream one session and collect what the server sent back."""
+    await asyncio.sleep(start_delay)
+    result: dict = {
+        "client": index,
+        "connected": False,
+        "rejected": False,
+        "detections": [],
+        "audio_seconds": 0.0,
+    }
+    chunk_samples = SAMPLE_RATE * args.chunk_ms // 1000
+    chunk_bytes = chunk_samples * 2
+    send_times: list[float] = []
+
+    try:
+        async with AsyncTcpClient(args.host, args.port) as client:
+            result["connected"] = True
+            await client.write_event(Describe().event())
+            while True:
+                event = await client.read_event()
+                if event is None:
+                    raise ConnectionError("Server closed the connection")
+                if Info.is_type(event.type):
+                    break
+
+            async def read_events() -> None:
+                while True:
+                    event = await client.read_event()
+                    if event is None:
+                        return
+                    received = time.perf_counter()
+                    if Detection.is_type(event.type):
+                        detection = Detection.from_event(event)
+                        timestamp = detection.timestamp or 0
+                        chunk_index = min(
+                            timestamp // args.chunk_ms, len(send_times) - 1
+                        )
+                        latency = (
+                            (received - send_times[chunk_index]) * 1000
+                            if chunk_index >= 0
+                            else None
+                        )
+                        result["detections"].append(
+                            {
+                                "name": detection.name,
+                                "timestamp_ms": timestamp,
+                                "latency_ms": latency,
+                            }
+                        )
+                    elif Error.is_type(event.type):
+                        result["rejected"] = True
+                        result["error"] = Error.from_event(event).text
+                        return
+
+            reader = asyncio.create_task(read_events())
+            names = [args.name] if args.name else None
+            await client.write_event(Detect(names=names).event())
+            await client.write_event(
+                AudioStart(rate=SAMPLE_RATE, width=2, channels=1, timestamp=0).event()
+            )
+
+            started = time.perf_counter()
+            for chunk_index, offset in enumerate(range(0, len(audio), chunk_bytes)):
+                if reader.done():
+                    break
+                if args.speed > 0:
+                    due = started + chunk_index * args.chunk_ms / 1000 / args.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                send_times.append(time.perf_counter())
+                chunk = AudioChunk(
+                    rate=SAMPLE_RATE,
+                    width=2,
+                    channels=1,
+                    audio=audio[offset : offset + chunk_bytes],
+                    timestamp=chunk_index * args.chunk_ms,
+                )
+                await client.write_event(chunk.event())
+                result["audio_seconds"] += args.chunk_ms / 1000
+
+            # Give the server time to report detections near the end
+            await asyncio.sleep(args.grace)
+            if not reader.done():
+                await client.write_event(AudioStop().event())
+            reader.cancel()
+            result["stream_seconds"] = time.perf_counter() - started
+    except (ConnectionError, OSError) as e:
+        result["error"] = str(e)
+
+    # Match detections to injected wake words by stream timestamp
+    matched = set()
+    for detection in result["detections"]:
+        detection["expected"] = False
+        for i, (start_ms, end_ms) in enumerate(injections):
+            if i not in matched and start_ms <= detection["timestamp_ms"] <= (
+                end_ms + args.tolerance_ms
+            ):
+                matched.add(i)
+                detection["expected"] = True
+                break
+
+    result["injected"] = len(injections) if result["connected"] else 0
+    result["detected"] = len(matched)
+    result["unexpected"] = sum(1 for d in result["detections"] if not d["expected"])
+    return result
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+def summarize(results: list[dict], wall_seconds: float) -> dict:
+    latencies = [
+        d["latency_ms"]
+        for r in results
+        for d in r["detections"]
+        if d["expected"] and d["latency_ms"] is not None
+    ]
+    injected = sum(r["injected"] for r in results if not r["rejected"])
+    detected = sum(r["detected"] for r in results if not r["rejected"])
+    audio_seconds = sum(r["audio_seconds"] for r in results)
+    return {
+        "clients": len(results),
+        "connected": sum(r["connected"] for r in results),
+        "rejected": sum(r["rejected"] for r in results),
+        "errors": sum(1 for r in results if "error" in r and not r["rejected"]),
+        "injected": injected,
+        "detected": detected,
+        "missed": injected - detected,
+        "unexpected": sum(r["unexpected"] for r in results),
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p99_ms": _percentile(latencies, 99),
+        "latency_max_ms": max(latencies) if latencies else None,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall_seconds,
+        "realtime_factor": audio_seconds / wall_seconds if wall_seconds else None,
+    }
+
+
+def _fmt(value: Optional[float], unit: str = "") -> str:
+    return "-" if value is None else f"{value:.1f}{unit}"
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    background = load_wav(args.background) if args.background else None
+    wake = load_wav(args.wake) if args.wake else None
+    if wake is None:
+        print("No --wake clip given: measuring throughput only")
+
+    streams = [
+        build_stream(
+            background,
+            wake,
+            args.seconds,
+            args.first_wake,
+            args.wake_every,
+            seed=i,
+        )
+        for i in range(args.clients)
+    ]
+
+    print(
+        f"{args.clients} clients -> {args.host}:{args.port}, "
+        f"{args.seconds:.0f}s each at {'max' if args.speed <= 0 else args.speed}x"
+    )
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            run_client(i, args, audio, injections, args.ramp * i / args.clients)
+            for i, (audio, injections) in enumerate(streams)
+        )
+    )
+    wall_seconds = time.perf_counter() - started
+
+    summary = summarize(results, wall_seconds)
+    print(
+        f"connected {summary['connected']}/{summary['clients']}, "
+        f"rejected {summary['rejected']}, errors {summary['errors']}"
+    )
+    print(
+        f"wake words: {summary['detected']}/{summary['injected']} detected, "
+        f"{summary['missed']} missed, {summary['unexpected']} unexpected"
+    )
+    print(
+        f"latency p50 {_fmt(summary['latency_p50_ms'], ' ms')}, "
+        f"p99 {_fmt(summary['latency_p99_ms'], ' ms')}, "
+        f"max {_fmt(summary['latency_max_ms'], ' ms')}"
+    )
+    print(
+        f"throughput: {summary['audio_seconds']:.0f}s audio in "
+        f"{wall_seconds:.1f}s ({_fmt(summary['realtime_factor'], 'x')} real time)"
+    )
+
+    return {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("json",)
+        },
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "summary": summary,
+        "clients": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10400)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Audio per client")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Pace relative to real time; 0 sends as fast as possible",
+    )
+    parser.add_argument("--chunk-ms", type=int, default=64, help="Audio per chunk")
+    parser.add_argument("--background", help="WAV file looped as background audio")
+    parser.add_argument("--wake", help="WAV clip of the wake word to inject")
+    parser.add_argument("--name", help="Wake word name sent in Detect")
+    parser.add_argument(
+        "--first-wake", type=float, default=2.0, help="Seconds to first injection"
+    )
+    parser.add_argument(
+        "--wake-every", type=float, default=10.0, help="Seconds between injections"
+    )
+    parser.add_argument(
+        "--tolerance-ms",
+        type=int,
+        default=1000,
+        help="How long after the clip ends a detection still counts",
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=1.0, help="Seconds over which clients connect"
+    )
+    parser.add_argument(
+        "--grace", type=float, default=1.0, help="Wait for detections after streaming"
+    )
+    parser.add_argument("--json", help="Save the results to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
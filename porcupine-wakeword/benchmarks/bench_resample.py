@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Benchmark: streaming format conversion cost for many concurrent satellites.
+
+Simulates N satellites each sending 48 kHz stereo 16-bit audio in 20 ms
+chunks (the worst common case) and converts every stream to 16 kHz mono
+with one StreamingConverter per stream, interleaving chunks round-robin
+like the server does. Reports the share of one core needed per stream and
+how many streams one core could convert in real time.
+
+    python benchmarks/bench_resample.py --streams 32
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from resample import StreamingConverter  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Audio per stream")
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--chunk-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    samples = int(args.seconds * args.rate)
+    audio = (
+        rng.normal(0, 3000, samples * args.channels).clip(-32768, 32767).astype("<i2")
+    )
+    chunk_bytes = args.rate * args.chunk_ms // 1000 * args.channels * 2
+    raw = audio.tobytes()
+    chunks = [raw[i : i + chunk_bytes] for i in range(0, len(raw), chunk_bytes)]
+
+    converters = [
+        StreamingConverter(args.rate, 2, args.channels) for _ in range(args.streams)
+    ]
+
+    start = time.perf_counter()
+    output_bytes = 0
+    for chunk in chunks:
+        for converter in converters:
+            output_bytes += len(converter.process(chunk))
+    elapsed = time.perf_counter() - start
+
+    audio_seconds = args.seconds * args.streams
+    core_share = elapsed / audio_seconds
+    print(
+        f"{args.streams} streams x {args.seconds:.0f}s of {args.rate} Hz, "
+        f"{args.channels} ch, {args.chunk_ms} ms chunks"
+    )
+    print(
+        f"  converted {output_bytes / 2 / 16000:.0f}s of 16 kHz audio in {elapsed:.2f}s"
+    )
+    print(f"  per stream: {core_share * 100:.2f}% of one core")
+    print(f"  real-time streams per core: {1 / core_share:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Startup benchmark: time from process start to bound port, Describe and ready engines.
+
+Starts the server as a subprocess with the given arguments, a free port and
+a metrics endpoint, then measures three times from process launch: the
+Wyoming port accepting connections, the first Describe answered, and the
+engines ready (the wyoming_porcupine_models_ready gauge reaching 1). The
+first run uses an empty cache directory (cold); later runs reuse it (warm),
+as a container restart would. Results can be saved as JSON to track
+time-to-ready across releases.
+
+Server arguments go after ``--``:
+
+    python benchmarks/bench_startup.py --runs 5 -- --access-key KEY \\
+        --keywords albert --keyword-paths ../models/albert.ppn
+"""
+import argparse
+import asyncio
+import json
+import platform
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from wyoming.client import AsyncTcpClient
+from wyoming.info import Describe
+
+SERVER = Path(__file__).resolve().parent.parent / "wyoming_porcupine.py"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _describe(port: int) -> bool:
+    try:
+        async with AsyncTcpClient("127.0.0.1", port) as client:
+            await client.write_event(Describe().event())
+            event = await asyncio.wait_for(client.read_event(), 1.0)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    return event is not None and event.type == "info"
+
+
+async def _models_ready(port: int) -> bool:
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        return False
+    try:
+        writer.write(b"GET /metrics HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        body = (await reader.read()).decode("utf-8", "replace")
+    finally:
+        writer.close()
+    return "\nwyoming_porcupine_models_ready 1" in body
+
+
+async def measure(server_args: list[str], cache_dir: str, timeout: float) -> dict:
+    """Launch the server once and time each startup milestone."""
+    port, metrics_port = _free_port(), _free_port()
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        str(SERVER),
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--metrics-port",
+        str(metrics_port),
+        "--cache-dir",
+        cache_dir,
+        *server_args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    result: dict[str, Optional[float]] = {
+        "bound_s": None,
+        "describe_s": None,
+        "ready_s": None,
+    }
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.returncode is not None:
+                break
+            now = time.perf_counter() - started
+            if result["bound_s"] is None:
+                try:
+                    with socket.create_connection(("127.0.0.1", port), 0.1):
+                        result["bound_s"] = now
+                except OSError:
+                    pass
+            if result["bound_s"] is not None and result["describe_s"] is None:
+                if await _describe(port):
+                    result["describe_s"] = time.perf_counter() - started
+            if result["describe_s"] is not None and await _models_ready(metrics_port):
+                result["ready_s"] = time.perf_counter() - started
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+    return result
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f} s"
+
+
+async def main_async(args: argparse.Namespace, server_args: list[str]) -> dict:
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = args.cache_dir or tmp_dir
+        for run in range(args.runs):
+            result = await measure(server_args, cache_dir, args.timeout)
+            result["cache"] = "cold" if run == 0 and not args.cache_dir else "warm"
+            runs.append(result)
+            print(
+                f"run {run + 1} ({result['cache']}): bound {_fmt(result['bound_s'])}, "
+                f"describe {_fmt(result['describe_s'])}, "
+                f"ready {_fmt(result['ready_s'])}"
+            )
+
+    return {
+        "config": {"runs": args.runs, "server_args": server_args},
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    server_args: list[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, server_args = argv[:split], argv[split + 1 :]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Server starts to time")
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="Seconds to wait for each start"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Startup cache directory to use (default: a fresh one, so the "
+        "first run is cold)",
+    )
+    parser.add_argument("--json", help="Save the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args, server_args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Asynchronous spool that saves detection clips as WAV files."""
+import asyncio
+import logging
+import wave
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import metrics
+
+_LOGGER = logging.getLogger("wyoming_porcupine.clips")
+
+
+class ClipSpool:
+    """Bounded queue of detection clips written to a spool directory.
+
+    ``submit`` never blocks: clips are queued and written by a background
+    task on a worker thread, and dropped (and counted) if the queue is
+    full. After every write the oldest clips are removed until the spool
+    is within ``max_files`` and ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: int = 16000,
+        sample_width: int = 2,
+        max_files: int = 500,
+        max_bytes: int = 200 * 1024 * 1024,
+        queue_size: int = 16,
+    ) -> None:
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._files: deque[tuple[Path, int]] = deque()
+        self._total_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self._scan)
+        self._task = asyncio.create_task(self._run())
+        _LOGGER.info(
+            f"Saving detection clips to {self.directory} "
+            f"({len(self._files)} existing, max {self.max_files} files)"
+        )
+
+    def submit(self, keyword: str, timestamp_ms: int, audio: bytes) -> bool:
+        """Queue a clip for writing; returns False if it was dropped."""
+        try:
+            self._queue.put_nowait((keyword, timestamp_ms, audio))
+        except asyncio.QueueFull:
+            metrics.CLIPS_DROPPED.inc()
+            _LOGGER.warning("Clip queue full, dropping detection clip")
+            return False
+        return True
+
+    async def close(self) -> None:
+        """Write the clips still queued, then stop."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            keyword, timestamp_ms, audio = await self._queue.get()
+            try:
+                await asyncio.to_thread(self._write, keyword, timestamp_ms, audio)
+                metrics.CLIPS_SAVED.inc()
+            except Exception as e:
+                _LOGGER.error(f"Failed to save detection clip: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _scan(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.glob("*.wav"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._files.append((path, size))
+            self._total_bytes += size
+        self._rotate()
+
+    def _write(self, keyword: str, timestamp_ms: int, audio: bytes) -> None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = self.directory / f"{timestamp}_{keyword}_{timestamp_ms}ms.wav"
+        with wave.open(str(path), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(audio)
+
+        size = path.stat().st_size
+        self._files.append((path, size))
+        self._total_bytes += size
+        self._rotate()
+        _LOGGER.debug(f"Saved detection clip: {path}")
+
+    def _rotate(self) -> None:
+        while self._files and (
+            len(self._files) > self.max_files or self._total_bytes > self.max_bytes
+        ):
+            path, size = self._files.popleft()
+            self._total_bytes -= size
+            path.unlink(missing_ok=True)
@@ -0,0 +1,232 @@
+"""Bounded pool of wake word engines shared by Wyoming connections."""
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+_LOGGER = logging.getLogger("wyoming_porcupine.pool")
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no engine becomes available within the acquire timeout."""
+
+
+class SessionLimit:
+    """Cap on detection sessions across every engine pool of a server.
+
+    Each keyword/sensitivity combination has its own pool, so the pools'
+    sizes alone do not bound the sessions a server runs. A session takes
+    a slot before checking out an engine and returns it afterwards;
+    ``acquire`` waits up to ``acquire_timeout`` seconds for a free slot
+    before raising ``PoolExhaustedError``.
+    """
+
+    def __init__(self, max_sessions: int, acquire_timeout: Optional[float] = None):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+
+        self.max_sessions = max_sessions
+        self._acquire_timeout = acquire_timeout
+        self._active = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _has_slot(self) -> bool:
+        return self._active < self.max_sessions
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            if not self._has_slot():
+                if self._acquire_timeout is not None and self._acquire_timeout <= 0:
+                    raise PoolExhaustedError(
+                        f"All {self.max_sessions} sessions are in use"
+                    )
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(self._has_slot), self._acquire_timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise PoolExhaustedError(
+                        f"No session ended within {self._acquire_timeout}s "
+                        f"({self.max_sessions} in use)"
+                    ) from None
+            self._active += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+
+class EnginePool:
+    """Bounded pool of engines, one checked out per detection session.
+
+    Porcupine keeps per-stream state, so two satellites must never feed the
+    same engine at the same time. Engines are created lazily up to
+    ``max_size`` (``prewarm`` of them at startup) and handed out for the
+    duration of a Detect/AudioStop session. When every engine is in use,
+    ``acquire`` waits up to ``acquire_timeout`` seconds for one to be
+    released before raising ``PoolExhaustedError``.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        max_size: int,
+        prewarm: int = 1,
+        acquire_timeout: Optional[float] = None,
+        name: str = "porcupine",
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.name = name
+        self._factory = factory
+        self._max_size = max_size
+        self._prewarm = max(0, min(prewarm, max_size))
+        self._acquire_timeout = acquire_timeout
+        self._idle: list[Any] = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        """Number of engines created (idle and checked out)."""
+        return self._size
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    async def start(self) -> None:
+        """Create the pre-warmed engines."""
+        for _ in range(self._prewarm - self._size):
+            engine = await asyncio.to_thread(self._factory)
+            async with self._cond:
+                self._size += 1
+                self._idle.append(engine)
+                self._cond.notify()
+
+        _LOGGER.info(
+            f"Engine pool '{self.name}' ready: {self._size} pre-warmed, "
+            f"max {self._max_size}"
+        )
+
+    def _can_checkout(self) -> bool:
+        return self._closed or bool(self._idle) or self._size < self._max_size
+
+    async def acquire(self) -> Any:
+        """Check out an engine, waiting for one if the pool is exhausted."""
+        async with self._cond:
+            if not self._can_checkout():
+                if self._acquire_timeout is not None and self._acquire_timeout <= 0:
+                    raise PoolExhaustedError(
+                        f"All {self._max_size} engines are in use"
+                    )
+
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(self._can_checkout),
+                        self._acquire_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    raise PoolExhaustedError(
+                        f"No engine released within {self._acquire_timeout}s "
+                        f"({self._max_size} in use)"
+                    ) from None
+                finally:
+                    self._waiting -= 1
+
+            if self._closed:
+                raise PoolExhaustedError("Engine pool is closed")
+
+            if self._idle:
+                self._in_use += 1
+                return self._idle.pop()
+
+            # Reserve a slot, then create the engine outside the lock
+            self._size += 1
+
+        try:
+            engine = await asyncio.to_thread(self._factory)
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        async with self._cond:
+            self._in_use += 1
+
+        return engine
+
+    async def release(self, engine: Any) -> None:
+        """Return an engine to the pool, reset for the next session."""
+        async with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+                _delete_engine(engine)
+            else:
+                _reset_engine(engine)
+                self._idle.append(engine)
+            self._cond.notify()
+
+    async def trim(self, count: int) -> int:
+        """Delete up to ``count`` idle engines, least recently used first.
+
+        Returns the number deleted.
+        """
+        async with self._cond:
+            trimmed = self._idle[: max(0, count)]
+            del self._idle[: len(trimmed)]
+            self._size -= len(trimmed)
+            self._cond.notify()
+
+        for engine in trimmed:
+            _delete_engine(engine)
+        return len(trimmed)
+
+    async def close(self) -> None:
+        """Delete idle engines; engines still checked out are deleted on release."""
+        async with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for engine in idle:
+            _delete_engine(engine)
+
+
+def _reset_engine(engine: Any) -> None:
+    # Streaming engines (openWakeWord) keep audio and feature history;
+    # Porcupine handles have no reset and carry only a frame of state
+    reset = getattr(engine, "reset", None)
+    if reset is not None:
+        reset()
+
+
+def _delete_engine(engine: Any) -> None:
+    try:
+        engine.delete()
+    except Exception as e:
+        _LOGGER.warning(f"Failed to delete engine: {e}")
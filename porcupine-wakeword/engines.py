@@ -0,0 +1,466 @@
+"""Wake word engine backends: Porcupine and openWakeWord behind one interface.
+
+Every engine handed to a session looks like a Porcupine handle:
+``frame_length``, ``sample_rate``, ``process(frame)`` returning the index
+of the detected keyword or -1, and ``delete()``. A keyword file's suffix
+selects its backend: ``.ppn`` for Porcupine, ``.tflite``/``.onnx`` for
+openWakeWord.
+"""
+import functools
+import importlib.util
+import logging
+import math
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+_LOGGER = logging.getLogger("wyoming_porcupine.engines")
+
+BACKENDS = ("porcupine", "openwakeword")
+MODEL_SUFFIXES = {
+    ".ppn": "porcupine",
+    ".tflite": "openwakeword",
+    ".onnx": "openwakeword",
+}
+
+# openWakeWord front-end geometry (see openwakeword/utils.py)
+OWW_SAMPLE_RATE = 16000
+OWW_FRAME_LENGTH = 1280  # 80 ms, one step of the embedding model
+MEL_CONTEXT = 480  # Samples of the previous frame the melspectrogram needs
+MEL_WINDOW = 76  # Melspectrogram frames per embedding
+MEL_BINS = 32
+EMBEDDING_SIZE = 96
+WARMUP_FRAMES = 5  # Scores right after a reset are unreliable and ignored
+
+
+def backend_for(path: str) -> str:
+    """Backend that loads the keyword model at ``path``."""
+    return MODEL_SUFFIXES.get(Path(path).suffix.lower(), "porcupine")
+
+
+# -----------------------------------------------------------------------------
+# Porcupine
+# -----------------------------------------------------------------------------
+
+
+def porcupine_factory(
+    access_key: Optional[str],
+    keyword_paths: list[str],
+    sensitivities: list[float],
+    model_path: Optional[str] = None,
+) -> Callable[[], Any]:
+    """Picklable factory of Porcupine engines for the given keyword files."""
+    if not access_key:
+        raise ValueError("A Picovoice access key is required for Porcupine keywords")
+
+    import pvporcupine
+
+    return functools.partial(
+        pvporcupine.create,
+        access_key=access_key,
+        keyword_paths=keyword_paths,
+        model_path=model_path,
+        sensitivities=sensitivities,
+    )
+
+
+def porcupine_keyword_paths() -> dict[str, str]:
+    """Porcupine's built-in keywords, or none if pvporcupine is missing."""
+    try:
+        import pvporcupine
+    except ImportError:
+        return {}
+    return pvporcupine.KEYWORD_PATHS
+
+
+# -----------------------------------------------------------------------------
+# openWakeWord
+# -----------------------------------------------------------------------------
+
+
+def _tflite_interpreter() -> Any:
+    """LiteRT, tflite-runtime or full TensorFlow, whichever is installed."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class _Model:
+    """An ONNX or TFLite model run on whole batches.
+
+    TFLite inputs are resized to each batch; ONNX models exported with a
+    fixed batch of one are run row by row.
+    """
+
+    def __init__(self, path: Path, threads: int = 1) -> None:
+        self.path = str(path)
+        self._session: Any = None
+        self._interpreter: Any = None
+
+        if path.suffix.lower() == ".onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            self._session = onnxruntime.InferenceSession(
+                self.path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            model_input = self._session.get_inputs()[0]
+            self._input_name = model_input.name
+            self.input_shape = list(model_input.shape)
+            self._fixed_batch = self.input_shape[0] == 1
+        else:
+            self._interpreter = _tflite_interpreter()(
+                model_path=self.path, num_threads=threads
+            )
+            details = self._interpreter.get_input_details()[0]
+            self._input_index = details["index"]
+            self._output_index = self._interpreter.get_output_details()[0]["index"]
+            self.input_shape = [int(d) for d in details["shape"]]
+            self._batch_shape: Optional[tuple[int, ...]] = None
+
+    def run(self, x: np.ndarray) -> np.ndarray:
+        if self._session is not None:
+            if self._fixed_batch and len(x) > 1:
+                return np.concatenate([self.run(x[i : i + 1]) for i in range(len(x))])
+            return self._session.run(None, {self._input_name: x})[0]
+
+        if x.shape != self._batch_shape:
+            self._interpreter.resize_tensor_input(self._input_index, x.shape)
+            self._interpreter.allocate_tensors()
+            self._batch_shape = x.shape
+        self._interpreter.set_tensor(self._input_index, x)
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output_index).copy()
+
+
+def default_frontend_dir() -> Optional[Path]:
+    """The openwakeword package's bundled models directory, if installed."""
+    spec = importlib.util.find_spec("openwakeword")
+    if spec is None or spec.origin is None:
+        return None
+    return Path(spec.origin).parent / "resources" / "models"
+
+
+def _frontend_file(model_dir: Path, name: str) -> Path:
+    suffixes = [".onnx", ".tflite"]
+    if importlib.util.find_spec("onnxruntime") is None:
+        suffixes.reverse()
+    for suffix in suffixes:
+        path = model_dir / f"{name}{suffix}"
+        if path.is_file():
+            return path
+    raise FileNotFoundError(f"openWakeWord front-end model not found: {name}")
+
+
+class OpenWakeWordRuntime:
+    """Front-end and keyword heads shared by every openWakeWord session.
+
+    The melspectrogram and embedding models are loaded once per process
+    and each keyword head once per file version; a session only owns its
+    streaming state (``OpenWakeWordStream``). ``process_batch`` pushes the
+    frames of any number of sessions through each model in one call, so
+    concurrent sessions cost one inference per model rather than one per
+    session.
+    """
+
+    def __init__(self, model_dir: Optional[Path] = None, threads: int = 1) -> None:
+        model_dir = Path(model_dir) if model_dir else default_frontend_dir()
+        if model_dir is None:
+            raise ValueError(
+                "openWakeWord front-end models not found; set --oww-model-dir"
+            )
+
+        self._threads = threads
+        self._melspec = _Model(_frontend_file(model_dir, "melspectrogram"), threads)
+        self._embedding = _Model(_frontend_file(model_dir, "embedding_model"), threads)
+        self._heads: dict[tuple[str, int], _Model] = {}
+        self._initial_features: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        _LOGGER.info(f"openWakeWord front-end loaded from {model_dir}")
+
+    def _head(self, path: str) -> _Model:
+        key = (path, Path(path).stat().st_mtime_ns)
+        head = self._heads.get(key)
+        if head is None:
+            head = _Model(Path(path), self._threads)
+            if len(head.input_shape) != 3 or head.input_shape[2] != EMBEDDING_SIZE:
+                raise ValueError(
+                    f"Not an openWakeWord keyword model: {path} "
+                    f"(input shape {head.input_shape})"
+                )
+            self._heads = {k: v for k, v in self._heads.items() if k[0] != path}
+            self._heads[key] = head
+        return head
+
+    def create_stream(
+        self, keyword_paths: list[str], sensitivities: list[float]
+    ) -> "OpenWakeWordStream":
+        """Streaming state for one session detecting ``keyword_paths``.
+
+        A keyword is detected when its score reaches ``1 - sensitivity``,
+        so a higher sensitivity triggers more easily, as with Porcupine.
+        """
+        with self._lock:
+            heads = [self._head(path) for path in keyword_paths]
+            if self._initial_features is None:
+                self._initial_features = self._noise_features()
+            initial_features = self._initial_features
+        return OpenWakeWordStream(
+            self, heads, [1.0 - s for s in sensitivities], initial_features
+        )
+
+    def _melspectrogram(self, audio: np.ndarray) -> np.ndarray:
+        """(N, samples) int16-scaled audio to (N, frames, MEL_BINS)."""
+        spec = self._melspec.run(audio.astype(np.float32))
+        return spec.reshape(len(audio), -1, MEL_BINS) / 10 + 2
+
+    def _embed(self, windows: np.ndarray) -> np.ndarray:
+        """(N, MEL_WINDOW, MEL_BINS) melspectrograms to (N, EMBEDDING_SIZE)."""
+        embeddings = self._embedding.run(windows[..., None].astype(np.float32))
+        return embeddings.reshape(len(windows), EMBEDDING_SIZE)
+
+    def _noise_features(self) -> np.ndarray:
+        """Embeddings of 4 s of faint noise, openWakeWord's initial features."""
+        rng = np.random.default_rng(0)
+        noise = rng.integers(-1000, 1000, 4 * OWW_SAMPLE_RATE).astype(np.float32)
+        mel = self._melspectrogram(noise[None])[0]
+        windows = np.stack(
+            [mel[i : i + MEL_WINDOW] for i in range(0, len(mel) - MEL_WINDOW + 1, 8)]
+        )
+        return self._embed(windows)
+
+    def process_batch(
+        self, items: list[tuple["OpenWakeWordStream", Any]]
+    ) -> list[list[int]]:
+        """Keyword index per frame for each ``(stream, pcm)`` item.
+
+        ``pcm`` holds whole int16 frames. Each stream may appear once.
+        """
+        with self._lock:
+            scores = self._score_batch(items)
+        return [stream.detect(score) for (stream, _), score in zip(items, scores)]
+
+    def score_batch(
+        self, items: list[tuple["OpenWakeWordStream", Any]]
+    ) -> list[np.ndarray]:
+        """(frames, keywords) scores for each ``(stream, pcm)`` item."""
+        with self._lock:
+            return self._score_batch(items)
+
+    def _score_batch(
+        self, items: list[tuple["OpenWakeWordStream", Any]]
+    ) -> list[np.ndarray]:
+        counts: list[int] = []
+        windows: list[np.ndarray] = []
+        for stream, pcm in items:
+            samples = np.frombuffer(pcm, dtype=np.int16)
+            count = len(samples) // OWW_FRAME_LENGTH
+            audio = np.concatenate(
+                [stream.tail, samples[: count * OWW_FRAME_LENGTH]]
+            ).astype(np.float32)
+            windows.extend(
+                audio[i * OWW_FRAME_LENGTH : (i + 1) * OWW_FRAME_LENGTH + MEL_CONTEXT]
+                for i in range(count)
+            )
+            stream.tail = audio[len(audio) - MEL_CONTEXT :]
+            counts.append(count)
+
+        if not windows:
+            return [np.zeros((0, len(stream.heads))) for stream, _ in items]
+
+        # Melspectrogram of every frame of every session at once
+        mel = self._melspectrogram(np.stack(windows))
+        mel_frames = mel.shape[1]
+
+        embedding_windows: list[np.ndarray] = []
+        first = 0
+        for (stream, _), count in zip(items, counts):
+            buffer = np.concatenate(
+                [stream.mel, mel[first : first + count].reshape(-1, MEL_BINS)]
+            )
+            end = len(stream.mel)
+            for _ in range(count):
+                end += mel_frames
+                embedding_windows.append(buffer[end - MEL_WINDOW : end])
+            stream.mel = buffer[len(buffer) - MEL_WINDOW :]
+            first += count
+
+        embeddings = self._embed(np.stack(embedding_windows))
+
+        # Group head inputs by model so each head runs once per batch
+        head_inputs: dict[_Model, list[tuple[int, int, int, np.ndarray]]] = {}
+        scores: list[np.ndarray] = []
+        first = 0
+        for s, ((stream, _), count) in enumerate(zip(items, counts)):
+            features = np.concatenate(
+                [stream.features, embeddings[first : first + count]]
+            )
+            base = len(stream.features)
+            for h, head in enumerate(stream.heads):
+                n = head.input_shape[1]
+                for j in range(count):
+                    end = base + j + 1
+                    head_inputs.setdefault(head, []).append(
+                        (s, j, h, features[end - n : end])
+                    )
+            stream.features = features[len(features) - stream.feature_frames :]
+            scores.append(np.zeros((count, len(stream.heads)), dtype=np.float32))
+            first += count
+
+        for head, entries in head_inputs.items():
+            batch = np.stack([x for *_, x in entries]).astype(np.float32)
+            outputs = head.run(batch).reshape(len(entries), -1)[:, 0]
+            for (s, j, h, _), score in zip(entries, outputs):
+                scores[s][j, h] = score
+
+        return scores
+
+
+class OpenWakeWordStream:
+    """One session's openWakeWord state: audio tail, melspectrogram and features.
+
+    ``process`` runs a single frame through the runtime for callers that
+    treat this like a Porcupine handle; the inference executor batches
+    streams through ``OpenWakeWordRuntime.process_batch`` instead.
+    """
+
+    frame_length = OWW_FRAME_LENGTH
+    sample_rate = OWW_SAMPLE_RATE
+
+    def __init__(
+        self,
+        runtime: OpenWakeWordRuntime,
+        heads: list[_Model],
+        thresholds: list[float],
+        initial_features: np.ndarray,
+    ) -> None:
+        self.runtime = runtime
+        self.heads = heads
+        self.thresholds = np.array(thresholds, dtype=np.float32)
+        self.feature_frames = max(head.input_shape[1] for head in heads)
+        if len(initial_features) < self.feature_frames:
+            pad = self.feature_frames - len(initial_features)
+            initial_features = np.concatenate(
+                [np.repeat(initial_features[:1], pad, axis=0), initial_features]
+            )
+        self._initial_features = initial_features[-self.feature_frames :]
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over as a new stream; pooled streams are reset on release."""
+        self.tail = np.zeros(MEL_CONTEXT, dtype=np.float32)
+        self.mel = np.ones((MEL_WINDOW, MEL_BINS), dtype=np.float32)
+        self.features = self._initial_features
+        self._armed = np.ones(len(self.heads), dtype=bool)
+        self._frames = 0
+
+    def fired(self, scores: np.ndarray) -> np.ndarray:
+        """Which keywords fire in each frame of (frames, keywords) scores.
+
+        A keyword fires when its score crosses its threshold and re-arms
+        once the score drops below it again, so one utterance is one
+        detection.
+        """
+        fired = np.zeros(scores.shape, dtype=bool)
+        for i, row in enumerate(scores):
+            self._frames += 1
+            if self._frames <= WARMUP_FRAMES:
+                row = np.zeros_like(row)
+            above = row >= self.thresholds
+            fired[i] = above & self._armed
+            self._armed = ~above
+        return fired
+
+    def detect(self, scores: np.ndarray) -> list[int]:
+        """Keyword index per frame from (frames, keywords) scores, -1 for none."""
+        return [
+            int(np.argmax(np.where(row, frame_scores, -np.inf))) if row.any() else -1
+            for row, frame_scores in zip(self.fired(scores), scores)
+        ]
+
+    def process(self, pcm) -> int:
+        return self.runtime.process_batch([(self, pcm)])[0][0]
+
+    def delete(self) -> None:
+        self.heads = []
+
+
+# -----------------------------------------------------------------------------
+# Mixed keyword sets
+# -----------------------------------------------------------------------------
+
+
+class CompositeEngine:
+    """Engines of different backends fed the same audio.
+
+    ``frame_length`` is the least common multiple of the children's, so
+    every frame splits into whole child frames. ``keyword_indices[i]``
+    maps child ``i``'s keyword indices to the session's keyword order.
+    """
+
+    def __init__(self, engines: list[Any], keyword_indices: list[list[int]]) -> None:
+        sample_rates = {engine.sample_rate for engine in engines}
+        if len(sample_rates) != 1:
+            raise ValueError(f"Engines disagree on sample rate: {sample_rates}")
+
+        self.engines = engines
+        self.keyword_indices = keyword_indices
+        self.frame_length = math.lcm(*(engine.frame_length for engine in engines))
+        self.sample_rate = sample_rates.pop()
+
+    def merge(self, child_results: list[list[int]]) -> list[int]:
+        """Combine per-child frame results into one result per frame.
+
+        The earliest detection inside a frame wins.
+        """
+        frames = len(child_results[0]) * self.engines[0].frame_length
+        frames //= self.frame_length
+        merged = []
+        for frame in range(frames):
+            detections = []
+            for engine, indices, results in zip(
+                self.engines, self.keyword_indices, child_results
+            ):
+                per_frame = self.frame_length // engine.frame_length
+                for j in range(frame * per_frame, (frame + 1) * per_frame):
+                    if results[j] >= 0:
+                        detections.append(
+                            (j * engine.frame_length, indices[results[j]])
+                        )
+                        break
+            merged.append(min(detections)[1] if detections else -1)
+        return merged
+
+    def process(self, pcm) -> int:
+        samples = memoryview(pcm)
+        if samples.format != "h":
+            samples = samples.cast("h")
+        child_results = [
+            [
+                engine.process(samples[start : start + engine.frame_length])
+                for start in range(0, self.frame_length, engine.frame_length)
+            ]
+            for engine in self.engines
+        ]
+        return self.merge(child_results)[0]
+
+    def reset(self) -> None:
+        """Clear the streaming state of children that keep any."""
+        for engine in self.engines:
+            if hasattr(engine, "reset"):
+                engine.reset()
+
+    def delete(self) -> None:
+        for engine in self.engines:
+            engine.delete()
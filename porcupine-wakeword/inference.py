@@ -0,0 +1,331 @@
+"""Inference executors that keep native wake word processing off the event loop."""
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from engines import CompositeEngine, OpenWakeWordRuntime, OpenWakeWordStream
+from metrics import (
+    BATCH_FRAMES,
+    BATCH_WAIT_SECONDS,
+    FRAME_PROCESS_SECONDS,
+    FRAMES_PROCESSED,
+)
+
+_LOGGER = logging.getLogger("wyoming_porcupine.inference")
+
+EXECUTOR_MODES = ("thread", "process")
+
+
+def _process_frames(engine: Any, pcm) -> tuple[list[int], float]:
+    """Run a batch of int16 frames through an engine, in order.
+
+    Returns the keyword index per frame and the time spent in the engine.
+    """
+    samples = memoryview(pcm)
+    if samples.format != "h":
+        samples = samples.cast("h")
+    frame_length = engine.frame_length
+    start_time = time.perf_counter()
+    keyword_indices = [
+        engine.process(samples[start : start + frame_length])
+        for start in range(0, len(samples) - frame_length + 1, frame_length)
+    ]
+    return keyword_indices, time.perf_counter() - start_time
+
+
+# -----------------------------------------------------------------------------
+# Process worker side: each worker process owns the engines it created.
+# -----------------------------------------------------------------------------
+
+_WORKER_ENGINES: dict[int, Any] = {}
+_WORKER_NEXT_ID = 0
+
+
+def _worker_create(factory: Callable[[], Any]) -> tuple[int, int, int]:
+    global _WORKER_NEXT_ID
+    engine = factory()
+    engine_id = _WORKER_NEXT_ID
+    _WORKER_NEXT_ID += 1
+    _WORKER_ENGINES[engine_id] = engine
+    return engine_id, engine.frame_length, engine.sample_rate
+
+
+def _worker_delete(engine_id: int) -> None:
+    engine = _WORKER_ENGINES.pop(engine_id, None)
+    if engine is not None:
+        engine.delete()
+
+
+def _worker_process(engine_id: int, pcm: bytes) -> tuple[list[int], float]:
+    return _process_frames(_WORKER_ENGINES[engine_id], pcm)
+
+
+class RemoteEngine:
+    """Handle to an engine living in one of the executor's worker processes."""
+
+    def __init__(
+        self,
+        shard: "_WorkerShard",
+        engine_id: int,
+        frame_length: int,
+        sample_rate: int,
+    ) -> None:
+        self.shard = shard
+        self.engine_id = engine_id
+        self.frame_length = frame_length
+        self.sample_rate = sample_rate
+
+    def delete(self) -> None:
+        self.shard.engines -= 1
+        self.shard.executor.submit(_worker_delete, self.engine_id)
+
+
+class _WorkerShard:
+    """Single-process executor; its FIFO queue keeps per-engine frame order."""
+
+    def __init__(self) -> None:
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.engines = 0
+
+
+def _process_batch(
+    runtime: OpenWakeWordRuntime, items: list[tuple[OpenWakeWordStream, Any]]
+) -> tuple[list[list[int]], float]:
+    start_time = time.perf_counter()
+    results = runtime.process_batch(items)
+    return results, time.perf_counter() - start_time
+
+
+class BatchScheduler:
+    """Runs frames from every session of a batching backend as one batch.
+
+    Sessions submit their ready frames and await the result. The first
+    pending submission is held for up to ``interval`` seconds so frames
+    from other sessions can join it; then the whole batch runs through
+    ``run_batch`` on ``executor`` and each session gets its own results
+    back, in order. The wait ends early once every recently active
+    session is pending (a lone session is never delayed), once the batch
+    holds ``max_frames`` frames, or when waiting longer would push the
+    oldest submission's added latency (wait plus the recent batch run
+    time) past ``max_delay``. Submissions arriving while a batch runs
+    collect for the next one.
+    """
+
+    # Sessions that have not submitted for this long no longer hold a batch
+    IDLE_SECONDS = 1.0
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[tuple[Any, Any]]], tuple[list[list[int]], float]],
+        executor: Executor,
+        backend: str,
+        interval: float = 0.02,
+        max_delay: float = 0.04,
+        max_frames: int = 256,
+    ) -> None:
+        self.backend = backend
+        self._run_batch = run_batch
+        self._executor = executor
+        self._interval = interval
+        self._max_delay = max_delay
+        self._max_frames = max_frames
+        self._pending: list[tuple[Any, Any, asyncio.Future, float]] = []
+        self._pending_frames = 0
+        self._seen: dict[Any, float] = {}
+        self._run_time = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, engine: Any, pcm) -> tuple[list[int], float]:
+        """Keyword index per frame of ``pcm`` and the engine time they took."""
+        now = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((engine, pcm, future, now))
+        self._pending_frames += memoryview(pcm).nbytes // 2 // engine.frame_length
+        self._seen[engine] = now
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _collect(self) -> None:
+        """Wait until the pending batch is due."""
+        oldest = self._pending[0][3]
+        while True:
+            now = time.monotonic()
+            self._seen = {
+                engine: seen
+                for engine, seen in self._seen.items()
+                if now - seen < self.IDLE_SECONDS
+            }
+            due = oldest + min(self._interval, self._max_delay - self._run_time)
+            if (
+                now >= due
+                or self._pending_frames >= self._max_frames
+                or len(self._pending) >= len(self._seen)
+            ):
+                return
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), due - now)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                await self._collect()
+                batch, self._pending = self._pending, []
+                self._pending_frames = 0
+
+                dispatched = time.monotonic()
+                for *_, submitted in batch:
+                    BATCH_WAIT_SECONDS.observe(
+                        dispatched - submitted, backend=self.backend
+                    )
+                try:
+                    results, elapsed = await loop.run_in_executor(
+                        self._executor,
+                        self._run_batch,
+                        [(engine, pcm) for engine, pcm, *_ in batch],
+                    )
+                except Exception as e:
+                    for _, _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self._run_time = 0.8 * self._run_time + 0.2 * elapsed
+                frames = sum(len(r) for r in results)
+                BATCH_FRAMES.observe(frames, backend=self.backend)
+                for (_, _, future, _), keyword_indices in zip(batch, results):
+                    if not future.done():
+                        future.set_result(
+                            (
+                                keyword_indices,
+                                elapsed * len(keyword_indices) / (frames or 1),
+                            )
+                        )
+        finally:
+            self._task = None
+
+
+class InferenceExecutor:
+    """Runs ``engine.process()`` for batches of frames outside the event loop.
+
+    In ``thread`` mode engines live in this process and batches run on a
+    thread pool (the native call releases the GIL). In ``process`` mode one
+    worker process per core owns a share of the engines and the pool only
+    holds ``RemoteEngine`` handles; batches are routed to the owning worker.
+    openWakeWord streams always live in this process: a ``BatchScheduler``
+    per runtime batches their frames across sessions (see ``batch_interval``
+    and ``batch_max_delay``) and runs them on the thread pool. Either way a
+    session awaits each batch before submitting the next one, so its frames
+    are processed in order.
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        workers: Optional[int] = None,
+        batch_interval: float = 0.02,
+        batch_max_delay: float = 0.04,
+        batch_max_frames: int = 256,
+    ) -> None:
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode: {mode}")
+
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="inference"
+        )
+        self._shards: list[_WorkerShard] = []
+        self._batch_settings = {
+            "interval": batch_interval,
+            "max_delay": batch_max_delay,
+            "max_frames": batch_max_frames,
+        }
+        self._schedulers: dict[OpenWakeWordRuntime, BatchScheduler] = {}
+
+        if mode == "process":
+            self._shards = [_WorkerShard() for _ in range(self.workers)]
+
+        _LOGGER.info(f"Inference executor: {mode} mode, {self.workers} workers")
+
+    def create_engine(self, factory: Callable[[], Any]) -> Any:
+        """Create an engine with ``factory`` (blocking; call from a worker thread).
+
+        In process mode ``factory`` must be picklable; it is called in the
+        worker process that will own the engine.
+        """
+        if self.mode == "thread":
+            return factory()
+
+        shard = min(self._shards, key=lambda s: s.engines)
+        shard.engines += 1
+        try:
+            engine_id, frame_length, sample_rate = shard.executor.submit(
+                _worker_create, factory
+            ).result()
+        except BaseException:
+            shard.engines -= 1
+            raise
+
+        return RemoteEngine(shard, engine_id, frame_length, sample_rate)
+
+    async def process(self, engine: Any, pcm) -> list[int]:
+        """Process whole int16 frames and return one keyword index per frame.
+
+        ``pcm`` is a bytes-like object or int16 memoryview of whole frames.
+        """
+        if isinstance(engine, CompositeEngine):
+            child_results = await asyncio.gather(
+                *(self.process(child, pcm) for child in engine.engines)
+            )
+            return engine.merge(child_results)
+
+        loop = asyncio.get_running_loop()
+        backend = "porcupine"
+        if isinstance(engine, OpenWakeWordStream):
+            backend = "openwakeword"
+            scheduler = self._schedulers.get(engine.runtime)
+            if scheduler is None:
+                scheduler = BatchScheduler(
+                    functools.partial(_process_batch, engine.runtime),
+                    self._threads,
+                    backend,
+                    **self._batch_settings,
+                )
+                self._schedulers[engine.runtime] = scheduler
+            keyword_indices, elapsed = await scheduler.submit(engine, pcm)
+        elif isinstance(engine, RemoteEngine):
+            keyword_indices, elapsed = await loop.run_in_executor(
+                engine.shard.executor, _worker_process, engine.engine_id, bytes(pcm)
+            )
+        else:
+            keyword_indices, elapsed = await loop.run_in_executor(
+                self._threads, _process_frames, engine, pcm
+            )
+
+        if keyword_indices:
+            FRAMES_PROCESSED.inc(len(keyword_indices), backend=backend)
+            FRAME_PROCESS_SECONDS.observe(
+                elapsed / len(keyword_indices),
+                count=len(keyword_indices),
+                backend=backend,
+            )
+
+        return keyword_indices
+
+    def close(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+        for shard in self._shards:
+            shard.executor.shutdown(wait=False, cancel_futures=True)
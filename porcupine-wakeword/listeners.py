@@ -0,0 +1,140 @@
+"""Listener definitions: several Wyoming ports served by one process."""
+import json
+from pathlib import Path
+from typing import Any
+
+from model_manager import KeywordSet
+
+# Settings a listener may give; host, sensitivity and backend default to
+# the command line values
+_SETTINGS = {
+    "name",
+    "host",
+    "port",
+    "keywords",
+    "keyword_paths",
+    "sensitivity",
+    "keyword_sensitivities",
+    "profiles",
+    "backend",
+}
+
+
+class Listener:
+    """A Wyoming address and the keyword set its sessions detect."""
+
+    def __init__(self, host: str, port: int, keyword_set: KeywordSet) -> None:
+        self.host = host
+        self.port = port
+        self.keyword_set = keyword_set
+
+    @property
+    def name(self) -> str:
+        return self.keyword_set.name
+
+
+def _sensitivity(value: Any, where: str) -> float:
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, (int, float))
+        or not 0.0 <= value <= 1.0
+    ):
+        raise ValueError(f"{where}: sensitivity must be 0.0-1.0, got {value!r}")
+    return float(value)
+
+
+def _sensitivities(values: Any, where: str) -> dict[str, float]:
+    if not isinstance(values, dict):
+        raise ValueError(f"{where}: expected an object of keyword: sensitivity")
+    return {
+        str(keyword).lower(): _sensitivity(value, f"{where}: {keyword}")
+        for keyword, value in values.items()
+    }
+
+
+def _strings(values: Any, where: str) -> list[str]:
+    if isinstance(values, str):
+        return [values]
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"{where}: expected a list of strings")
+    return values
+
+
+def _listener(entry: Any, where: str, defaults: dict[str, Any]) -> Listener:
+    if not isinstance(entry, dict):
+        raise ValueError(f"{where}: expected an object")
+    unknown = set(entry) - _SETTINGS
+    if unknown:
+        raise ValueError(f"{where}: unknown settings {', '.join(sorted(unknown))}")
+
+    port = entry.get("port")
+    if isinstance(port, bool) or not isinstance(port, int) or not 0 < port < 65536:
+        raise ValueError(f"{where}: port must be 1-65535, got {port!r}")
+
+    keywords = _strings(entry.get("keywords", []), f"{where}: keywords")
+    keyword_paths = _strings(entry.get("keyword_paths", []), f"{where}: keyword_paths")
+    if not keywords and not keyword_paths:
+        raise ValueError(f"{where}: keywords or keyword_paths is required")
+
+    profiles = entry.get("profiles", {})
+    if not isinstance(profiles, dict):
+        raise ValueError(f"{where}: profiles must be an object of name: sensitivities")
+
+    sensitivity = _sensitivity(entry.get("sensitivity", defaults["sensitivity"]), where)
+    keyword_sensitivities = _sensitivities(
+        entry.get("keyword_sensitivities", {}), f"{where}: keyword_sensitivities"
+    )
+    profiles = {
+        str(name).lower(): _sensitivities(values, f"{where}: profile {name}")
+        for name, values in profiles.items()
+    }
+    try:
+        keyword_set = KeywordSet(
+            keywords,
+            sensitivity=sensitivity,
+            keyword_sensitivities=keyword_sensitivities,
+            profiles=profiles,
+            backend=entry.get("backend", defaults["backend"]),
+            keyword_paths=[Path(p) for p in keyword_paths] or None,
+            name=str(entry.get("name", port)),
+        )
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}") from e
+
+    return Listener(str(entry.get("host", defaults["host"])), port, keyword_set)
+
+
+def load_listeners(
+    path: str, host: str = "0.0.0.0", sensitivity: float = 0.5, backend: str = "auto"
+) -> list[Listener]:
+    """Listeners defined in the JSON file at ``path``.
+
+    The file holds ``{"listeners": [...]}``. Each listener needs a ``port``
+    and ``keywords`` (or ``keyword_paths``) and may set ``name``, ``host``,
+    ``sensitivity``, ``keyword_sensitivities``, ``profiles`` and
+    ``backend``; unset ``host``, ``sensitivity`` and ``backend`` take the
+    given defaults.
+    """
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read listeners file {path}: {e}") from e
+
+    entries = data.get("listeners") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f'{path}: expected {{"listeners": [...]}}, not empty')
+
+    defaults = {"host": host, "sensitivity": sensitivity, "backend": backend}
+    listeners = [
+        _listener(entry, f"{path}: listener {i + 1}", defaults)
+        for i, entry in enumerate(entries)
+    ]
+
+    names = [listener.name for listener in listeners]
+    addresses = [(listener.host, listener.port) for listener in listeners]
+    for what, values in (("name", names), ("host and port", addresses)):
+        duplicates = {value for value in values if values.count(value) > 1}
+        if duplicates:
+            raise ValueError(f"{path}: listeners share the {what} {duplicates.pop()}")
+
+    return listeners
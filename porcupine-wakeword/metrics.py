@@ -0,0 +1,327 @@
+"""In-process metrics registry with a Prometheus text exposition endpoint."""
+import asyncio
+import logging
+import math
+from typing import Optional
+
+_LOGGER = logging.getLogger("wyoming_porcupine.metrics")
+
+# Per-frame latency buckets around the 32 ms real-time budget of one frame
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        if not labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        return [
+            (f"{self.name}_total", self._labels(key), value)
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        if not labelnames:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        return [
+            (self.name, self._labels(key), value)
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, count: int = 1, **labels: str) -> None:
+        """Record ``count`` observations of ``value``."""
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += count
+                break
+        series[1] += value * count
+        series[2] += count
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in sorted(self._series.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(
+                    (f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative)
+                )
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(  # type: ignore[return-value]
+            Histogram(name, documentation, labelnames, buckets)
+        )
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+MODELS_READY = REGISTRY.gauge(
+    "wyoming_porcupine_models_ready",
+    "1 once the wake word engines have loaded; Describe is answered before",
+)
+ACTIVE_CONNECTIONS = REGISTRY.gauge(
+    "wyoming_porcupine_active_connections", "Open Wyoming client connections"
+)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "wyoming_porcupine_active_sessions", "Detection sessions holding an engine"
+)
+SESSIONS_REJECTED = REGISTRY.counter(
+    "wyoming_porcupine_sessions_rejected",
+    "Detection sessions rejected because the engine pool was exhausted",
+)
+FRAMES_PROCESSED = REGISTRY.counter(
+    "wyoming_porcupine_frames_processed",
+    "Audio frames run through the wake word engine (use rate() for frames/s)",
+    ("backend",),
+)
+FRAMES_SKIPPED = REGISTRY.counter(
+    "wyoming_porcupine_frames_skipped",
+    "Audio frames skipped by the energy gate without running the engine",
+)
+FRAME_PROCESS_SECONDS = REGISTRY.histogram(
+    "wyoming_porcupine_frame_process_seconds",
+    "Engine process() latency per frame (batched frames share the batch time)",
+    ("backend",),
+)
+BATCH_FRAMES = REGISTRY.histogram(
+    "wyoming_porcupine_batch_frames",
+    "Frames per cross-session inference batch",
+    ("backend",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    "wyoming_porcupine_batch_wait_seconds",
+    "Time frames wait for their inference batch to be dispatched",
+    ("backend",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25),
+)
+BACKLOG_SECONDS = REGISTRY.histogram(
+    "wyoming_porcupine_backlog_seconds",
+    "Buffered audio per session after each chunk is received",
+    buckets=(0.032, 0.064, 0.128, 0.256, 0.5, 1.0, 2.0, 5.0),
+)
+SAMPLES_DROPPED = REGISTRY.counter(
+    "wyoming_porcupine_samples_dropped",
+    "Audio samples dropped because a session's backlog was full",
+)
+SESSION_LAG_SECONDS = REGISTRY.histogram(
+    "wyoming_porcupine_session_lag_seconds",
+    "How far each session's processing runs behind real time, per chunk",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+OVERLOAD_DECISIONS = REGISTRY.counter(
+    "wyoming_porcupine_overload_decisions",
+    "Chunks on which a lagging session applied its overload policy",
+    ("action",),
+)
+OVERLOAD_FRAMES_DROPPED = REGISTRY.counter(
+    "wyoming_porcupine_overload_frames_dropped",
+    "Frames dropped without inference to catch a lagging session up",
+    ("action",),
+)
+DETECTIONS = REGISTRY.counter(
+    "wyoming_porcupine_detections", "Wake word detections", ("keyword",)
+)
+DETECTION_LATENCY_SECONDS = REGISTRY.histogram(
+    "wyoming_porcupine_detection_latency_seconds",
+    "Time from receiving the audio chunk to writing the Detection event",
+)
+CLIPS_SAVED = REGISTRY.counter(
+    "wyoming_porcupine_clips_saved", "Detection clips written to the spool directory"
+)
+CLIPS_DROPPED = REGISTRY.counter(
+    "wyoming_porcupine_clips_dropped",
+    "Detection clips dropped because the writer queue was full",
+)
+
+
+async def _handle_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    registry: MetricsRegistry,
+) -> None:
+    try:
+        request_line = await reader.readline()
+        # Drain headers
+        while (await reader.readline()).strip():
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else ""
+        if path.split("?")[0] in ("/metrics", "/"):
+            status = "200 OK"
+            body = registry.render().encode("utf-8")
+        else:
+            status = "404 Not Found"
+            body = b"Not Found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(
+    host: str, port: int, registry: Optional[MetricsRegistry] = None
+) -> asyncio.AbstractServer:
+    """Serve ``registry`` (default: the module registry) at http://host:port/metrics."""
+    registry = registry or REGISTRY
+    server = await asyncio.start_server(
+        lambda r, w: _handle_request(r, w, registry), host, port
+    )
+    _LOGGER.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
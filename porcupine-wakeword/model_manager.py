@@ -0,0 +1,724 @@
+"""Keyword model loading and hot reload without dropping connections."""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import signal
+import threading
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from wyoming.info import Attribution, Info, WakeModel, WakeProgram
+
+from engine_pool import EnginePool, SessionLimit
+from engines import (
+    BACKENDS,
+    CompositeEngine,
+    OpenWakeWordRuntime,
+    backend_for,
+    porcupine_factory,
+    porcupine_keyword_paths,
+)
+from inference import InferenceExecutor
+from metrics import MODELS_READY
+from startup_cache import StartupCache
+
+_LOGGER = logging.getLogger("wyoming_porcupine.models")
+
+
+def _package_version(package: str) -> Optional[str]:
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return None
+
+
+# Describe metadata per backend: program description, attribution, package
+_PROGRAMS = {
+    "porcupine": (
+        "Porcupine wake word detection",
+        Attribution(name="Picovoice", url="https://picovoice.ai/"),
+        "pvporcupine",
+    ),
+    "openwakeword": (
+        "openWakeWord wake word detection",
+        Attribution(
+            name="David Scripka", url="https://github.com/dscripka/openWakeWord"
+        ),
+        "onnxruntime",
+    ),
+}
+
+
+def build_info(keyword_names: list[str], keyword_paths: list[str]) -> Info:
+    """Wyoming Describe response: one wake program per backend in use."""
+    by_backend: dict[str, list[str]] = {}
+    for name, path in zip(keyword_names, keyword_paths):
+        by_backend.setdefault(backend_for(path), []).append(name)
+
+    programs = []
+    for backend, names in by_backend.items():
+        description, attribution, package = _PROGRAMS[backend]
+        program_version = _package_version(package) or "unknown"
+        programs.append(
+            WakeProgram(
+                name=backend,
+                description=description,
+                attribution=attribution,
+                installed=True,
+                version=program_version,
+                models=[
+                    WakeModel(
+                        name=name,
+                        description=f"{description.split()[0]} wake word: {name}",
+                        attribution=attribution,
+                        installed=True,
+                        version=program_version,
+                        languages=["en"],  # Adjust based on keyword
+                    )
+                    for name in names
+                ],
+            )
+        )
+    return Info(wake=programs)
+
+
+# Engine configuration: the selected keywords with their sensitivities
+EngineKey = tuple[tuple[str, float], ...]
+
+
+class EngineLease:
+    """An engine checked out by one session, and where it came from."""
+
+    def __init__(
+        self, generation: "ModelGeneration", key: EngineKey, engine: Any
+    ) -> None:
+        self.generation = generation
+        self.key = key
+        self.engine = engine
+
+    @property
+    def keyword_names(self) -> list[str]:
+        """Keyword names in the engine's index order."""
+        return [name for name, _ in self.key]
+
+
+class ModelGeneration:
+    """One loaded version of the keyword models: its engines and Describe info.
+
+    ``keyword_sets`` maps each keyword set (one per listener) to the
+    keywords of this generation it serves; Describe info is per set.
+
+    Engines are pooled per ``EngineKey``, so a session asking for a subset
+    of keywords or a different sensitivity profile gets a smaller or
+    differently tuned engine without loading duplicates. At most
+    ``cache_size`` pools are kept; the least recently used idle pool is
+    closed when a new one is needed. As every pool may grow to the session
+    limit, idle engines beyond ``max_idle`` across all pools are deleted
+    when a session ends, from the least recently used pools first.
+
+    Sessions keep the generation they started on until AudioStop, so a
+    reload never swaps models under a running stream. A retired generation
+    is closed once its last session has released its engine.
+    """
+
+    def __init__(
+        self,
+        number: int,
+        keyword_names: list[str],
+        keyword_paths: list[str],
+        keyword_sets: dict[str, list[str]],
+        make_pool: Callable[[list[str], list[float], str], EnginePool],
+        cache_size: int = 4,
+        max_idle: int = 1,
+    ) -> None:
+        self.number = number
+        self.keyword_names = keyword_names
+        self.keyword_paths = keyword_paths
+        self.keyword_sets = keyword_sets
+        paths = dict(zip(keyword_names, keyword_paths))
+        self.infos = {
+            set_name: build_info(names, [paths[name] for name in names])
+            for set_name, names in keyword_sets.items()
+        }
+        self.active_sessions = 0
+        self.retired = False
+        self._make_pool = make_pool
+        self._cache_size = max(1, cache_size)
+        self._max_idle = max(1, max_idle)
+        self._pools: OrderedDict[EngineKey, EnginePool] = OrderedDict()
+        self._leases: dict[EngineKey, int] = {}
+        self._closed = False
+
+    def _get_pool(self, key: EngineKey) -> EnginePool:
+        pool = self._pools.get(key)
+        if pool is not None:
+            self._pools.move_to_end(key)
+            return pool
+
+        paths = dict(zip(self.keyword_names, self.keyword_paths))
+        pool = self._make_pool(
+            [paths[name] for name, _ in key],
+            [sensitivity for _, sensitivity in key],
+            f"generation-{self.number}:"
+            + ",".join(f"{name}={sensitivity}" for name, sensitivity in key),
+        )
+        self._pools[key] = pool
+        return pool
+
+    async def start(self, key: EngineKey) -> None:
+        """Pre-warm the pool for the default engine configuration."""
+        await self._get_pool(key).start()
+
+    async def _evict(self) -> None:
+        for key in list(self._pools):
+            if len(self._pools) <= self._cache_size:
+                break
+            if self._leases.get(key, 0) == 0:
+                pool = self._pools.pop(key)
+                await pool.close()
+                _LOGGER.debug(f"Evicted engine pool '{pool.name}'")
+
+    async def acquire(self, key: EngineKey) -> EngineLease:
+        pool = self._get_pool(key)
+        self._leases[key] = self._leases.get(key, 0) + 1
+        self.active_sessions += 1
+        try:
+            engine = await pool.acquire()
+        except BaseException:
+            await self._end_lease(key)
+            raise
+
+        await self._evict()
+        return EngineLease(self, key, engine)
+
+    async def release(self, lease: EngineLease) -> None:
+        pool = self._pools.get(lease.key)
+        if pool is not None:
+            await pool.release(lease.engine)
+            await self._trim_idle(lease.key)
+        else:
+            lease.engine.delete()
+        await self._end_lease(lease.key)
+
+    async def _trim_idle(self, keep: EngineKey) -> None:
+        excess = sum(pool.idle for pool in self._pools.values()) - self._max_idle
+        for key, pool in list(self._pools.items()):
+            if excess <= 0:
+                break
+            if key != keep:
+                excess -= await pool.trim(excess)
+
+    async def _end_lease(self, key: EngineKey) -> None:
+        self._leases[key] -= 1
+        self.active_sessions -= 1
+        await self.close_if_drained()
+
+    async def close_if_drained(self) -> None:
+        if self.retired and self.active_sessions == 0 and not self._closed:
+            self._closed = True
+            pools, self._pools = list(self._pools.values()), OrderedDict()
+            for pool in pools:
+                await pool.close()
+            _LOGGER.info(f"Model generation {self.number} drained and freed")
+
+
+class KeywordSet:
+    """The keywords one listener serves, with their sensitivities and backend.
+
+    Keywords resolve to model files of ``backend`` only (any backend with
+    ``auto``), or are taken from explicit ``keyword_paths``. Each keyword's
+    sensitivity defaults to ``keyword_sensitivities`` or ``sensitivity``;
+    named ``profiles`` override them per keyword and can be selected by a
+    Detect event together with keyword names.
+    """
+
+    def __init__(
+        self,
+        keywords: list[str],
+        sensitivity: float = 0.5,
+        keyword_sensitivities: Optional[dict[str, float]] = None,
+        profiles: Optional[dict[str, dict[str, float]]] = None,
+        backend: str = "auto",
+        keyword_paths: Optional[list[Path]] = None,
+        name: str = "default",
+    ) -> None:
+        if backend != "auto" and backend not in BACKENDS:
+            raise ValueError(f"Unknown wake word backend: {backend}")
+
+        self.name = name
+        self.keywords = [k.lower() for k in keywords]
+        self.sensitivity = sensitivity
+        self.keyword_sensitivities = {
+            k.lower(): v for k, v in (keyword_sensitivities or {}).items()
+        }
+        self.profiles = {
+            profile: {k.lower(): v for k, v in values.items()}
+            for profile, values in (profiles or {}).items()
+        }
+        self.backend = backend
+        self.keyword_paths = keyword_paths
+
+    def config(self) -> list:
+        """What decides which files the keywords resolve to."""
+        return [
+            self.name,
+            self.keywords,
+            self.backend,
+            [str(p) for p in self.keyword_paths or []],
+        ]
+
+    def engine_key(
+        self, keyword_names: list[str], names: Optional[list[str]] = None
+    ) -> EngineKey:
+        """Engine configuration for a Detect event's ``names``.
+
+        ``keyword_names`` are the loaded keywords of this set. Names may be
+        keywords and/or profile names. Without keyword names every keyword
+        of the profile (or of the set) is detected.
+        """
+        names = [n.lower() for n in names or []]
+        profile: dict[str, float] = {}
+        for name in names:
+            if name in self.profiles:
+                profile.update(self.profiles[name])
+
+        keywords = [k for k in keyword_names if k in names]
+        if not keywords:
+            if names and not profile:
+                _LOGGER.warning(f"Requested wake words not loaded: {names}; using all")
+            keywords = [
+                k for k in keyword_names if not profile or k in profile
+            ] or list(keyword_names)
+
+        return tuple(
+            (
+                keyword,
+                profile.get(
+                    keyword,
+                    self.keyword_sensitivities.get(keyword, self.sensitivity),
+                ),
+            )
+            for keyword in keywords
+        )
+
+
+def merge_keyword_sets(
+    resolved: dict[str, dict[str, str]]
+) -> tuple[list[str], list[str]]:
+    """Keyword names and files of all sets, each keyword loaded once."""
+    merged: dict[str, str] = {}
+    for set_name, keywords in resolved.items():
+        for name, path in keywords.items():
+            if merged.setdefault(name, path) != path:
+                raise ValueError(
+                    f"Wake word {name} resolves to both {merged[name]} and "
+                    f"{path} (keyword set {set_name}); use one model for it"
+                )
+    return list(merged), list(merged.values())
+
+
+class ListenerModels:
+    """One listener's view of a shared ``ModelManager``: its keyword set."""
+
+    def __init__(self, manager: "ModelManager", keyword_set: str) -> None:
+        self._manager = manager
+        self.keyword_set = keyword_set
+
+    @property
+    def info(self) -> Info:
+        return self._manager.info_for(self.keyword_set)
+
+    def engine_key(
+        self, generation: ModelGeneration, names: Optional[list[str]] = None
+    ) -> EngineKey:
+        return self._manager.engine_key(generation, names, self.keyword_set)
+
+    async def acquire(self, names: Optional[list[str]] = None) -> EngineLease:
+        return await self._manager.acquire(names, self.keyword_set)
+
+    async def release(self, lease: EngineLease) -> None:
+        await self._manager.release(lease)
+
+
+class ModelManager:
+    """Resolves keyword files, builds engine pools and swaps them on change.
+
+    Keywords are resolved per ``KeywordSet`` to ``<model_dir>/<keyword>.ppn``,
+    ``.tflite`` or ``.onnx`` (the first that exists and suits the set's
+    backend) and to Porcupine's built-in keyword otherwise. All sets share
+    one generation: a keyword served by several listeners is loaded once,
+    and engines with the same keywords and sensitivities come from the same
+    pool. A session's keywords may mix backends; the engine then combines
+    one engine per backend. The resolved files are polled every
+    ``watch_interval`` seconds and reloaded on SIGHUP; a reload builds and
+    pre-warms a new pool in the background, switches new sessions to it
+    atomically and leaves running sessions on the old one until they stop.
+    ``pool_size`` caps the sessions running at once across all pools,
+    generations and keyword sets, and the idle engines each generation
+    keeps (at least one pre-warmed engine per keyword set).
+
+    ``prepare`` makes Describe info available without creating engines
+    (from ``startup_cache`` when the keyword files are unchanged), so the
+    server can bind before ``start`` loads the engines; sessions that
+    arrive in between wait for them.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        access_key: Optional[str],
+        keyword_sets: list[KeywordSet],
+        model_dir: Optional[Path] = None,
+        model_path: Optional[str] = None,
+        pool_size: int = 8,
+        pool_prewarm: int = 1,
+        pool_timeout: Optional[float] = None,
+        engine_cache_size: int = 4,
+        watch_interval: float = 0.0,
+        oww_model_dir: Optional[Path] = None,
+        startup_cache: Optional[StartupCache] = None,
+    ) -> None:
+        if not keyword_sets:
+            raise ValueError("At least one keyword set is required")
+        self._keyword_sets = {s.name: s for s in keyword_sets}
+        if len(self._keyword_sets) != len(keyword_sets):
+            raise ValueError("Keyword set names must be unique")
+
+        self._executor = executor
+        self._access_key = access_key
+        self._model_dir = model_dir
+        self._model_path = model_path
+        self._pool_size = pool_size
+        self._pool_prewarm = pool_prewarm
+        self._pool_timeout = pool_timeout
+        self._engine_cache_size = engine_cache_size
+        # One limit for all pools: each keyword/sensitivity combination has one
+        self._sessions = SessionLimit(pool_size, pool_timeout)
+        self._watch_interval = watch_interval
+        self._oww_model_dir = oww_model_dir
+        self._oww: Optional[OpenWakeWordRuntime] = None
+        self._oww_lock = threading.Lock()
+
+        self._startup_cache = startup_cache
+        self._startup_infos: dict[str, Info] = {}
+        self._ready = asyncio.Event()
+
+        self.current: Optional[ModelGeneration] = None
+        self._generations = 0
+        self._signature: Optional[tuple] = None
+        self._reload_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def listener(self, keyword_set: str = "default") -> ListenerModels:
+        """The models as seen by sessions of ``keyword_set``."""
+        if keyword_set not in self._keyword_sets:
+            raise KeyError(keyword_set)
+        return ListenerModels(self, keyword_set)
+
+    def info_for(self, keyword_set: str) -> Info:
+        if self.current is not None:
+            return self.current.infos[keyword_set]
+        return self._startup_infos.get(keyword_set) or Info(wake=[])
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _config_key(self) -> str:
+        config = [
+            [s.config() for s in self._keyword_sets.values()],
+            str(self._model_dir),
+            self._model_path,
+        ]
+        return hashlib.sha256(json.dumps(config).encode("utf-8")).hexdigest()[:16]
+
+    def prepare(self) -> None:
+        """Resolve keywords and Describe info without loading any engine."""
+        if self._startup_cache is not None:
+            cached = self._startup_cache.lookup(self._config_key())
+            if cached is not None:
+                resolved, infos = cached
+                # Built-in keywords come from the cache: no pvporcupine import
+                builtin = dict(zip(*merge_keyword_sets(resolved)))
+                if self.resolve(builtin=builtin) == resolved:
+                    self._startup_infos = infos
+                    _LOGGER.info("Describe info loaded from startup cache")
+                    return
+
+        resolved = self.resolve()
+        merge_keyword_sets(resolved)
+        self._startup_infos = {
+            set_name: build_info(list(keywords), list(keywords.values()))
+            for set_name, keywords in resolved.items()
+        }
+
+    def resolve(
+        self, log_missing: bool = False, builtin: Optional[dict[str, str]] = None
+    ) -> dict[str, dict[str, str]]:
+        """Keyword names and model file paths to load, per keyword set.
+
+        ``builtin`` replaces Porcupine's built-in keyword table.
+        """
+        if builtin is None and any(
+            s.backend != "openwakeword" and not s.keyword_paths
+            for s in self._keyword_sets.values()
+        ):
+            builtin = porcupine_keyword_paths()
+
+        return {
+            name: self._resolve_set(keyword_set, log_missing, builtin or {})
+            for name, keyword_set in self._keyword_sets.items()
+        }
+
+    def _resolve_set(
+        self, keyword_set: KeywordSet, log_missing: bool, builtin: dict[str, str]
+    ) -> dict[str, str]:
+        if keyword_set.keyword_paths:
+            paths = [Path(p) for p in keyword_set.keyword_paths]
+            return {p.stem: str(p) for p in paths}
+
+        suffixes = [
+            suffix
+            for suffix in (".ppn", ".tflite", ".onnx")
+            if keyword_set.backend in ("auto", backend_for(f"model{suffix}"))
+        ]
+        if keyword_set.backend == "openwakeword":
+            builtin = {}
+
+        resolved: dict[str, str] = {}
+        for keyword in keyword_set.keywords:
+            custom = None
+            if self._model_dir:
+                custom = next(
+                    (
+                        path
+                        for path in (
+                            self._model_dir / f"{keyword}{s}" for s in suffixes
+                        )
+                        if path.is_file()
+                    ),
+                    None,
+                )
+            if custom is not None:
+                resolved[keyword] = str(custom)
+            elif keyword in builtin:
+                resolved[keyword] = builtin[keyword]
+            elif log_missing:
+                _LOGGER.warning(f"No model found for wake word: {keyword}")
+
+        if not resolved:
+            raise ValueError(f"No wake word models found for: {keyword_set.keywords}")
+
+        return resolved
+
+    def _current_signature(self) -> tuple:
+        names, paths = merge_keyword_sets(self.resolve())
+        signature = []
+        for path in paths:
+            stat = Path(path).stat()
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    async def start(self) -> None:
+        """Load the initial models and start watching for changes."""
+        await self.reload()
+        if self.current is None:
+            raise RuntimeError("Failed to load wake word models")
+        self._ready.set()
+        MODELS_READY.set(1)
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self._spawn_reload)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        if self._watch_interval > 0:
+            self._spawn(self._watch())
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _spawn_reload(self) -> None:
+        _LOGGER.info("SIGHUP received, reloading wake word models")
+        self._spawn(self.reload(force=True))
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._watch_interval)
+            try:
+                signature = await asyncio.to_thread(self._current_signature)
+            except (OSError, ValueError) as e:
+                _LOGGER.warning(f"Cannot check wake word models: {e}")
+                continue
+
+            if signature != self._signature:
+                _LOGGER.info("Wake word models changed on disk, reloading")
+                await self.reload()
+
+    async def reload(self, force: bool = False) -> None:
+        """Build a new generation and switch new sessions to it."""
+        async with self._reload_lock:
+            try:
+                signature = await asyncio.to_thread(self._current_signature)
+                if not force and signature == self._signature:
+                    return
+
+                resolved = self.resolve(log_missing=True)
+                generation = await self._build_generation(resolved)
+            except Exception as e:
+                _LOGGER.error(f"Failed to load wake word models: {e}")
+                return
+
+            old, self.current = self.current, generation
+            self._signature = signature
+            if self._startup_cache is not None:
+                await asyncio.to_thread(
+                    self._startup_cache.store,
+                    self._config_key(),
+                    resolved,
+                    generation.infos,
+                )
+            _LOGGER.info(
+                f"Model generation {generation.number} active: "
+                f"{', '.join(generation.keyword_names)}"
+            )
+
+            if old is not None:
+                old.retired = True
+                await old.close_if_drained()
+
+    def _oww_runtime(self) -> OpenWakeWordRuntime:
+        with self._oww_lock:
+            if self._oww is None:
+                self._oww = OpenWakeWordRuntime(self._oww_model_dir)
+            return self._oww
+
+    def _create_engine(self, paths: list[str], sensitivities: list[float]) -> Any:
+        """Engine detecting ``paths`` in order (blocking; runs in a thread).
+
+        Keywords of one backend share one engine; mixed backends are
+        combined into a ``CompositeEngine``.
+        """
+        groups: dict[str, list[int]] = {}
+        for i, path in enumerate(paths):
+            groups.setdefault(backend_for(path), []).append(i)
+
+        engines: list[Any] = []
+        try:
+            for backend, indices in groups.items():
+                group_paths = [paths[i] for i in indices]
+                group_sensitivities = [sensitivities[i] for i in indices]
+                if backend == "openwakeword":
+                    engine = self._oww_runtime().create_stream(
+                        group_paths, group_sensitivities
+                    )
+                else:
+                    engine = self._executor.create_engine(
+                        porcupine_factory(
+                            self._access_key,
+                            group_paths,
+                            group_sensitivities,
+                            self._model_path,
+                        )
+                    )
+                engines.append(engine)
+        except BaseException:
+            for engine in engines:
+                engine.delete()
+            raise
+
+        if len(engines) == 1:
+            return engines[0]
+        return CompositeEngine(engines, list(groups.values()))
+
+    def _make_pool(
+        self, paths: list[str], sensitivities: list[float], name: str
+    ) -> EnginePool:
+        return EnginePool(
+            functools.partial(self._create_engine, paths, sensitivities),
+            max_size=self._pool_size,
+            prewarm=max(1, self._pool_prewarm),
+            acquire_timeout=self._pool_timeout,
+            name=name,
+        )
+
+    async def _build_generation(
+        self, resolved: dict[str, dict[str, str]]
+    ) -> ModelGeneration:
+        names, paths = merge_keyword_sets(resolved)
+        self._generations += 1
+        generation = ModelGeneration(
+            self._generations,
+            names,
+            paths,
+            {set_name: list(keywords) for set_name, keywords in resolved.items()},
+            self._make_pool,
+            cache_size=self._engine_cache_size,
+            # Room for every listener's pre-warmed engines
+            max_idle=max(self._pool_size, len(resolved) * max(1, self._pool_prewarm)),
+        )
+        try:
+            # Pre-warm each listener's default engine configuration
+            for key in dict.fromkeys(
+                self.engine_key(generation, None, set_name) for set_name in resolved
+            ):
+                await generation.start(key)
+        except BaseException:
+            generation.retired = True
+            await generation.close_if_drained()
+            raise
+
+        return generation
+
+    def engine_key(
+        self,
+        generation: ModelGeneration,
+        names: Optional[list[str]] = None,
+        keyword_set: str = "default",
+    ) -> EngineKey:
+        """Engine configuration for a Detect event's ``names`` on ``keyword_set``."""
+        return self._keyword_sets[keyword_set].engine_key(
+            generation.keyword_sets[keyword_set], names
+        )
+
+    async def acquire(
+        self, names: Optional[list[str]] = None, keyword_set: str = "default"
+    ) -> EngineLease:
+        """Check out an engine for ``names`` from the current generation.
+
+        Waits for the initial load when the server is still starting, and
+        raises ``PoolExhaustedError`` when ``pool_size`` sessions are already
+        running, whatever their keywords.
+        """
+        await self._ready.wait()
+        await self._sessions.acquire()
+        try:
+            generation = self.current
+            assert generation is not None
+            return await generation.acquire(
+                self.engine_key(generation, names, keyword_set)
+            )
+        except BaseException:
+            await self._sessions.release()
+            raise
+
+    async def release(self, lease: EngineLease) -> None:
+        try:
+            await lease.generation.release(lease)
+        finally:
+            await self._sessions.release()
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self.current is not None:
+            self.current.retired = True
+            self.current.active_sessions = 0
+            await self.current.close_if_drained()
@@ -0,0 +1,128 @@
+"""Streaming conversion of arbitrary PCM formats to the engine's input format."""
+import math
+
+import numpy as np
+
+_WIDTH_SCALE = {1: 1.0 / 128, 2: 1.0 / 32768, 3: 1.0 / 8388608, 4: 1.0 / 2147483648}
+
+
+def _design_polyphase(
+    up: int, down: int, taps_per_phase: int, beta: float
+) -> np.ndarray:
+    """Kaiser-windowed sinc low-pass split into ``up`` phases of ``taps_per_phase``."""
+    num_taps = taps_per_phase * up
+    # Cutoff at the lower Nyquist, in cycles per sample of the upsampled signal
+    cutoff = 0.5 / max(up, down) * 0.92
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, beta)
+    h *= up / h.sum()
+    # poly[p, k] = h[p + k * up]
+    return h.reshape(taps_per_phase, up).T.astype(np.float32).copy()
+
+
+class StreamingConverter:
+    """Converts a PCM stream to 16-bit mono at ``out_rate``, chunk by chunk.
+
+    Width conversion (8/16/24/32-bit), channel downmix and polyphase
+    resampling are vectorized with NumPy. Partial sample frames and the
+    filter history are carried across chunk boundaries, so chunks may be
+    any size.
+    """
+
+    def __init__(
+        self,
+        in_rate: int,
+        in_width: int,
+        in_channels: int,
+        out_rate: int = 16000,
+        taps_per_phase: int = 16,
+        beta: float = 8.0,
+    ) -> None:
+        if in_width not in _WIDTH_SCALE:
+            raise ValueError(f"Unsupported sample width: {in_width}")
+        if in_channels < 1 or in_rate < 1:
+            raise ValueError("Invalid audio format")
+
+        self.in_rate = in_rate
+        self.in_width = in_width
+        self.in_channels = in_channels
+        self.out_rate = out_rate
+
+        gcd = math.gcd(in_rate, out_rate)
+        self._up = out_rate // gcd
+        self._down = in_rate // gcd
+        self._resample = self._up != self._down
+        self._pending = b""
+
+        if self._resample:
+            # Longer filters when decimating keep the passband flat
+            taps = taps_per_phase * max(1, math.ceil(self._down / self._up))
+            self._poly = _design_polyphase(self._up, self._down, taps, beta)
+            self._taps = taps
+            self._history = np.zeros(taps - 1, dtype=np.float32)
+            # Global input index of history[0], and index of the next output
+            self._base = -(taps - 1)
+            self._next_output = 0
+            self._tap_offsets = np.arange(taps)
+
+    def matches(self, rate: int, width: int, channels: int) -> bool:
+        return (rate, width, channels) == (
+            self.in_rate,
+            self.in_width,
+            self.in_channels,
+        )
+
+    def process(self, audio: bytes) -> bytes:
+        """Convert one chunk; returns 16-bit little-endian mono PCM."""
+        frame_bytes = self.in_width * self.in_channels
+        if self._pending:
+            audio = self._pending + audio
+        usable = len(audio) - len(audio) % frame_bytes
+        self._pending = bytes(audio[usable:])
+        if usable == 0:
+            return b""
+
+        samples = self._decode(memoryview(audio)[:usable])
+        if self.in_channels > 1:
+            samples = samples.reshape(-1, self.in_channels).mean(axis=1)
+
+        if self._resample:
+            samples = self._polyphase(samples)
+
+        return np.clip(np.rint(samples * 32768), -32768, 32767).astype("<i2").tobytes()
+
+    def _decode(self, data: memoryview) -> np.ndarray:
+        """Interleaved PCM bytes to float32 in [-1, 1)."""
+        scale = np.float32(_WIDTH_SCALE[self.in_width])
+        if self.in_width == 1:
+            raw = np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128
+        elif self.in_width == 2:
+            raw = np.frombuffer(data, dtype="<i2").astype(np.float32)
+        elif self.in_width == 3:
+            b = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            raw = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)).astype(np.int32)
+            raw = np.where(raw >= 1 << 23, raw - (1 << 24), raw).astype(np.float32)
+        else:
+            raw = np.frombuffer(data, dtype="<i4").astype(np.float32)
+        return raw * scale
+
+    def _polyphase(self, x: np.ndarray) -> np.ndarray:
+        ext = np.concatenate((self._history, x.astype(np.float32, copy=False)))
+        last = self._base + len(ext) - 1  # global index of the newest input
+
+        # Outputs whose newest contributing input sample has arrived
+        end = (last * self._up + self._up - 1) // self._down + 1
+        if end > self._next_output:
+            t = np.arange(self._next_output, end, dtype=np.int64) * self._down
+            q = t // self._up - self._base
+            phase = t % self._up
+            window = ext[q[:, None] - self._tap_offsets[None, :]]
+            y = np.einsum("nk,nk->n", window, self._poly[phase])
+            self._next_output = end
+        else:
+            y = np.zeros(0, dtype=np.float32)
+
+        keep = self._taps - 1
+        self._history = ext[len(ext) - keep :].copy()
+        self._base = last - keep + 1
+        return y
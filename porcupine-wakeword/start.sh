@@ -5,43 +5,77 @@ HOST="${HOST:-0.0.0.0}"
 PORT="${PORT:-10400}"
 KEYWORDS="${KEYWORDS:-albert}"
 ACCESS_KEY="${ACCESS_KEY}"
+BACKEND="${BACKEND:-auto}"
+OWW_MODEL_DIR="${OWW_MODEL_DIR:-/app/oww}"
 SENSITIVITY="${SENSITIVITY:-0.5}"
 CUSTOM_MODEL_DIR="${CUSTOM_MODEL_DIR:-/app/models}"
+MODEL_WATCH_INTERVAL="${MODEL_WATCH_INTERVAL:-5}"
+POOL_SIZE="${POOL_SIZE:-8}"
+POOL_PREWARM="${POOL_PREWARM:-1}"
+POOL_TIMEOUT="${POOL_TIMEOUT:-5}"
+EXECUTOR="${EXECUTOR:-thread}"
+MAX_BACKLOG_MS="${MAX_BACKLOG_MS:-2000}"
+MAX_LAG_MS="${MAX_LAG_MS:-500}"
+OVERLOAD_POLICY="${OVERLOAD_POLICY:-drop_oldest}"
+ENGINE_CACHE_SIZE="${ENGINE_CACHE_SIZE:-4}"
+BATCH_INTERVAL_MS="${BATCH_INTERVAL_MS:-20}"
+BATCH_MAX_DELAY_MS="${BATCH_MAX_DELAY_MS:-40}"
 
-# Check if access key is provided
-if [ -z "$ACCESS_KEY" ]; then
+# Build arguments
+ARGS="--host ${HOST} --port ${PORT} --sensitivity ${SENSITIVITY}"
+ARGS="${ARGS} --backend ${BACKEND} --oww-model-dir ${OWW_MODEL_DIR}"
+# The access key is only needed for Porcupine keywords
+if [ -n "$ACCESS_KEY" ]; then
+    ARGS="${ARGS} --access-key ${ACCESS_KEY}"
+elif [ "$BACKEND" = "porcupine" ]; then
     echo "ERROR: ACCESS_KEY environment variable is required!"
     echo "Get your free access key from: https://console.picovoice.ai/"
     exit 1
 fi
-
-# Build arguments
-ARGS="--host ${HOST} --port ${PORT} --access-key ${ACCESS_KEY} --sensitivity ${SENSITIVITY}"
-
-# Check if custom wake word files exist
-CUSTOM_KEYWORD_PATHS=""
-for keyword in $KEYWORDS; do
-    KEYWORD_FILE="${CUSTOM_MODEL_DIR}/${keyword}.ppn"
-    if [ -f "$KEYWORD_FILE" ]; then
-        echo "Found custom wake word model: ${KEYWORD_FILE}"
-        CUSTOM_KEYWORD_PATHS="${CUSTOM_KEYWORD_PATHS} ${KEYWORD_FILE}"
-    fi
+ARGS="${ARGS} --pool-size ${POOL_SIZE} --pool-prewarm ${POOL_PREWARM} --pool-timeout ${POOL_TIMEOUT}"
+ARGS="${ARGS} --executor ${EXECUTOR} --max-backlog-ms ${MAX_BACKLOG_MS}"
+ARGS="${ARGS} --max-lag-ms ${MAX_LAG_MS} --overload-policy ${OVERLOAD_POLICY}"
+ARGS="${ARGS} --batch-interval-ms ${BATCH_INTERVAL_MS} --batch-max-delay-ms ${BATCH_MAX_DELAY_MS}"
+ARGS="${ARGS} --engine-cache-size ${ENGINE_CACHE_SIZE}"
+if [ -n "$KEYWORD_SENSITIVITIES" ]; then
+    ARGS="${ARGS} --keyword-sensitivity ${KEYWORD_SENSITIVITIES}"
+fi
+for PROFILE in $PROFILES; do
+    ARGS="${ARGS} --profile ${PROFILE}"
 done
+if [ -n "$METRICS_PORT" ]; then
+    ARGS="${ARGS} --metrics-port ${METRICS_PORT}"
+fi
+if [ -n "$CLIP_DIR" ]; then
+    ARGS="${ARGS} --clip-dir ${CLIP_DIR} --clip-seconds ${CLIP_SECONDS:-2} --clip-max-files ${CLIP_MAX_FILES:-500} --clip-max-mb ${CLIP_MAX_MB:-200}"
+fi
+if [ -n "$VAD_THRESHOLD" ]; then
+    ARGS="${ARGS} --vad-threshold ${VAD_THRESHOLD} --vad-hangover-ms ${VAD_HANGOVER_MS:-800} --vad-lookback-ms ${VAD_LOOKBACK_MS:-320}"
+fi
+if [ -n "$CACHE_DIR" ]; then
+    ARGS="${ARGS} --cache-dir ${CACHE_DIR}"
+fi
+if [ -n "$EXECUTOR_WORKERS" ]; then
+    ARGS="${ARGS} --executor-workers ${EXECUTOR_WORKERS}"
+fi
 
-# Use custom keyword paths if available, otherwise use built-in keywords
-if [ -n "$CUSTOM_KEYWORD_PATHS" ]; then
-    ARGS="${ARGS} --keyword-paths${CUSTOM_KEYWORD_PATHS}"
-    echo "Using custom wake word models"
-else
-    echo "No custom models found, trying built-in keywords"
-    for keyword in $KEYWORDS; do
-        ARGS="${ARGS} --keywords ${keyword}"
-    done
+# Keywords resolve to ${CUSTOM_MODEL_DIR}/<keyword>.ppn, .tflite or .onnx
+# when present, otherwise to Porcupine's built-in keywords. The server watches the
+# directory and reloads changed models without dropping connections.
+ARGS="${ARGS} --model-dir ${CUSTOM_MODEL_DIR} --model-watch-interval ${MODEL_WATCH_INTERVAL} --keywords ${KEYWORDS}"
+# Several ports with their own keywords, sharing this process's engines
+if [ -n "$LISTENERS_FILE" ]; then
+    ARGS="${ARGS} --listeners ${LISTENERS_FILE}"
 fi
 
-echo "Starting Porcupine wake word detection..."
-echo "Wake words: ${KEYWORDS}"
+echo "Starting wake word detection (backend: ${BACKEND})..."
+if [ -n "$LISTENERS_FILE" ]; then
+    echo "Listeners: ${LISTENERS_FILE}"
+else
+    echo "Wake words: ${KEYWORDS}"
+fi
 echo "Sensitivity: ${SENSITIVITY}"
 echo "Custom model directory: ${CUSTOM_MODEL_DIR}"
+echo "Engine pool: max ${POOL_SIZE} sessions, ${POOL_PREWARM} pre-warmed"
 
 exec python /app/wyoming_porcupine.py $ARGS
@@ -0,0 +1,126 @@
+"""Startup manifest: Describe info and validated keyword files from earlier runs."""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from wyoming.event import Event
+from wyoming.info import Info
+
+_LOGGER = logging.getLogger("wyoming_porcupine.startup")
+
+MANIFEST_VERSION = 2
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "wyoming-porcupine"
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StartupCache:
+    """What the last successful model load produced, kept across restarts.
+
+    The JSON manifest holds the SHA-256 of each keyword file (re-read only
+    when its size or mtime changes), the hashes of files that loaded into
+    a working engine, and per server configuration the resolved keywords
+    and their Describe info. At startup the cached info is served as soon
+    as the port is bound, provided every file it names still hashes to a
+    validated model; engines then load in the background. Keywords and
+    info are kept per keyword set, one per listener.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.path = Path(cache_dir) / "startup.json"
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if data.get("version") != MANIFEST_VERSION:
+            data = {"version": MANIFEST_VERSION, "hashes": {}, "configs": {}}
+        data.setdefault("validated", [])
+        return data
+
+    def hash(self, path: str) -> str:
+        stat = os.stat(path)
+        entry = self._data["hashes"].get(path)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return entry["sha256"]
+
+        digest = file_hash(path)
+        self._data["hashes"][path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+        }
+        return digest
+
+    def is_validated(self, path: str) -> bool:
+        try:
+            return self.hash(path) in self._data["validated"]
+        except OSError:
+            return False
+
+    def lookup(
+        self, key: str
+    ) -> Optional[tuple[dict[str, dict[str, str]], dict[str, Info]]]:
+        """Keyword files and Describe info per keyword set cached for ``key``."""
+        entry = self._data["configs"].get(key)
+        if entry is None or not all(
+            self.is_validated(path)
+            for keywords in entry["keywords"].values()
+            for path in keywords.values()
+        ):
+            return None
+        infos = {
+            name: Info.from_event(Event(type="info", data=data))
+            for name, data in entry["info"].items()
+        }
+        return entry["keywords"], infos
+
+    def store(
+        self, key: str, keywords: dict[str, dict[str, str]], infos: dict[str, Info]
+    ) -> None:
+        """Record a successful load of ``keywords`` and save the manifest."""
+        validated = set(self._data["validated"])
+        validated.update(
+            self.hash(path) for paths in keywords.values() for path in paths.values()
+        )
+
+        # Forget files that are gone and hashes no file has any more
+        hashes = {p: e for p, e in self._data["hashes"].items() if os.path.exists(p)}
+        current = {entry["sha256"] for entry in hashes.values()}
+        self._data["hashes"] = hashes
+        self._data["validated"] = sorted(validated & current)
+        self._data["configs"][key] = {
+            "keywords": keywords,
+            "info": {name: info.event().data for name, info in infos.items()},
+        }
+        self.save()
+
+    def save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+                json.dump(self._data, tmp_file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            _LOGGER.warning(f"Cannot save startup cache {self.path}: {e}")
@@ -0,0 +1,103 @@
+"""Energy gate that skips wake word inference on silent frames."""
+import math
+from collections import deque
+
+import numpy as np
+
+
+def dbfs_to_power(threshold_dbfs: float) -> float:
+    """Mean squared int16 sample value of a signal at ``threshold_dbfs``."""
+    return (32768 * 10 ** (threshold_dbfs / 20)) ** 2
+
+
+def frame_power(frames, frame_length: int) -> np.ndarray:
+    """Mean squared sample value of each whole int16 frame in ``frames``."""
+    samples = np.frombuffer(frames, dtype=np.int16).reshape(-1, frame_length)
+    return np.square(samples, dtype=np.float32).mean(axis=1)
+
+
+class EnergyGate:
+    """Per-session gate that only passes frames once speech-like energy appears.
+
+    Frame RMS is computed for a whole batch at once. When a frame rises
+    above ``threshold_dbfs`` the gate opens and the last ``lookback_ms`` of
+    skipped frames are replayed first so the word onset reaches the engine;
+    it stays open for ``hangover_ms`` after the last loud frame.
+    """
+
+    def __init__(
+        self,
+        frame_length: int,
+        sample_rate: int,
+        threshold_dbfs: float = -45.0,
+        hangover_ms: float = 800.0,
+        lookback_ms: float = 320.0,
+    ) -> None:
+        frame_ms = frame_length * 1000 / sample_rate
+        self.frame_length = frame_length
+        self.threshold_dbfs = threshold_dbfs
+        # Compare squared RMS against squared linear threshold (int16 scale)
+        self._threshold = dbfs_to_power(threshold_dbfs)
+        self._hangover_frames = math.ceil(hangover_ms / frame_ms)
+        self._lookback: deque[tuple[int, bytes]] = deque(
+            maxlen=math.ceil(lookback_ms / frame_ms)
+        )
+        self._open_frames = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def reset(self) -> None:
+        # Frames still waiting in the lookback were never processed
+        self.frames_skipped += len(self._lookback)
+        self._lookback.clear()
+        self._open_frames = 0
+
+    def filter(self, frames: memoryview, batch_start: int):
+        """Select the frames to run through the engine.
+
+        ``frames`` holds whole int16 frames starting at stream sample
+        ``batch_start``. Returns the PCM to process and the stream sample
+        position at the end of each frame in it.
+        """
+        count = len(frames) // self.frame_length
+        loud = frame_power(frames, self.frame_length) >= self._threshold
+
+        self.frames_seen += count
+        if self._open_frames > 0 and (self._open_frames >= count or loud.all()):
+            # Gate stays open for the whole batch: pass it through untouched
+            if loud.any():
+                last_loud = count - 1 - int(np.argmax(loud[::-1]))
+                self._open_frames = self._hangover_frames - (count - 1 - last_loud)
+            else:
+                self._open_frames -= count
+            frame_ends = range(
+                batch_start + self.frame_length,
+                batch_start + (count + 1) * self.frame_length,
+                self.frame_length,
+            )
+            return frames, frame_ends
+
+        selected: list[bytes] = []
+        frame_ends: list[int] = []
+        for i in range(count):
+            frame_end = batch_start + (i + 1) * self.frame_length
+            frame = frames[i * self.frame_length : (i + 1) * self.frame_length]
+            if loud[i]:
+                # Replay the lookback so the onset is not lost
+                while self._lookback:
+                    lookback_end, lookback_frame = self._lookback.popleft()
+                    selected.append(lookback_frame)
+                    frame_ends.append(lookback_end)
+                self._open_frames = self._hangover_frames
+            elif self._open_frames > 0:
+                self._open_frames -= 1
+            else:
+                if len(self._lookback) == self._lookback.maxlen:
+                    self.frames_skipped += 1
+                self._lookback.append((frame_end, frame.tobytes()))
+                continue
+
+            selected.append(frame.tobytes())
+            frame_ends.append(frame_end)
+
+        return b"".join(selected), frame_ends
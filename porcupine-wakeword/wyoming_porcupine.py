@@ -1,110 +1,341 @@
 #!/usr/bin/env python3
-"""Wyoming protocol server for Porcupine wake word detection."""
+"""Wyoming protocol server for Porcupine and openWakeWord wake word detection."""
 import argparse
 import asyncio
 import logging
-import wave
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
-import pvporcupine
 from wyoming.audio import AudioChunk, AudioStart, AudioStop
+from wyoming.error import Error
 from wyoming.event import Event
-from wyoming.info import Describe, Info, WakeModel, WakeProgram, Attribution
+from wyoming.info import Describe
 from wyoming.server import AsyncEventHandler, AsyncTcpServer
 from wyoming.wake import Detect, Detection
 
+import metrics
+from audio_buffer import AudioHistory, AudioRingBuffer, SampleClock
+from backpressure import OVERLOAD_POLICIES, LagTracker, OverloadPolicy
+from clip_spool import ClipSpool
+from engine_pool import PoolExhaustedError
+from engines import BACKENDS
+from inference import EXECUTOR_MODES, InferenceExecutor
+from listeners import Listener, load_listeners
+from model_manager import EngineLease, KeywordSet, ListenerModels, ModelManager
+from resample import StreamingConverter
+from startup_cache import StartupCache, default_cache_dir
+from vad import EnergyGate
+
 _LOGGER = logging.getLogger("wyoming_porcupine")
 
 
 class PorcupineEventHandler(AsyncEventHandler):
-    """Event handler for Porcupine wake word detection."""
+    """Event handler for wake word detection sessions."""
 
     def __init__(
         self,
         reader,
         writer,
-        porcupine: pvporcupine.Porcupine,
-        info: Info,
-        keyword_names: list[str],
+        models: ListenerModels,
+        executor: InferenceExecutor,
+        max_backlog_ms: float = 2000.0,
+        clip_spool: Optional[ClipSpool] = None,
+        clip_seconds: float = 2.0,
+        vad_settings: Optional[dict] = None,
+        overload: Optional[OverloadPolicy] = None,
     ) -> None:
         super().__init__(reader, writer)
-        self.porcupine = porcupine
-        self._info = info
-        self._keyword_names = keyword_names
-        self._audio_buffer = bytearray()
+        self._models = models
+        self._executor = executor
+        self.engine: Optional[Any] = None
+        self._lease: Optional[EngineLease] = None
+        self._max_backlog_ms = max_backlog_ms
+        self._audio_buffer: Optional[AudioRingBuffer] = None
+        self._clock: Optional[SampleClock] = None
+        self._lag: Optional[LagTracker] = None
+        self._overload = overload or OverloadPolicy()
+        self._clip_spool = clip_spool
+        self._clip_seconds = clip_seconds
+        self._history: Optional[AudioHistory] = None
+        self._converter: Optional[StreamingConverter] = None
+        self._vad_settings = vad_settings
+        self._gate: Optional[EnergyGate] = None
         self._is_detecting = False
+        metrics.ACTIVE_CONNECTIONS.inc()
 
     async def handle_event(self, event: Event) -> bool:
         """Handle events from Wyoming protocol."""
         if Describe.is_type(event.type):
             # Send info about this wake word service
-            await self.write_event(self._info.event())
+            await self.write_event(self._models.info.event())
             return True
 
         if Detect.is_type(event.type):
             # Start detection
             _LOGGER.debug("Starting wake word detection")
+            names = Detect.from_event(event).names
+            if self._lease is not None and self._lease.key != self._models.engine_key(
+                self._lease.generation, names
+            ):
+                # Different keywords or sensitivities than the engine held
+                await self._release_engine()
+
+            if self._lease is None:
+                try:
+                    self._lease = await self._models.acquire(names)
+                except PoolExhaustedError as e:
+                    _LOGGER.warning(f"Rejecting detection: {e}")
+                    metrics.SESSIONS_REJECTED.inc()
+                    # A re-Detect may have released the previous engine
+                    self._is_detecting = False
+                    self._converter = None
+                    if self._audio_buffer is not None:
+                        self._audio_buffer.clear()
+                    self._reset_gate()
+                    await self.write_event(
+                        Error(text=str(e), code="pool-exhausted").event()
+                    )
+                    return True
+                self.engine = self._lease.engine
+                metrics.ACTIVE_SESSIONS.inc()
+
+            if (
+                self._audio_buffer is None
+                or self._audio_buffer.frame_length != self.engine.frame_length
+            ):
+                self._audio_buffer = AudioRingBuffer.for_duration(
+                    self.engine.frame_length,
+                    self.engine.sample_rate,
+                    self._max_backlog_ms,
+                )
+                self._clock = SampleClock(self.engine.sample_rate)
+                self._lag = LagTracker(self.engine.sample_rate)
+                if self._clip_spool is not None:
+                    self._history = AudioHistory.for_duration(
+                        self.engine.sample_rate, self._clip_seconds
+                    )
+                if self._vad_settings is not None:
+                    self._gate = EnergyGate(
+                        self.engine.frame_length,
+                        self.engine.sample_rate,
+                        **self._vad_settings,
+                    )
+
             self._is_detecting = True
             self._audio_buffer.clear()
+            self._clock.reset()
+            self._lag.reset()
+            self._converter = None
+            if self._history is not None:
+                self._history.clear()
+            self._reset_gate()
             return True
 
         if AudioStart.is_type(event.type):
             # Audio stream started
             _LOGGER.debug("Audio stream started")
+            if self._is_detecting:
+                # Sample clock starts at the stream's own timestamp
+                start = AudioStart.from_event(event)
+                self._audio_buffer.clear()
+                self._clock.reset(start.timestamp)
+                self._lag.reset()
+                self._converter = None
+                self._reset_gate()
+                return await self._set_audio_format(
+                    start.rate, start.width, start.channels
+                )
             return True
 
         if AudioChunk.is_type(event.type):
             # Process audio chunk
             if self._is_detecting:
                 chunk = AudioChunk.from_event(event)
-                await self._process_audio_chunk(chunk)
+                if await self._set_audio_format(
+                    chunk.rate, chunk.width, chunk.channels
+                ):
+                    await self._process_audio_chunk(chunk)
             return True
 
         if AudioStop.is_type(event.type):
             # Audio stream stopped
             _LOGGER.debug("Audio stream stopped")
             self._is_detecting = False
-            self._audio_buffer.clear()
+            if self._audio_buffer is not None:
+                self._audio_buffer.clear()
+            self._reset_gate()
+            await self._release_engine()
             return True
 
         return True
 
+    async def disconnect(self) -> None:
+        """Return the session's engine when the client goes away."""
+        metrics.ACTIVE_CONNECTIONS.dec()
+        await self._release_engine()
+
+    def _reset_gate(self) -> None:
+        if self._gate is None:
+            return
+
+        skipped_before = self._gate.frames_skipped
+        self._gate.reset()
+        metrics.FRAMES_SKIPPED.inc(self._gate.frames_skipped - skipped_before)
+        if self._gate.frames_seen:
+            _LOGGER.debug(
+                f"Energy gate skipped {self._gate.frames_skipped}"
+                f"/{self._gate.frames_seen} frames"
+            )
+
+    async def _release_engine(self) -> None:
+        if self._lease is not None:
+            lease, self._lease = self._lease, None
+            self.engine = None
+            metrics.ACTIVE_SESSIONS.dec()
+            await self._models.release(lease)
+
+    async def _shed(self, lag: float) -> None:
+        """End a session too far behind real time to produce useful detections."""
+        _LOGGER.warning(f"Shedding session {lag:.2f} s behind real time")
+        self._is_detecting = False
+        self._audio_buffer.clear()
+        self._reset_gate()
+        await self._release_engine()
+        await self.write_event(
+            Error(
+                text=f"Server overloaded: {lag:.1f} s behind real time",
+                code="overloaded",
+            ).event()
+        )
+
+    async def _set_audio_format(self, rate: int, width: int, channels: int) -> bool:
+        """Set up conversion for the client's audio format if it isn't the engine's."""
+        if (rate, width, channels) == (self.engine.sample_rate, 2, 1):
+            self._converter = None
+            return True
+
+        converter = self._converter
+        if converter is not None and converter.matches(rate, width, channels):
+            return True
+
+        try:
+            self._converter = StreamingConverter(
+                rate, width, channels, out_rate=self.engine.sample_rate
+            )
+        except ValueError as e:
+            _LOGGER.error(f"Unsupported audio format: {e}")
+            self._is_detecting = False
+            self._audio_buffer.clear()
+            self._reset_gate()
+            # Don't hold the engine and session slot until AudioStop
+            await self._release_engine()
+            await self.write_event(
+                Error(text=str(e), code="unsupported-format").event()
+            )
+            return False
+
+        _LOGGER.debug(
+            f"Converting audio from {rate} Hz, {width * 8}-bit, {channels} channel(s)"
+        )
+        return True
+
     async def _process_audio_chunk(self, chunk: AudioChunk) -> None:
         """Process audio chunk for wake word detection."""
-        # Add audio to buffer
-        self._audio_buffer.extend(chunk.audio)
+        received = time.perf_counter()
 
-        # Porcupine expects 16-bit PCM at 16kHz
+        # Engines expect 16-bit mono PCM at their sample rate (16 kHz)
         # frame_length = 512 samples (32ms at 16kHz)
-        frame_length_bytes = self.porcupine.frame_length * 2  # 2 bytes per sample
-
-        while len(self._audio_buffer) >= frame_length_bytes:
-            # Extract one frame
-            frame_bytes = self._audio_buffer[:frame_length_bytes]
-            self._audio_buffer = self._audio_buffer[frame_length_bytes:]
-
-            # Convert bytes to int16 array
-            import struct
-            frame = struct.unpack(
-                f"{self.porcupine.frame_length}h",
-                frame_bytes
+        audio = chunk.audio
+        if self._converter is not None:
+            audio = self._converter.process(audio)
+
+        num_samples = len(audio) // self._audio_buffer.sample_width
+        self._clock.add_chunk(num_samples, chunk.timestamp)
+        dropped = self._audio_buffer.write(audio)
+        if dropped:
+            _LOGGER.warning(f"Audio backlog full, dropped {dropped} oldest samples")
+            metrics.SAMPLES_DROPPED.inc(dropped)
+
+        # Compare audio received with audio processed against the wall clock
+        now = time.monotonic()
+        self._lag.receive(num_samples, now)
+        lag = self._lag.lag(self._audio_buffer.read_position, now)
+        metrics.SESSION_LAG_SECONDS.observe(lag)
+        action, frames_dropped = self._overload.relieve(
+            self._audio_buffer, lag, self._clock.sample_rate
+        )
+        if action is not None:
+            metrics.OVERLOAD_DECISIONS.inc(action=action)
+            metrics.OVERLOAD_FRAMES_DROPPED.inc(frames_dropped, action=action)
+            if action == "shed":
+                await self._shed(lag)
+                return
+            _LOGGER.debug(
+                f"Session {lag:.2f} s behind real time: {action} "
+                f"dropped {frames_dropped} frames"
+            )
+
+        metrics.BACKLOG_SECONDS.observe(
+            len(self._audio_buffer)
+            / self._audio_buffer.sample_width
+            / self._clock.sample_rate
+        )
+
+        if not self._audio_buffer.available_frames:
+            return
+
+        # All whole frames as one zero-copy int16 view, valid until next write
+        batch_start = self._audio_buffer.read_position
+        frames = self._audio_buffer.read_frames()
+        frame_length = self._audio_buffer.frame_length
+
+        if self._gate is not None:
+            # Only frames the energy gate lets through reach the engine
+            skipped_before = self._gate.frames_skipped
+            pcm, frame_ends = self._gate.filter(frames, batch_start)
+            metrics.FRAMES_SKIPPED.inc(self._gate.frames_skipped - skipped_before)
+        else:
+            pcm = frames
+            frame_ends = range(
+                batch_start + frame_length,
+                batch_start + len(frames) + frame_length,
+                frame_length,
             )
 
-            # Process frame
-            keyword_index = self.porcupine.process(frame)
+        # Process the batch off the event loop, one keyword index per frame
+        keyword_indices = []
+        if pcm:
+            keyword_indices = await self._executor.process(self.engine, pcm)
 
+        history_end = 0
+        for frame_index, keyword_index in enumerate(keyword_indices):
             if keyword_index >= 0:
-                # Wake word detected!
-                keyword_name = self._keyword_names[keyword_index]
-                _LOGGER.info(f"Wake word detected: {keyword_name}")
+                # Wake word detected at the end of this frame
+                keyword_name = self._lease.keyword_names[keyword_index]
+                frame_end = frame_ends[frame_index]
+                timestamp = self._clock.to_ms(frame_end)
+                _LOGGER.info(f"Wake word detected: {keyword_name} at {timestamp} ms")
+
+                if self._history is not None:
+                    # Clip ends exactly at the frame that triggered
+                    detection_end = max(history_end, frame_end - batch_start)
+                    self._history.append(frames[history_end:detection_end])
+                    history_end = detection_end
+                    self._clip_spool.submit(
+                        keyword_name, timestamp, self._history.snapshot()
+                    )
 
                 # Send detection event
-                detection = Detection(
-                    name=keyword_name,
-                    timestamp=0  # You could add proper timestamp if needed
-                )
+                detection = Detection(name=keyword_name, timestamp=timestamp)
                 await self.write_event(detection.event())
+                metrics.DETECTIONS.inc(keyword=keyword_name)
+                metrics.DETECTION_LATENCY_SECONDS.observe(
+                    time.perf_counter() - received
+                )
+
+        if self._history is not None:
+            self._history.append(frames[history_end:])
 
 
 def _build_arg_parser() -> argparse.ArgumentParser:
@@ -121,8 +352,8 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         "--access-key",
-        required=True,
-        help="Picovoice Access Key (get from https://console.picovoice.ai/)",
+        help="Picovoice Access Key (get from https://console.picovoice.ai/); "
+        "required for Porcupine keywords",
     )
     parser.add_argument(
         "--sensitivity",
@@ -130,6 +361,38 @@ def _build_arg_parser() -> argparse.ArgumentParser:
         default=0.5,
         help="Detection sensitivity (0.0-1.0, default: 0.5)",
     )
+    parser.add_argument(
+        "--keyword-sensitivity",
+        action="append",
+        default=[],
+        metavar="KEYWORD=VALUE",
+        help="Sensitivity for one keyword, overriding --sensitivity (repeatable)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        default=[],
+        metavar="NAME:KEYWORD=VALUE[,KEYWORD=VALUE]",
+        help=(
+            "Named sensitivity profile a client selects by putting NAME in "
+            "Detect names; only its keywords are detected unless keywords "
+            "are named too (repeatable)"
+        ),
+    )
+    parser.add_argument(
+        "--listeners",
+        metavar="FILE",
+        help="JSON file defining several listeners, each with its own "
+        "host/port, keywords, sensitivities and backend, served by this one "
+        "process; replaces --port, --keywords and the sensitivity options",
+    )
+    parser.add_argument(
+        "--engine-cache-size",
+        type=int,
+        default=4,
+        help="Keyword/sensitivity combinations whose engines stay loaded, one "
+        "pool each (default: 4)",
+    )
     parser.add_argument(
         "--model-path",
         help="Path to custom Porcupine model file (.pv)",
@@ -137,93 +400,324 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--keyword-paths",
         nargs="+",
-        help="Paths to custom keyword files (.ppn)",
+        help="Paths to custom keyword files (.ppn, .tflite or .onnx); "
+        "overrides --model-dir",
+    )
+    parser.add_argument(
+        "--model-dir",
+        help="Directory with custom keyword files named <keyword>.ppn, "
+        "<keyword>.tflite or <keyword>.onnx; keywords without one fall back "
+        "to Porcupine's built-in models",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(default_cache_dir()),
+        help="Where to keep the startup manifest that lets Describe be "
+        "answered before engines load; empty disables it "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + BACKENDS,
+        default="auto",
+        help="Only load keyword models of this backend (default: auto, by "
+        "file suffix)",
+    )
+    parser.add_argument(
+        "--oww-model-dir",
+        help="Directory with openWakeWord's melspectrogram and embedding_model "
+        "files (default: the installed openwakeword package's models)",
+    )
+    parser.add_argument(
+        "--model-watch-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between checks for changed keyword files; 0 disables "
+        "(SIGHUP always reloads) (default: 5.0)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=8,
+        help="Maximum number of concurrent detection sessions, across all "
+        "keywords and listeners (default: 8)",
+    )
+    parser.add_argument(
+        "--pool-prewarm",
+        type=int,
+        default=1,
+        help="Engines created at startup (default: 1)",
+    )
+    parser.add_argument(
+        "--pool-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for a free engine before rejecting a session; "
+        "0 rejects immediately (default: 5.0)",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=EXECUTOR_MODES,
+        default="thread",
+        help="Run inference on a thread pool or one worker process per core "
+        "(default: thread)",
+    )
+    parser.add_argument(
+        "--executor-workers",
+        type=int,
+        help="Number of inference threads/processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--batch-interval-ms",
+        type=float,
+        default=20.0,
+        help="How long frames wait for other sessions' frames to join an "
+        "openWakeWord batch (default: 20)",
+    )
+    parser.add_argument(
+        "--batch-max-delay-ms",
+        type=float,
+        default=40.0,
+        help="Maximum latency batching may add, including the batch run time "
+        "(default: 40)",
+    )
+    parser.add_argument(
+        "--max-backlog-ms",
+        type=float,
+        default=2000.0,
+        help="Maximum buffered audio per session; the oldest frames are "
+        "dropped beyond it (default: 2000)",
+    )
+    parser.add_argument(
+        "--max-lag-ms",
+        type=float,
+        default=500.0,
+        help="How far a session may fall behind real time before the "
+        "overload policy applies (default: 500)",
+    )
+    parser.add_argument(
+        "--overload-policy",
+        choices=OVERLOAD_POLICIES,
+        default="drop_oldest",
+        help="What a lagging session does: drop its oldest audio, skip its "
+        "quiet audio, or end (default: drop_oldest)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics over HTTP on this port (default: disabled)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        help="Bind address for the metrics endpoint (default: same as --host)",
+    )
+    parser.add_argument(
+        "--clip-dir",
+        help="Save the audio preceding each detection as WAV files here "
+        "(default: disabled)",
+    )
+    parser.add_argument(
+        "--clip-seconds",
+        type=float,
+        default=2.0,
+        help="Seconds of audio saved per detection (default: 2.0)",
+    )
+    parser.add_argument(
+        "--clip-max-files",
+        type=int,
+        default=500,
+        help="Oldest clips are deleted beyond this many files (default: 500)",
+    )
+    parser.add_argument(
+        "--clip-max-mb",
+        type=float,
+        default=200.0,
+        help="Oldest clips are deleted beyond this total size (default: 200)",
+    )
+    parser.add_argument(
+        "--vad-threshold",
+        type=float,
+        help="Skip inference on frames quieter than this level in dBFS, "
+        "e.g. -45 (default: disabled)",
+    )
+    parser.add_argument(
+        "--vad-hangover-ms",
+        type=float,
+        default=800.0,
+        help="Keep processing this long after the last loud frame (default: 800)",
+    )
+    parser.add_argument(
+        "--vad-lookback-ms",
+        type=float,
+        default=320.0,
+        help="Skipped audio replayed when the gate opens (default: 320)",
     )
     return parser
 
 
-async def main_async() -> None:
-    args = _build_arg_parser().parse_args()
-    logging.basicConfig(level=logging.INFO)
+def _parse_sensitivities(items: list[str]) -> dict[str, float]:
+    """Parse ``KEYWORD=VALUE`` pairs (comma separated or repeated)."""
+    sensitivities: dict[str, float] = {}
+    for item in items:
+        for pair in filter(None, item.split(",")):
+            keyword, sep, value = pair.partition("=")
+            if not sep:
+                raise ValueError(f"Expected KEYWORD=VALUE, got: {pair}")
+            sensitivity = float(value)
+            if not 0.0 <= sensitivity <= 1.0:
+                raise ValueError(f"Sensitivity must be 0.0-1.0: {pair}")
+            sensitivities[keyword.strip().lower()] = sensitivity
+    return sensitivities
 
-    _LOGGER.info("Initializing Porcupine wake word engine...")
 
-    # Prepare keywords
-    if args.keyword_paths:
-        # Custom keyword files
-        keyword_paths = [Path(p) for p in args.keyword_paths]
-        keywords = None
-        keyword_names = [p.stem for p in keyword_paths]
-    else:
-        # Built-in keywords
-        keywords = [k.lower() for k in args.keywords]
-        keyword_paths = None
-        keyword_names = keywords
+def _parse_profiles(items: list[str]) -> dict[str, dict[str, float]]:
+    profiles: dict[str, dict[str, float]] = {}
+    for item in items:
+        name, sep, values = item.partition(":")
+        if not sep or not name:
+            raise ValueError(f"Expected NAME:KEYWORD=VALUE[,...], got: {item}")
+        profiles[name.strip().lower()] = _parse_sensitivities([values])
+    return profiles
 
-    _LOGGER.info(f"Wake words: {', '.join(keyword_names)}")
 
-    # Create sensitivity list (one per keyword)
-    sensitivities = [args.sensitivity] * len(keyword_names)
+async def main_async() -> None:
+    parser = _build_arg_parser()
+    args = parser.parse_args()
+    try:
+        if args.listeners:
+            listeners = load_listeners(
+                args.listeners,
+                host=args.host,
+                sensitivity=args.sensitivity,
+                backend=args.backend,
+            )
+        else:
+            keyword_set = KeywordSet(
+                args.keywords,
+                sensitivity=args.sensitivity,
+                keyword_sensitivities=_parse_sensitivities(args.keyword_sensitivity),
+                profiles=_parse_profiles(args.profile),
+                backend=args.backend,
+                keyword_paths=args.keyword_paths,
+            )
+            listeners = [Listener(args.host, args.port, keyword_set)]
+    except ValueError as e:
+        parser.error(str(e))
+    logging.basicConfig(level=logging.INFO)
+    started = time.monotonic()
+
+    _LOGGER.info("Initializing wake word engines...")
+
+    # Inference runs off the event loop; engines live where they run
+    executor = InferenceExecutor(
+        mode=args.executor,
+        workers=args.executor_workers,
+        batch_interval=args.batch_interval_ms / 1000,
+        batch_max_delay=args.batch_max_delay_ms / 1000,
+    )
 
-    # Initialize Porcupine
+    # Keyword models of every listener, one engine pool per loaded generation
+    models = ModelManager(
+        executor,
+        access_key=args.access_key,
+        keyword_sets=[listener.keyword_set for listener in listeners],
+        model_dir=Path(args.model_dir) if args.model_dir else None,
+        model_path=args.model_path,
+        pool_size=args.pool_size,
+        pool_prewarm=args.pool_prewarm,
+        pool_timeout=args.pool_timeout,
+        engine_cache_size=args.engine_cache_size,
+        watch_interval=args.model_watch_interval,
+        oww_model_dir=Path(args.oww_model_dir) if args.oww_model_dir else None,
+        startup_cache=StartupCache(Path(args.cache_dir)) if args.cache_dir else None,
+    )
     try:
-        porcupine = pvporcupine.create(
-            access_key=args.access_key,
-            keywords=keywords,
-            keyword_paths=keyword_paths,
-            model_path=args.model_path,
-            sensitivities=sensitivities,
-        )
-        _LOGGER.info(f"Porcupine initialized successfully")
-        _LOGGER.info(f"Sample rate: {porcupine.sample_rate} Hz")
-        _LOGGER.info(f"Frame length: {porcupine.frame_length} samples")
+        # Describe info only; engines load after the port is bound
+        models.prepare()
     except Exception as e:
-        _LOGGER.error(f"Failed to initialize Porcupine: {e}")
+        _LOGGER.error(f"Failed to initialize wake word engines: {e}")
+        executor.close()
         raise
 
-    # Create Wyoming info
-    info = Info(
-        wake=[
-            WakeProgram(
-                name="porcupine",
-                description="Porcupine wake word detection",
-                attribution=Attribution(
-                    name="Picovoice",
-                    url="https://picovoice.ai/",
-                ),
-                installed=True,
-                version=pvporcupine.__version__,
-                models=[
-                    WakeModel(
-                        name=name,
-                        description=f"Porcupine wake word: {name}",
-                        attribution=Attribution(
-                            name="Picovoice",
-                            url="https://picovoice.ai/",
-                        ),
-                        installed=True,
-                        version=pvporcupine.__version__,
-                        languages=["en"],  # Adjust based on keyword
-                    )
-                    for name in keyword_names
-                ],
-            )
-        ]
+    clip_spool = None
+    if args.clip_dir:
+        clip_spool = ClipSpool(
+            Path(args.clip_dir),
+            max_files=args.clip_max_files,
+            max_bytes=int(args.clip_max_mb * 1024 * 1024),
+        )
+        await clip_spool.start()
+
+    vad_settings = None
+    if args.vad_threshold is not None:
+        vad_settings = {
+            "threshold_dbfs": args.vad_threshold,
+            "hangover_ms": args.vad_hangover_ms,
+            "lookback_ms": args.vad_lookback_ms,
+        }
+        _LOGGER.info(f"Energy gate enabled at {args.vad_threshold} dBFS")
+
+    overload = OverloadPolicy(
+        args.overload_policy,
+        max_lag=args.max_lag_ms / 1000,
+        silence_dbfs=-45.0 if args.vad_threshold is None else args.vad_threshold,
     )
 
-    # Create server
-    server = AsyncTcpServer(args.host, args.port)
-
-    def handler_factory(reader, writer):
-        return PorcupineEventHandler(reader, writer, porcupine, info, keyword_names)
+    def handler_factory(listener: Listener):
+        listener_models = models.listener(listener.name)
+        return lambda reader, writer: PorcupineEventHandler(
+            reader,
+            writer,
+            listener_models,
+            executor,
+            max_backlog_ms=args.max_backlog_ms,
+            clip_spool=clip_spool,
+            clip_seconds=args.clip_seconds,
+            vad_settings=vad_settings,
+            overload=overload,
+        )
 
-    _LOGGER.info(f"Starting Wyoming Porcupine server on {args.host}:{args.port}")
-    _LOGGER.info(f"Listening for wake words: {', '.join(keyword_names)}")
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = await metrics.start_metrics_server(
+            args.metrics_host or args.host, args.metrics_port
+        )
 
+    # One server per listener, all sharing the models and the executor
+    server_tasks = []
+    for listener in listeners:
+        _LOGGER.info(
+            f"Starting Wyoming Porcupine server '{listener.name}' on "
+            f"{listener.host}:{listener.port}"
+        )
+        server = AsyncTcpServer(listener.host, listener.port)
+        server_tasks.append(asyncio.create_task(server.run(handler_factory(listener))))
     try:
-        await server.run(handler_factory)
+        try:
+            await models.start()
+            _LOGGER.info(
+                f"Wake word engines ready after {time.monotonic() - started:.2f} s"
+            )
+        except Exception as e:
+            _LOGGER.error(f"Failed to initialize wake word engines: {e}")
+            raise
+
+        for listener in listeners:
+            keyword_names = models.current.keyword_sets[listener.name]
+            _LOGGER.info(
+                f"Listening for wake words on {listener.host}:{listener.port}: "
+                f"{', '.join(keyword_names)}"
+            )
+        await asyncio.gather(*server_tasks)
     finally:
-        porcupine.delete()
+        for server_task in server_tasks:
+            server_task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        if clip_spool is not None:
+            await clip_spool.close()
+        await models.close()
+        executor.close()
 
 
 def main() -> None:
@@ -0,0 +1,129 @@
+"""
+Decode TTS responses and normalize them into training-ready WAV files
+
+Responses may be WAV, MP3 or OGG at any rate and channel count. Each is
+decoded with soundfile, mixed to mono, resampled to 16 kHz, trimmed of
+leading/trailing silence, peak-normalized and checked for a plausible
+duration before it is written as 16-bit PCM. Every sample gets a
+metadata record (duration, RMS, peak, source format...) whether it was
+kept or rejected, so bad samples can be filtered out later.
+
+normalize_to_file is a plain top-level function so it can run in a
+process pool while threads wait on the network.
+"""
+
+import io
+import os
+from pathlib import Path
+
+import numpy as np
+import soundfile
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+SAMPLE_RATE = 16000
+TRIM_THRESHOLD_DB = -40.0  # Relative to the clip's peak
+TRIM_PADDING_MS = 50
+TRIM_WINDOW_MS = 10
+PEAK_DBFS = -1.0
+MIN_DURATION = 0.2  # Seconds after trimming
+MAX_DURATION = 3.0
+MIN_RMS_DBFS = -50.0
+
+
+def sniff_format(data):
+    """Container format from the first bytes of a response"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "wav"
+    if data[:4] == b"OggS":
+        return "ogg"
+    if data[:4] == b"fLaC":
+        return "flac"
+    if data[:3] == b"ID3" or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return "unknown"
+
+
+def decode(data):
+    """Decode encoded audio bytes; returns (float32 samples, rate, channels)"""
+    audio, rate = soundfile.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    return audio, rate, audio.shape[1]
+
+
+def to_mono_16k(audio, rate):
+    mono = audio.mean(axis=1) if audio.ndim > 1 else audio
+    if rate != SAMPLE_RATE:
+        g = np.gcd(rate, SAMPLE_RATE)
+        mono = resample_poly(mono, SAMPLE_RATE // g, rate // g)
+    return mono.astype(np.float32)
+
+
+def trim_silence(audio):
+    """Cut leading and trailing windows quieter than TRIM_THRESHOLD_DB below peak"""
+    window = SAMPLE_RATE * TRIM_WINDOW_MS // 1000
+    count = len(audio) // window
+    if count == 0:
+        return audio
+
+    rms = np.sqrt(np.mean(audio[: count * window].reshape(count, window) ** 2, axis=1))
+    threshold = rms.max() * 10 ** (TRIM_THRESHOLD_DB / 20)
+    loud = np.flatnonzero(rms > threshold)
+    if len(loud) == 0:
+        return audio[:0]
+
+    padding = SAMPLE_RATE * TRIM_PADDING_MS // 1000
+    start = max(0, loud[0] * window - padding)
+    end = min(len(audio), (loud[-1] + 1) * window + padding)
+    return audio[start:end]
+
+
+def _dbfs(value):
+    return float(20 * np.log10(max(value, 1e-10)))
+
+
+def normalize_to_file(data, output_file, metadata=None):
+    """Decode, normalize and validate one response; write it if it passes
+
+    Returns the metadata record; ``ok`` tells whether the file was written
+    and ``reason`` why not.
+    """
+    record = dict(metadata or {})
+    record.update(file=Path(output_file).name, bytes=len(data), format=sniff_format(data))
+
+    try:
+        audio, rate, channels = decode(data)
+    except (RuntimeError, ValueError, soundfile.LibsndfileError) as e:
+        record.update(ok=False, reason=f"decode failed: {e}")
+        return record
+
+    record.update(source_rate=rate, source_channels=channels)
+    audio = to_mono_16k(audio, rate)
+    source_duration = len(audio) / SAMPLE_RATE
+    audio = trim_silence(audio)
+
+    duration = len(audio) / SAMPLE_RATE
+    peak = float(np.abs(audio).max()) if len(audio) else 0.0
+    rms = float(np.sqrt(np.mean(audio**2))) if len(audio) else 0.0
+    record.update(
+        duration=round(duration, 3),
+        trimmed=round(source_duration - duration, 3),
+        source_peak_dbfs=round(_dbfs(peak), 1),
+    )
+
+    if duration < MIN_DURATION or duration > MAX_DURATION:
+        record.update(ok=False, reason=f"duration {duration:.2f}s out of range")
+        return record
+    if _dbfs(rms) < MIN_RMS_DBFS:
+        record.update(ok=False, reason=f"too quiet ({_dbfs(rms):.1f} dBFS RMS)")
+        return record
+
+    gain = 10 ** (PEAK_DBFS / 20) / peak
+    audio = audio * gain
+    record.update(rms_dbfs=round(_dbfs(rms * gain), 1), ok=True)
+
+    pcm = np.clip(np.rint(audio * 32767), -32768, 32767).astype(np.int16)
+    tmp_file = Path(f"{output_file}.part")
+    with open(tmp_file, "wb") as f:
+        wavfile.write(f, SAMPLE_RATE, pcm)
+    os.replace(tmp_file, output_file)
+    return record
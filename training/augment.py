@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Batch data augmentation for wake word training samples
+
+Loads clips in batches and applies, to whole batches at once:
+
+  - time stretch (phase vocoder, tempo only)
+  - pitch shift (stretch, then resample back to the original tempo)
+  - gain
+  - room impulse response convolution
+  - background noise mixing at a random SNR
+
+Every step is vectorized over the batch with NumPy/SciPy; batches are
+spread over a process pool and each worker writes its own outputs.
+Room impulse responses and noise are read from data/rir and data/noise
+when those directories hold WAV files, and synthesized otherwise.
+
+Usage:
+    python augment.py data/positive --variations 10
+"""
+
+import argparse
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import fftconvolve, istft, resample_poly, stft
+
+SAMPLE_RATE = 16000
+BATCH_SIZE = 64
+AUGMENTED_SUFFIX = "_aug"
+
+# Parameter ranges
+STRETCH_RANGE = (0.85, 1.15)  # Tempo factor
+PITCH_RANGE = (-2.0, 2.0)  # Semitones
+GAIN_RANGE_DB = (-12.0, 3.0)
+SNR_RANGE_DB = (5.0, 25.0)
+RIR_PROBABILITY = 0.5
+NOISE_PROBABILITY = 0.8
+RT60_RANGE = (0.15, 0.8)  # Seconds, for synthetic room responses
+
+N_FFT = 512
+HOP = 128
+
+
+# -----------------------------------------------------------------------------
+# I/O
+# -----------------------------------------------------------------------------
+
+
+def load_wav(path):
+    """Read a WAV file as float32 mono at SAMPLE_RATE"""
+    rate, data = wavfile.read(str(path))
+    if data.dtype == np.uint8:
+        audio = (data.astype(np.float32) - 128) / 128
+    elif data.dtype.kind == "i":
+        audio = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        audio = data.astype(np.float32)
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if rate != SAMPLE_RATE:
+        g = np.gcd(rate, SAMPLE_RATE)
+        audio = resample_poly(audio, SAMPLE_RATE // g, rate // g).astype(np.float32)
+    return audio
+
+
+def save_wav(path, audio):
+    pcm = np.clip(np.rint(audio * 32767), -32768, 32767).astype(np.int16)
+    tmp_path = Path(f"{path}.part")
+    with open(tmp_path, "wb") as f:
+        wavfile.write(f, SAMPLE_RATE, pcm)
+    os.replace(tmp_path, path)
+
+
+def load_bank(directory):
+    """All WAV files in a directory, as a list of float32 arrays"""
+    if directory is None or not Path(directory).is_dir():
+        return []
+    bank = []
+    for path in sorted(Path(directory).rglob("*.wav")):
+        try:
+            bank.append(load_wav(path))
+        except (OSError, ValueError):
+            continue
+    return [audio for audio in bank if len(audio)]
+
+
+def to_batch(clips):
+    """Stack clips into a zero-padded (N, L) array plus their lengths"""
+    lengths = np.array([len(clip) for clip in clips])
+    batch = np.zeros((len(clips), lengths.max()), dtype=np.float32)
+    for i, clip in enumerate(clips):
+        batch[i, : len(clip)] = clip
+    return batch, lengths
+
+
+# -----------------------------------------------------------------------------
+# Vectorized transforms: every function takes and returns an (N, L) batch
+# -----------------------------------------------------------------------------
+
+
+def resample_batch(batch, lengths, factors):
+    """Resample each row by its own factor (>1 shortens) with linear interpolation"""
+    out_lengths = np.maximum(1, np.round(lengths / factors)).astype(int)
+    positions = np.arange(out_lengths.max())[None, :] * factors[:, None]
+    i0 = np.minimum(positions.astype(int), batch.shape[1] - 1)
+    i1 = np.minimum(i0 + 1, batch.shape[1] - 1)
+    frac = (positions - i0).astype(np.float32)
+    rows = np.arange(len(batch))[:, None]
+    out = batch[rows, i0] * (1 - frac) + batch[rows, i1] * frac
+    out[np.arange(out.shape[1])[None, :] >= out_lengths[:, None]] = 0
+    return out.astype(np.float32), out_lengths
+
+
+def time_stretch_batch(batch, lengths, rates):
+    """Phase vocoder: change tempo by ``rates`` (>1 faster) keeping pitch"""
+    _, _, spec = stft(batch, nperseg=N_FFT, noverlap=N_FFT - HOP, axis=-1)
+    num_frames = spec.shape[2]
+
+    out_frames = int(np.ceil(num_frames / rates.min()))
+    steps = np.arange(out_frames)[None, :] * rates[:, None]
+    steps = np.minimum(steps, num_frames - 1)
+    i0 = np.floor(steps).astype(int)
+    frac = (steps - i0)[:, None, :]
+    padded = np.concatenate([spec, np.zeros_like(spec[:, :, :1])], axis=2)
+    # Gather real magnitude/phase rather than complex frames: half the memory
+    magnitude = np.abs(padded)
+    angle = np.angle(padded)
+    index0 = i0[:, None, :]
+    m0 = np.take_along_axis(magnitude, index0, axis=2)
+    m1 = np.take_along_axis(magnitude, index0 + 1, axis=2)
+    p0 = np.take_along_axis(angle, index0, axis=2)
+    p1 = np.take_along_axis(angle, index0 + 1, axis=2)
+
+    magnitude = (1 - frac) * m0 + frac * m1
+    omega = (2 * np.pi * HOP * np.arange(spec.shape[1]) / N_FFT)[None, :, None]
+    delta = p1 - p0 - omega
+    delta = delta - 2 * np.pi * np.round(delta / (2 * np.pi)) + omega
+    phase = angle[:, :, :1] + np.cumsum(delta, axis=2) - delta
+    _, out = istft(magnitude * np.exp(1j * phase), nperseg=N_FFT, noverlap=N_FFT - HOP)
+
+    out_lengths = np.maximum(1, np.round(lengths / rates)).astype(int)
+    out = out[:, : out_lengths.max()].astype(np.float32)
+    out[np.arange(out.shape[1])[None, :] >= out_lengths[:, None]] = 0
+    return out, out_lengths
+
+
+def pitch_shift_batch(batch, lengths, semitones, rates=None):
+    """Shift pitch by stretching, then resampling back to the original tempo
+
+    With ``rates`` the tempo is changed as well, in the same single
+    phase vocoder pass.
+    """
+    factors = 2.0 ** (semitones / 12)
+    if rates is None:
+        rates = np.ones_like(factors)
+    stretched, stretched_lengths = time_stretch_batch(batch, lengths, rates / factors)
+    return resample_batch(stretched, stretched_lengths, factors)
+
+
+def synthetic_rirs(rng, count, rt60s):
+    """Exponentially decaying noise tails, one per RT60"""
+    length = int(RT60_RANGE[1] * SAMPLE_RATE)
+    t = np.arange(length)[None, :] / SAMPLE_RATE
+    decay = np.exp(-6.9 * t / rt60s[:, None])  # -60 dB at t = RT60
+    rirs = rng.standard_normal((count, length)).astype(np.float32) * decay
+    rirs[:, 0] = 1.0  # Direct path
+    return rirs / np.linalg.norm(rirs, axis=1, keepdims=True)
+
+
+def convolve_rirs_batch(batch, lengths, rirs):
+    """Convolve each row with its room impulse response, keeping the level"""
+    wet = fftconvolve(batch, rirs, axes=1)[:, : batch.shape[1]]
+    dry_rms = np.sqrt(np.mean(batch**2, axis=1, keepdims=True)) + 1e-9
+    wet_rms = np.sqrt(np.mean(wet**2, axis=1, keepdims=True)) + 1e-9
+    return (wet * dry_rms / wet_rms).astype(np.float32)
+
+
+def mix_noise_batch(rng, batch, lengths, noise_bank, snrs_db):
+    """Add a random noise excerpt to each row at its SNR"""
+    count, width = batch.shape
+    if noise_bank:
+        bank = np.concatenate(noise_bank)
+        if len(bank) < width:
+            bank = np.resize(bank, width)
+        starts = rng.integers(0, len(bank) - width + 1, count)
+        noise = bank[starts[:, None] + np.arange(width)[None, :]]
+    else:
+        # Pink noise: white noise shaped to a 1/f power spectrum
+        white = rng.standard_normal((count, width)).astype(np.float32)
+        spectrum = np.fft.rfft(white, axis=1)
+        spectrum /= np.sqrt(np.arange(1, spectrum.shape[1] + 1))[None, :]
+        noise = np.fft.irfft(spectrum, n=width, axis=1).astype(np.float32)
+
+    valid = np.arange(width)[None, :] < lengths[:, None]
+    signal_power = (batch**2).sum(axis=1) / lengths
+    noise_power = (noise**2 * valid).sum(axis=1) / lengths + 1e-12
+    scale = np.sqrt(signal_power / (noise_power * 10 ** (snrs_db / 10)))
+    return (batch + noise * scale[:, None] * valid).astype(np.float32)
+
+
+def augment_batch(rng, clips, rir_bank=(), noise_bank=()):
+    """Apply a random chain of augmentations to every clip in ``clips``
+
+    Returns the augmented clips and the parameters drawn for each.
+    """
+    count = len(clips)
+    batch, lengths = to_batch(clips)
+
+    # Time stretch and pitch shift together
+    rates = rng.uniform(*STRETCH_RANGE, count)
+    semitones = rng.uniform(*PITCH_RANGE, count)
+    batch, lengths = pitch_shift_batch(batch, lengths, semitones, rates)
+
+    params = [
+        {"rate": round(float(r), 3), "semitones": round(float(p), 2)}
+        for r, p in zip(rates, semitones)
+    ]
+
+    reverb = rng.random(count) < RIR_PROBABILITY
+    if reverb.any():
+        if rir_bank:
+            picks = rng.integers(0, len(rir_bank), reverb.sum())
+            rirs, _ = to_batch([rir_bank[i] for i in picks])
+        else:
+            rirs = synthetic_rirs(rng, reverb.sum(), rng.uniform(*RT60_RANGE, reverb.sum()))
+        batch[reverb] = convolve_rirs_batch(batch[reverb], lengths[reverb], rirs)
+    for i, has_reverb in enumerate(reverb):
+        params[i]["reverb"] = bool(has_reverb)
+
+    noisy = rng.random(count) < NOISE_PROBABILITY
+    if noisy.any():
+        snrs = rng.uniform(*SNR_RANGE_DB, noisy.sum())
+        batch[noisy] = mix_noise_batch(
+            rng, batch[noisy], lengths[noisy], list(noise_bank), snrs
+        )
+        for i, snr in zip(np.flatnonzero(noisy), snrs):
+            params[i]["snr_db"] = round(float(snr), 1)
+
+    gain_db = rng.uniform(*GAIN_RANGE_DB, count)
+    for i, gain in enumerate(gain_db):
+        params[i]["gain_db"] = round(float(gain), 1)
+
+    gains = 10 ** (gain_db / 20)
+    batch *= gains[:, None].astype(np.float32)
+
+    # Soft limit rows that would clip instead of wrapping around in int16
+    peaks = np.abs(batch).max(axis=1)
+    batch /= np.maximum(peaks, 0.99)[:, None] / 0.99
+    return [batch[i, : lengths[i]] for i in range(count)], params
+
+
+# -----------------------------------------------------------------------------
+# Process pool
+# -----------------------------------------------------------------------------
+
+_BANKS = {}
+
+
+def _init_worker(rir_dir, noise_dir):
+    _BANKS["rir"] = load_bank(rir_dir)
+    _BANKS["noise"] = load_bank(noise_dir)
+
+
+def _augment_files(jobs):
+    """Worker: load a batch of sources, augment, write outputs
+
+    Returns one record per written file: its source and the parameters used.
+    """
+    clips = []
+    outputs = []
+    for source, output, seed in jobs:
+        try:
+            clip = load_wav(source)
+        except (OSError, ValueError):
+            continue
+        if len(clip) >= N_FFT:
+            clips.append(clip)
+            outputs.append((source, output, seed))
+    if not clips:
+        return []
+
+    # One generator per batch, seeded from its outputs: reruns are reproducible
+    rng = np.random.default_rng([seed for _, _, seed in outputs])
+    augmented, params = augment_batch(
+        rng, clips, _BANKS.get("rir", []), _BANKS.get("noise", [])
+    )
+    records = []
+    for (source, output, _), audio, clip_params in zip(outputs, augmented, params):
+        save_wav(output, audio)
+        records.append({"file": output.name, "source": source.name, **clip_params})
+    return records
+
+
+def augment_directory(
+    source_dir,
+    variations,
+    output_dir=None,
+    workers=None,
+    rir_dir=None,
+    noise_dir=None,
+    log=print,
+):
+    """Write ``variations`` augmented copies of every clip in ``source_dir``
+
+    Outputs are named <stem>_aug<k>.wav; existing outputs are skipped, so
+    an interrupted run resumes. The parameters used for each output are
+    appended to augmentations.jsonl. Returns the number of files written.
+    """
+    source_dir = Path(source_dir)
+    output_dir = Path(output_dir) if output_dir else source_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = []
+    for source in sorted(source_dir.glob("*.wav")):
+        if AUGMENTED_SUFFIX in source.stem:
+            continue
+        for k in range(variations):
+            output = output_dir / f"{source.stem}{AUGMENTED_SUFFIX}{k}.wav"
+            if not output.exists():
+                seed = zlib.crc32(output.name.encode("utf-8"))
+                jobs.append((source, output, seed))
+
+    if not jobs:
+        log(f"  Augmented samples for {source_dir} are up to date")
+        return 0
+
+    batches = [jobs[i : i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+    log(f"  Augmenting: {len(jobs)} new files in {len(batches)} batches")
+
+    written = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(rir_dir, noise_dir)
+    ) as pool:
+        for done, records in enumerate(pool.map(_augment_files, batches), 1):
+            with open(output_dir / "augmentations.jsonl", "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            written += len(records)
+            if done % 10 == 0 or done == len(batches):
+                log(f"  Augmented {written}/{len(jobs)} files")
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Augment wake word training samples")
+    parser.add_argument("source_dir", help="Directory of WAV clips to augment")
+    parser.add_argument("--output-dir", help="Where to write (default: source_dir)")
+    parser.add_argument("--variations", type=int, default=3, help="Copies per clip")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPUs)")
+    parser.add_argument("--rir-dir", default="data/rir", help="Room impulse responses")
+    parser.add_argument("--noise-dir", default="data/noise", help="Background noise")
+    args = parser.parse_args()
+
+    written = augment_directory(
+        args.source_dir,
+        args.variations,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        rir_dir=args.rir_dir,
+        noise_dir=args.noise_dir,
+    )
+    print(f"Wrote {written} augmented samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,20 @@ import os
 import sys
 import json
 import time
-import wave
 import random
+import threading
 import requests
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+from audio_normalize import normalize_to_file, sniff_format
+from augment import augment_directory
+from features import build_dataset
+from mine_negatives import mine
+from tts_cache import TTSCache, quantize_speed, request_key
 
 # Configuration
 TTS_URL = "http://192.168.106.15"  # Luxembourgish Fish-Speech TTS
@@ -25,7 +33,37 @@ MODEL_NAME = f"roberto_{LANGUAGE}"
 # Training parameters
 POSITIVE_SAMPLES = 200  # Number of "Roberto" samples
 NEGATIVE_SAMPLES = 1000  # Background/other words
-VARIATIONS_PER_SAMPLE = 3  # Speed/pitch variations
+VARIATIONS_PER_SAMPLE = 10  # Augmented copies of each positive sample
+
+# TTS request settings
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "8"))  # Max concurrent requests
+TTS_TIMEOUT = 30  # Seconds per request
+TTS_MAX_RETRIES = 4
+TTS_BACKOFF = 0.5  # Seconds, doubled per retry
+TTS_ENDPOINTS = ["/api/tts", "/tts", "/generate"]
+TTS_PAYLOADS = [
+    lambda text, speed: {"text": text, "speed": speed, "language": LANGUAGE},
+    lambda text, speed: {"text": text, "speed": speed},
+    lambda text, speed: {"input": text, "speed": speed},
+]
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TTS_VOICE = os.environ.get("TTS_VOICE")  # Sent as "voice" when set
+TTS_CACHE_MB = int(os.environ.get("TTS_CACHE_MB", "2048"))
+
+# Hard-negative mining: long wake-word-free recordings (os.pathsep separated)
+MINING_SOURCES = [p for p in os.environ.get("MINING_SOURCES", "").split(os.pathsep) if p]
+MINING_THRESHOLD = float(os.environ.get("MINING_THRESHOLD", "0.5"))
+
+# Training
+# "embedding" trains on openWakeWord speech embeddings, giving a model the
+# server's openWakeWord backend can serve; "logmel" trains on log-mel frames,
+# which the server cannot load, so that model gets its own file name
+FEATURE_KIND = os.environ.get("FEATURE_KIND", "embedding")
+if FEATURE_KIND not in ("embedding", "logmel"):
+    raise SystemExit(f"FEATURE_KIND must be embedding or logmel, not {FEATURE_KIND!r}")
+SERVABLE = FEATURE_KIND == "embedding"
+MODEL_FILE = f"{MODEL_NAME}.tflite" if SERVABLE else f"{MODEL_NAME}_logmel.tflite"
+TRAIN_THREADS = int(os.environ.get("TRAIN_THREADS", "0")) or None  # None: all CPUs
 
 # Luxembourgish words for negative samples
 NEGATIVE_WORDS = [
@@ -37,113 +75,298 @@ NEGATIVE_WORDS = [
     "Lëtzebuerg", "Freed", "Traureg", "Schéin", "Mies",
 ]
 
+class TTSError(Exception):
+    """TTS request failed; ``retry`` tells whether trying again may help"""
+
+    def __init__(self, message, retry=False, retry_after=None):
+        super().__init__(message)
+        self.retry = retry
+        self.retry_after = retry_after
+
+
+class AdaptiveRateLimiter:
+    """Concurrency limit that adapts to the TTS server's response times
+
+    Starts at one request in flight and grows by one after each full window
+    of fast responses, up to ``max_limit``. When the smoothed latency rises
+    to twice the best observed, or the server signals overload, the limit is
+    halved (AIMD, as in TCP congestion control).
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max(1, max_limit)
+        self.limit = 1
+        self.in_flight = 0
+        self.best_latency = None
+        self.avg_latency = None
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, latency=None, overloaded=False):
+        with self._cond:
+            if latency is not None:
+                # Smoothed latency, so one slow response does not halve the limit
+                if self.best_latency is None:
+                    self.best_latency = self.avg_latency = latency
+                self.best_latency = min(self.best_latency, latency)
+                self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+                overloaded = overloaded or self.avg_latency > 2 * self.best_latency
+
+            if overloaded:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
 class RobertoTrainer:
     def __init__(self):
         self.base_dir = Path(__file__).parent
         self.data_dir = self.base_dir / "data"
         self.positive_dir = self.data_dir / "positive"
         self.negative_dir = self.data_dir / "negative"
+        self.features_dir = self.data_dir / "features"
         self.models_dir = self.base_dir / "models"
         self.logs_dir = self.base_dir / "logs"
+        self.cache_dir = self.base_dir / "cache" / "tts"
+        self.checkpoints_dir = self.base_dir / "checkpoints" / Path(MODEL_FILE).stem
 
         # Create directories
         for dir_path in [self.positive_dir, self.negative_dir, self.models_dir, self.logs_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
 
+        # One session, with a connection pool sized for the worker threads
         self.session = requests.Session()
-        self.session.timeout = 30
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TTS_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = AdaptiveRateLimiter(TTS_WORKERS)
+        self.tts_cache = TTSCache(self.cache_dir, max_bytes=TTS_CACHE_MB * 1024 * 1024)
+
+        # (endpoint, payload format) found by discover_tts_api, shared by all workers
+        self.tts_api = None
+        self._discover_error = None
+        self._discover_lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+        # Decoding runs in worker processes while threads wait on the network
+        self.decode_pool = None
+        self._metadata_lock = threading.Lock()
 
     def log(self, message):
         """Log message to console and file"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_msg = f"[{timestamp}] {message}"
-        print(log_msg)
 
         log_file = self.logs_dir / f"training_{datetime.now().strftime('%Y%m%d')}.log"
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_msg + "\n")
-
-    def generate_tts_sample(self, text, speed=1.0, output_file=None):
-        """Generate audio sample using Fish-Speech TTS"""
-        try:
-            # Try common TTS API endpoints
-            endpoints = [
-                f"{TTS_URL}/api/tts",
-                f"{TTS_URL}/tts",
-                f"{TTS_URL}/generate",
-            ]
-
-            for endpoint in endpoints:
-                try:
-                    # Try different payload formats
-                    payloads = [
-                        {"text": text, "speed": speed, "language": LANGUAGE},
-                        {"text": text, "speed": speed},
-                        {"input": text, "speed": speed},
-                    ]
-
-                    for payload in payloads:
+        with self._log_lock:
+            print(log_msg)
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(log_msg + "\n")
+
+    def discover_tts_api(self, text=WAKE_WORD):
+        """Find a working endpoint/payload combination once and cache it"""
+        with self._discover_lock:
+            if self.tts_api is not None:
+                return self.tts_api
+            if self._discover_error is not None:
+                raise self._discover_error
+
+            for endpoint in TTS_ENDPOINTS:
+                for payload_format in TTS_PAYLOADS:
+                    try:
                         response = self.session.post(
-                            endpoint,
-                            json=payload,
-                            headers={"Content-Type": "application/json"}
+                            f"{TTS_URL}{endpoint}",
+                            json=payload_format(text, 1.0),
+                            timeout=TTS_TIMEOUT,
                         )
+                    except requests.RequestException:
+                        continue
+
+                    if response.status_code == 200 and response.content:
+                        self.tts_api = (endpoint, payload_format)
+                        self.log(f"Using TTS endpoint {TTS_URL}{endpoint}")
+                        return self.tts_api
+
+            self._discover_error = TTSError(f"No working TTS endpoint found at {TTS_URL}")
+            self.log(f"ERROR: {self._discover_error}")
+            raise self._discover_error
+
+    def request_tts(self, text, speed=1.0):
+        """One TTS request through the rate limiter; returns the audio bytes"""
+        endpoint, payload_format = self.discover_tts_api()
+        payload = payload_format(text, speed)
+        if TTS_VOICE:
+            payload["voice"] = TTS_VOICE
+        with self.limiter:
+            start = time.monotonic()
+            try:
+                response = self.session.post(
+                    f"{TTS_URL}{endpoint}",
+                    json=payload,
+                    timeout=TTS_TIMEOUT,
+                )
+            except requests.RequestException as e:
+                self.limiter.record(overloaded=True)
+                raise TTSError(str(e), retry=True)
+            latency = time.monotonic() - start
+
+        if response.status_code in RETRY_STATUS:
+            self.limiter.record(overloaded=True)
+            retry_after = response.headers.get("Retry-After", "")
+            raise TTSError(
+                f"HTTP {response.status_code}",
+                retry=True,
+                retry_after=float(retry_after) if retry_after.isdigit() else None,
+            )
+        if response.status_code != 200 or not response.content:
+            raise TTSError(f"HTTP {response.status_code}")
+
+        self.limiter.record(latency)
+        return response.content
+
+    def generate_tts_sample(self, text, speed=1.0, output_file=None, variant=0):
+        """Generate audio sample using Fish-Speech TTS, from the cache if possible
+
+        Speed is quantized to the cache grid. ``variant`` distinguishes
+        several takes of the same request, since the TTS is not deterministic.
+        """
+        speed = quantize_speed(speed)
+        key, params = request_key(text, speed, TTS_VOICE, LANGUAGE, variant)
+        audio = self.tts_cache.get(key)
+        cached = audio is not None
+
+        attempt = 0
+        while audio is None:
+            try:
+                audio = self.request_tts(text, speed)
+            except TTSError as e:
+                if e is self._discover_error:
+                    return None
+                if not e.retry or attempt == TTS_MAX_RETRIES:
+                    self.log(f"WARNING: Could not generate TTS for '{text}': {e}")
+                    return None
+                delay = e.retry_after or TTS_BACKOFF * 2 ** attempt
+                time.sleep(delay * random.uniform(0.8, 1.2))
+                attempt += 1
+
+        # Only cache responses known to be audio: an error page or truncated
+        # body served with HTTP 200 would otherwise be rejected on every run
+        if output_file:
+            metadata = {"text": text, "speed": speed, "variant": variant}
+            ok = self.convert_to_wav(audio, output_file, metadata)
+            if ok and not cached:
+                self.tts_cache.put(key, audio, params)
+            elif not ok and cached:
+                self.tts_cache.discard(key)
+            return ok
+        if not cached and sniff_format(audio) != "unknown":
+            self.tts_cache.put(key, audio, params)
+        return audio
+
+    def generate_samples(self, jobs, label):
+        """Generate (text, speed, output_file) jobs concurrently, skipping existing files"""
+        # Number repeated (text, quantized speed) requests, so each job maps to
+        # a stable cache entry that other runs and speed ranges can reuse
+        takes = {}
+        variants = []
+        for text, speed, _ in jobs:
+            request = (text, quantize_speed(speed))
+            variants.append(takes.get(request, 0))
+            takes[request] = variants[-1] + 1
+
+        pending = [
+            job + (variant,)
+            for job, variant in zip(jobs, variants)
+            if not (job[2].exists() and job[2].stat().st_size > 0)
+        ]
+        existing = len(jobs) - len(pending)
+        if existing:
+            self.log(f"  Resuming: {existing} {label} samples already on disk")
+        if not pending:
+            return existing
+
+        count = existing
+        hits_before = self.tts_cache.hits
+        with ThreadPoolExecutor(max_workers=TTS_WORKERS) as pool, \
+                ProcessPoolExecutor() as self.decode_pool:
+            futures = [
+                pool.submit(self.generate_tts_sample, text, speed, output_file, variant)
+                for text, speed, output_file, variant in pending
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                if future.result():
+                    count += 1
+                if done % 50 == 0:
+                    self.log(
+                        f"  Generated {count}/{len(jobs)} {label} samples "
+                        f"({self.limiter.limit} requests in flight)"
+                    )
+        self.decode_pool = None
+
+        self.tts_cache.flush()
+        self.log(
+            f"  TTS cache: {self.tts_cache.hits - hits_before} hits, "
+            f"{len(self.tts_cache)} entries ({self.tts_cache.total_bytes / 1e6:.1f} MB)"
+        )
+        return count
 
-                        if response.status_code == 200:
-                            # Save audio file
-                            if output_file:
-                                with open(output_file, 'wb') as f:
-                                    f.write(response.content)
-                                return True
-                            return response.content
-                except Exception:
-                    continue
-
-            self.log(f"WARNING: Could not generate TTS for '{text}'. Skipping...")
-            return None
-
-        except Exception as e:
-            self.log(f"ERROR generating TTS: {e}")
-            return None
+    def convert_to_wav(self, audio_data, output_file, metadata=None):
+        """Decode a TTS response and write it as normalized 16kHz mono WAV
 
-    def convert_to_wav(self, audio_data, output_file):
-        """Convert audio data to 16kHz mono WAV format"""
+        Appends the sample's metadata (duration, RMS, rejection reason...)
+        to metadata.jsonl next to it. Returns True if the sample was kept.
+        """
         try:
-            # If audio_data is already a file path, just ensure correct format
-            # This is a placeholder - actual conversion would depend on TTS output format
-            with wave.open(str(output_file), 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)  # 16-bit
-                wf.setframerate(SAMPLE_RATE)
-                if isinstance(audio_data, bytes):
-                    wf.writeframes(audio_data)
-            return True
+            if self.decode_pool is not None:
+                record = self.decode_pool.submit(
+                    normalize_to_file, audio_data, output_file, metadata
+                ).result()
+            else:
+                record = normalize_to_file(audio_data, output_file, metadata)
         except Exception as e:
             self.log(f"ERROR converting audio: {e}")
             return False
 
+        with self._metadata_lock:
+            with open(Path(output_file).parent / "metadata.jsonl", 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        if not record["ok"]:
+            self.log(f"WARNING: Rejected {record['file']}: {record['reason']}")
+        return record["ok"]
+
     def generate_positive_samples(self):
         """Generate positive samples (Roberto)"""
         self.log("=" * 60)
         self.log(f"Generating {POSITIVE_SAMPLES} positive samples...")
         self.log("=" * 60)
 
-        count = 0
+        jobs = []
         for i in range(POSITIVE_SAMPLES):
-            # Vary speed for different pronunciations
-            speed = random.uniform(0.85, 1.15)
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = self.positive_dir / f"roberto_{timestamp}.wav"
-
-            if self.generate_tts_sample(WAKE_WORD, speed=speed, output_file=filename):
-                count += 1
-                if count % 10 == 0:
-                    self.log(f"  Generated {count}/{POSITIVE_SAMPLES} positive samples...")
-
-            # Small delay to avoid overwhelming the TTS server
-            time.sleep(0.1)
-
+            # Vary speed for different pronunciations; seeded by index so a
+            # resumed run requests exactly the samples that are missing
+            rng = random.Random(f"positive-{i}")
+            speed = rng.uniform(0.85, 1.15)
+            filename = self.positive_dir / f"roberto_{i:05d}.wav"
+            jobs.append((WAKE_WORD, speed, filename))
+
+        count = self.generate_samples(jobs, "positive")
         self.log(f"OK - Generated {count} positive samples")
         return count
 
@@ -153,63 +376,101 @@ class RobertoTrainer:
         self.log(f"Generating {NEGATIVE_SAMPLES} negative samples...")
         self.log("=" * 60)
 
-        count = 0
+        jobs = []
         for i in range(NEGATIVE_SAMPLES):
             # Random word from negative list
-            word = random.choice(NEGATIVE_WORDS)
-            speed = random.uniform(0.85, 1.15)
+            rng = random.Random(f"negative-{i}")
+            word = rng.choice(NEGATIVE_WORDS)
+            speed = rng.uniform(0.85, 1.15)
+            filename = self.negative_dir / f"negative_{i:05d}.wav"
+            jobs.append((word, speed, filename))
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = self.negative_dir / f"negative_{timestamp}.wav"
+        count = self.generate_samples(jobs, "negative")
+        self.log(f"OK - Generated {count} negative samples")
+        return count
 
-            if self.generate_tts_sample(word, speed=speed, output_file=filename):
-                count += 1
-                if count % 50 == 0:
-                    self.log(f"  Generated {count}/{NEGATIVE_SAMPLES} negative samples...")
+    def augment_positive_samples(self):
+        """Multiply positive samples with local augmentation instead of more TTS calls"""
+        self.log("=" * 60)
+        self.log(f"Augmenting positive samples x{VARIATIONS_PER_SAMPLE}...")
+        self.log("=" * 60)
 
-            time.sleep(0.05)
+        written = augment_directory(
+            self.positive_dir,
+            VARIATIONS_PER_SAMPLE,
+            rir_dir=self.data_dir / "rir",
+            noise_dir=self.data_dir / "noise",
+            log=self.log,
+        )
+        self.log(f"OK - Wrote {written} augmented samples")
+        return written
+
+    def mine_hard_negatives(self):
+        """Add windows the previous model falsely accepts to the negative set"""
+        model_file = self.models_dir / MODEL_FILE
+        sources = MINING_SOURCES or [str(self.data_dir / "background")]
+        sources = [s for s in sources if Path(s).exists()]
+        if not SERVABLE:
+            self.log("Skipping hard-negative mining (log-mel models cannot be served)")
+            return 0
+        if not model_file.exists() or not sources:
+            self.log("Skipping hard-negative mining (no previous model or no sources)")
+            return 0
 
-        self.log(f"OK - Generated {count} negative samples")
-        return count
+        self.log("=" * 60)
+        self.log(f"Mining hard negatives with {model_file.name}...")
+        self.log("=" * 60)
+
+        try:
+            mined = mine([model_file], sources, self.negative_dir, MINING_THRESHOLD, log=self.log)
+        except ValueError as e:
+            # e.g. a log-mel model left by a run before embeddings were the default
+            self.log(f"ERROR - Hard-negative mining refused the previous model: {e}")
+            return 0
+        self.log(f"OK - Added {mined} hard negatives")
+        return mined
+
+    def build_feature_dataset(self):
+        """Featurize samples into memory-mapped shards, reusing unchanged files"""
+        self.log("=" * 60)
+        self.log("Building feature dataset...")
+        self.log("=" * 60)
+
+        computed = build_dataset(
+            {"positive": [self.positive_dir], "negative": [self.negative_dir]},
+            self.features_dir,
+            kind=FEATURE_KIND,
+            log=self.log,
+        )
+        self.log(f"OK - Featurized {computed} new or changed samples")
+        return computed
 
     def train_model(self):
-        """Train the wake word model using openWakeWord"""
+        """Train the wake word model on the feature dataset (CPU friendly)"""
         self.log("=" * 60)
         self.log("Training Roberto wake word model...")
         self.log("=" * 60)
 
         try:
-            # Check if openWakeword is installed
-            try:
-                import openwakeword
-                from openwakeword.train import train_model
-            except ImportError:
-                self.log("Installing openWakeWord...")
-                os.system(f"{sys.executable} -m pip install openwakeword")
-                from openwakeword.train import train_model
-
-            # Training configuration
+            from train_cpu import train
+
             config = {
-                "model_name": MODEL_NAME,
-                "positive_data_dir": str(self.positive_dir),
-                "negative_data_dir": str(self.negative_dir),
-                "output_dir": str(self.models_dir),
-                "sample_rate": SAMPLE_RATE,
-                "epochs": 100,
-                "batch_size": 32,
+                "features_dir": str(self.features_dir),
+                "output_file": str(self.models_dir / MODEL_FILE),
+                "work_dir": str(self.checkpoints_dir),
+                "threads": TRAIN_THREADS,
             }
 
             self.log(f"Training with config: {json.dumps(config, indent=2)}")
 
-            # Train the model
-            train_model(**config)
+            # Resumes from the latest checkpoint if a previous run was interrupted
+            model_file = train(**config, log=self.log)
 
-            model_file = self.models_dir / f"{MODEL_NAME}.tflite"
-            if model_file.exists():
-                size = model_file.stat().st_size / 1024
+            if model_file and Path(model_file).exists():
+                size = Path(model_file).stat().st_size / 1024
                 self.log(f"OK - Model trained successfully!")
                 self.log(f"     Output: {model_file} ({size:.1f} KB)")
-                return str(model_file)
+                return model_file
             else:
                 self.log("ERROR - Model file not created")
                 return None
@@ -228,6 +489,12 @@ class RobertoTrainer:
         self.log(f"TTS Server: {TTS_URL}")
         self.log(f"Wake Word: {WAKE_WORD}")
         self.log(f"Language: {LANGUAGE}")
+        self.log(f"Features: {FEATURE_KIND}")
+        if not SERVABLE:
+            self.log(
+                "WARNING: log-mel models cannot be served by the wake word server; "
+                f"writing {MODEL_FILE} (set FEATURE_KIND=embedding for a servable model)"
+            )
         self.log("")
 
         start_time = time.time()
@@ -235,11 +502,16 @@ class RobertoTrainer:
         # Step 1: Generate positive samples
         positive_count = self.generate_positive_samples()
 
-        # Step 2: Generate negative samples
+        # Step 2: Augment positive samples (time/pitch, room, noise, gain)
+        self.augment_positive_samples()
+
+        # Step 3: Generate negative samples
         negative_count = self.generate_negative_samples()
 
-        # Step 3: Train the model
+        # Step 4: Mine hard negatives with the previous model, then train
         if positive_count > 50 and negative_count > 100:
+            self.mine_hard_negatives()
+            self.build_feature_dataset()
             model_path = self.train_model()
 
             if model_path:
@@ -253,6 +525,9 @@ class RobertoTrainer:
                 self.log(f"Model: {model_path}")
                 self.log(f"Time elapsed: {elapsed/60:.1f} minutes")
                 self.log("")
+                if not SERVABLE:
+                    self.log("WARNING: This log-mel model cannot be served by the wake word server")
+                    return model_path
                 self.log("Next step: Deploy to Unraid")
                 self.log(f"  Copy {model_path}")
                 self.log(f"  To: /mnt/user/appdata/ai/roberto-models/")
@@ -2,20 +2,48 @@
 """
 Audio sample collection script for 'Roberto' wake word training
 Records audio samples for training the Luxembourgish wake word
+
+Samples are recorded one at a time from the menu, or continuously with
+--stream: a single callback-driven stream fills a preallocated ring
+buffer, an energy endpointer cuts each utterance out of it, and a
+background thread writes the clips. Use --wav to stream from a WAV
+file instead of the microphone.
+
+Usage:
+    python collect_samples.py
+    python collect_samples.py --stream positive --count 200
+    python collect_samples.py --stream positive --wav session.wav --fast
 """
 
-import os
+import argparse
+import queue
+import threading
+import time
 import wave
-import pyaudio
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
 # Audio configuration
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK = 1024
 RECORD_SECONDS = 2
-FORMAT = pyaudio.paInt16
+SAMPLE_WIDTH = 2  # 16-bit
+
+# Streaming capture configuration
+RING_SECONDS = 30  # Audio kept in the ring buffer
+FRAME_MS = 30  # Endpointer frame
+START_DB = 12.0  # Speech starts this far above the noise floor...
+STOP_DB = 6.0  # ...and continues while above floor + STOP_DB
+START_FRAMES = 3  # Consecutive loud frames needed to start
+MIN_SPEECH_DBFS = -50.0  # Never treat quieter frames as speech
+HANGOVER_MS = 300  # Silence that ends an utterance
+PRE_ROLL_MS = 200  # Audio kept before the detected start
+POST_ROLL_MS = 150  # ...and after the detected end (< HANGOVER_MS)
+MIN_UTTERANCE_MS = 250
+MAX_UTTERANCE_MS = {"positive": 2000, "negative": 5000}
 
 def record_sample(output_dir, sample_type="positive"):
     """Record a single audio sample"""
@@ -26,6 +54,8 @@ def record_sample(output_dir, sample_type="positive"):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = output_path / f"{sample_type}_{timestamp}.wav"
 
+    import pyaudio
+
     audio = pyaudio.PyAudio()
 
     print(f"\nRecording {sample_type} sample...")
@@ -37,7 +67,7 @@ def record_sample(output_dir, sample_type="positive"):
     input("Press Enter to start recording...")
 
     stream = audio.open(
-        format=FORMAT,
+        format=pyaudio.paInt16,
         channels=CHANNELS,
         rate=SAMPLE_RATE,
         input=True,
@@ -60,13 +90,309 @@ def record_sample(output_dir, sample_type="positive"):
     # Save audio file
     with wave.open(str(filename), 'wb') as wf:
         wf.setnchannels(CHANNELS)
-        wf.setsampwidth(audio.get_sample_size(FORMAT))
+        wf.setsampwidth(SAMPLE_WIDTH)
         wf.setframerate(SAMPLE_RATE)
         wf.writeframes(b''.join(frames))
 
     print(f"Saved: {filename}")
     return filename
 
+# -----------------------------------------------------------------------------
+# Streaming capture
+# -----------------------------------------------------------------------------
+
+class CaptureRing:
+    """Preallocated int16 ring buffer, written by the audio callback
+
+    Positions are absolute sample counts since the stream started, so the
+    reader can tell how far behind it is and whether audio was overwritten.
+    """
+
+    def __init__(self, seconds=RING_SECONDS):
+        self.capacity = seconds * SAMPLE_RATE
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+        self._cond = threading.Condition()
+        self.written = 0
+        self.consumed = 0
+        self.closed = False
+
+    def write(self, samples, block=False):
+        """Append samples; with ``block``, first wait until the reader has room
+
+        Blocking writers stay within half the ring of the reader, so the
+        other half still holds the audio behind it (utterance, pre-roll).
+        """
+        if block:
+            limit = self.capacity // 2
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self.written + len(samples) - self.consumed <= limit
+                    or self.closed
+                )
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._buffer[start : start + first] = samples[:first]
+        self._buffer[: len(samples) - first] = samples[first:]
+        with self._cond:
+            self.written += len(samples)
+            self._cond.notify()
+
+    def consume(self, position):
+        """Mark audio before ``position`` as processed"""
+        with self._cond:
+            self.consumed = position
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait(self, position, timeout=0.5):
+        """Block until sample ``position`` is written; returns samples written"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.written >= position or self.closed, timeout
+            )
+            return self.written
+
+    def read(self, start, end):
+        """Copy of samples [start, end); the oldest are clamped to what is left"""
+        start = max(start, self.written - self.capacity, 0)
+        indices = np.arange(start, end) % self.capacity
+        return self._buffer[indices]
+
+
+class MicrophoneSource:
+    """Default (or chosen) input device as one long callback-driven stream"""
+
+    def __init__(self, device=None):
+        self.device = device
+        self.done = threading.Event()  # Never set: the microphone does not run out
+
+    def start(self, ring):
+        import pyaudio
+
+        def callback(in_data, frame_count, time_info, status):
+            ring.write(np.frombuffer(in_data, dtype=np.int16))
+            return None, pyaudio.paContinue
+
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=CHANNELS,
+            rate=SAMPLE_RATE,
+            input=True,
+            input_device_index=self.device,
+            frames_per_buffer=CHUNK,
+            stream_callback=callback,
+        )
+        self._stream.start_stream()
+
+    def stop(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+class WavFileSource:
+    """Streams a WAV file in CHUNK blocks, like the microphone would
+
+    Paced in real time unless ``realtime`` is False, in which case it only
+    waits for the reader to make room; ``done`` is set once the whole file
+    has been delivered.
+    """
+
+    def __init__(self, path, realtime=True):
+        self.path = Path(path)
+        self.realtime = realtime
+        self.done = threading.Event()
+        self._stop = threading.Event()
+
+    def _load(self):
+        with wave.open(str(self.path), "rb") as wf:
+            if wf.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{self.path}: only 16-bit WAV files are supported")
+            rate = wf.getframerate()
+            channels = wf.getnchannels()
+            audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+        audio = audio.reshape(-1, channels).mean(axis=1)
+        if rate != SAMPLE_RATE:
+            from scipy.signal import resample_poly
+
+            g = np.gcd(rate, SAMPLE_RATE)
+            audio = resample_poly(audio, SAMPLE_RATE // g, rate // g)
+        return np.clip(np.rint(audio), -32768, 32767).astype(np.int16)
+
+    def start(self, ring):
+        audio = self._load()
+
+        def run():
+            started = time.monotonic()
+            for offset in range(0, len(audio), CHUNK):
+                if self._stop.is_set():
+                    break
+                if self.realtime:
+                    delay = started + offset / SAMPLE_RATE - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                ring.write(audio[offset : offset + CHUNK], block=not self.realtime)
+            self.done.set()
+
+        self._thread = threading.Thread(target=run, name="wav-source", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class Endpointer:
+    """Energy endpointer with an adaptive noise floor
+
+    Fed one FRAME_MS frame at a time; returns (start, end) sample positions
+    when an utterance of acceptable length has ended.
+    """
+
+    def __init__(self, max_ms):
+        self.frame_length = SAMPLE_RATE * FRAME_MS // 1000
+        self.max_samples = SAMPLE_RATE * max_ms // 1000
+        self.min_samples = SAMPLE_RATE * MIN_UTTERANCE_MS // 1000
+        self.hangover = SAMPLE_RATE * HANGOVER_MS // 1000
+        self.noise_db = None
+        self.rejected = 0
+        self._loud_run = 0
+        self._start = None
+        self._last_loud = None
+
+    def process(self, position, frame):
+        power = float(np.mean(np.square(frame, dtype=np.float32)))
+        db = 10 * np.log10(max(power, 1.0) / 32768**2)
+        if self.noise_db is None:
+            self.noise_db = db
+        end = position + len(frame)
+
+        if self._start is None:
+            # Floor drops at once and rises slowly, so speech barely moves it
+            if db < self.noise_db:
+                self.noise_db = db
+            else:
+                self.noise_db += 0.02 * (db - self.noise_db)
+
+            if db > self.noise_db + START_DB and db > MIN_SPEECH_DBFS:
+                self._loud_run += 1
+                if self._loud_run >= START_FRAMES:
+                    self._start = end - self._loud_run * len(frame)
+                    self._last_loud = end
+            else:
+                self._loud_run = 0
+            return None
+
+        if db > self.noise_db + STOP_DB and db > MIN_SPEECH_DBFS:
+            self._last_loud = end
+        if end - self._last_loud < self.hangover:
+            return None
+
+        start, stop = self._start, self._last_loud
+        self._start = self._last_loud = None
+        self._loud_run = 0
+        if not self.min_samples <= stop - start <= self.max_samples:
+            self.rejected += 1
+            return None
+        return start, stop
+
+
+class ClipWriter:
+    """Writes clips as WAV files on a background thread"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="clip-writer")
+        self._thread.start()
+
+    def submit(self, path, samples):
+        self._queue.put((path, samples))
+
+    def close(self):
+        """Write what is still queued, then stop"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, samples = item
+            with wave.open(str(path), "wb") as wf:
+                wf.setnchannels(CHANNELS)
+                wf.setsampwidth(SAMPLE_WIDTH)
+                wf.setframerate(SAMPLE_RATE)
+                wf.writeframes(samples.tobytes())
+
+
+def stream_samples(source, output_dir, sample_type="positive", count=200):
+    """Continuously capture and segment samples until ``count`` are saved"""
+
+    output_path = Path(output_dir) / sample_type
+    output_path.mkdir(parents=True, exist_ok=True)
+    session = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    ring = CaptureRing()
+    endpointer = Endpointer(MAX_UTTERANCE_MS[sample_type])
+    frame = endpointer.frame_length
+    pre_roll = SAMPLE_RATE * PRE_ROLL_MS // 1000
+    post_roll = SAMPLE_RATE * POST_ROLL_MS // 1000
+
+    print(f"\nStreaming {sample_type} samples ({count} wanted)...")
+    if sample_type == "positive":
+        print("Say 'Roberto', pause briefly, and repeat. Ctrl+C to stop early.")
+
+    saved = 0
+    overruns = 0
+    position = 0
+    source.start(ring)
+    # Only once the source runs: the writer thread keeps the process alive
+    writer = ClipWriter()
+    try:
+        while saved < count:
+            written = ring.wait(position + frame)
+            if written < position + frame:
+                if source.done.is_set():
+                    break
+                continue
+            if written - position > ring.capacity - frame:
+                # Fell a whole ring behind: skip to recent audio
+                overruns += 1
+                position = written - frame
+
+            while position + frame <= written and saved < count:
+                utterance = endpointer.process(position, ring.read(position, position + frame))
+                position += frame
+                ring.consume(position)
+                if utterance is None:
+                    continue
+
+                start, end = utterance
+                clip = ring.read(start - pre_roll, min(end + post_roll, position))
+                filename = output_path / f"{sample_type}_{session}_{saved:04d}.wav"
+                writer.submit(filename, clip)
+                saved += 1
+                print(f"  [{saved}/{count}] {len(clip) / SAMPLE_RATE:.2f}s -> {filename.name}")
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        source.stop()
+        ring.close()
+        writer.close()
+
+    print(f"Saved {saved} {sample_type} samples to {output_path}/")
+    if endpointer.rejected:
+        print(f"  ({endpointer.rejected} segments rejected as too short or too long)")
+    if overruns:
+        print(f"  (fell behind the audio {overruns} times; some audio was skipped)")
+    return saved
+
 def collect_training_data():
     """Interactive session to collect multiple samples"""
 
@@ -96,9 +422,11 @@ def collect_training_data():
         print("\nOptions:")
         print("  1. Record positive sample (say 'Roberto')")
         print("  2. Record negative sample (background noise/other speech)")
-        print("  3. Quit")
+        print("  3. Stream positive samples (say 'Roberto' repeatedly)")
+        print("  4. Stream negative samples (other speech)")
+        print("  5. Quit")
 
-        choice = input("\nEnter choice (1-3): ").strip()
+        choice = input("\nEnter choice (1-5): ").strip()
 
         if choice == "1":
             record_sample(output_dir, "positive")
@@ -106,20 +434,58 @@ def collect_training_data():
         elif choice == "2":
             record_sample(output_dir, "negative")
             negative_count += 1
-        elif choice == "3":
+        elif choice in ("3", "4"):
+            sample_type = "positive" if choice == "3" else "negative"
+            count = input("How many samples? [50]: ").strip()
+            saved = stream_samples(
+                MicrophoneSource(), output_dir, sample_type, int(count or 50)
+            )
+            if sample_type == "positive":
+                positive_count += saved
+            else:
+                negative_count += saved
+        elif choice == "5":
             print(f"\nCollection complete!")
             print(f"Total positive samples: {positive_count}")
             print(f"Total negative samples: {negative_count}")
             print(f"\nSamples saved in: {output_dir}/")
             break
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter 1-5.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect wake word training samples")
+    parser.add_argument(
+        "--stream",
+        choices=["positive", "negative"],
+        help="Capture continuously instead of showing the menu",
+    )
+    parser.add_argument("--count", type=int, default=200, help="Samples to capture")
+    parser.add_argument("--output", default="data", help="Output directory")
+    parser.add_argument("--device", type=int, help="PyAudio input device index")
+    parser.add_argument("--wav", help="Stream from this WAV file instead of a microphone")
+    parser.add_argument(
+        "--fast", action="store_true", help="Read --wav as fast as possible"
+    )
+    args = parser.parse_args()
+
+    if args.stream is None:
+        collect_training_data()
+        return
+
+    if args.wav:
+        source = WavFileSource(args.wav, realtime=not args.fast)
+    else:
+        source = MicrophoneSource(args.device)
+    stream_samples(source, args.output, args.stream, args.count)
+
 
 if __name__ == "__main__":
     try:
-        collect_training_data()
+        main()
     except KeyboardInterrupt:
         print("\n\nCollection interrupted by user.")
     except Exception as e:
         print(f"\nError: {e}")
-        print("Make sure PyAudio is installed: pip install pyaudio")
+        if isinstance(e, ImportError) and e.name == "pyaudio":
+            print("Make sure PyAudio is installed: pip install pyaudio")
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of a wake word model over WAV corpora
+
+Streams positive clips, negative clips and long background recordings
+through the same conversion and framing path as the Wyoming server
+(StreamingConverter -> AudioRingBuffer -> engine), sharded across a
+process pool, and reports per sensitivity:
+
+  - recall on the positive clips
+  - false accepts per hour on negatives and background audio
+  - detection latency relative to the end of each positive clip
+
+WAV files are memory-mapped, so hours of background audio are never
+loaded into memory at once.
+
+Usage:
+    python evaluate_model.py --model models/albert.ppn --access-key KEY
+    python evaluate_model.py --model models/roberto_lb.tflite \\
+        --background recordings/kitchen_8h.wav --json results.json
+"""
+
+import argparse
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Share the server's framing code instead of re-implementing it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "porcupine-wakeword"))
+
+from audio_buffer import AudioRingBuffer, SampleClock  # noqa: E402
+from inference import _process_frames  # noqa: E402
+from resample import StreamingConverter  # noqa: E402
+
+# Evaluation configuration
+DEFAULT_SENSITIVITIES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+CHUNK_SAMPLES = 1024  # Samples per simulated satellite chunk
+GAP_MS = 1000  # Silence streamed after each file, as between sessions
+FILES_PER_TASK = 32
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+# -----------------------------------------------------------------------------
+# Memory-mapped WAV reading
+# -----------------------------------------------------------------------------
+
+
+class MappedWav:
+    """PCM data of a WAV file, memory-mapped rather than read."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._parse()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _parse(self):
+        data = self._mmap
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(data):
+            chunk_id = data[offset : offset + 4]
+            (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", data, body)
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                    # Sub-format GUID starts with the real format code
+                    (sub_format,) = struct.unpack_from("<H", data, body + 24)
+                    fmt = (sub_format,) + fmt[1:]
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                # Recorders that never finalized the header leave size 0/-1
+                end = min(body + chunk_size, len(data)) if chunk_size else len(data)
+                self.data = memoryview(data)[body:end]
+                break
+            offset = body + chunk_size + (chunk_size & 1)
+        else:
+            raise ValueError("no data chunk")
+
+        audio_format, channels, rate, _, _, bits = fmt
+        if audio_format != WAVE_FORMAT_PCM:
+            raise ValueError(f"unsupported WAV format {audio_format:#x}")
+
+        self.channels = channels
+        self.sample_rate = rate
+        self.sample_width = bits // 8
+        frame_bytes = self.channels * self.sample_width
+        self.data = self.data[: len(self.data) - len(self.data) % frame_bytes]
+        self.num_samples = len(self.data) // frame_bytes
+
+    @property
+    def duration_ms(self):
+        return self.num_samples * 1000 / self.sample_rate
+
+    def close(self):
+        self.data.release()
+        self._mmap.close()
+
+
+# -----------------------------------------------------------------------------
+# Detectors: one run over the audio, every sensitivity at once
+# -----------------------------------------------------------------------------
+
+
+class PorcupineSweep:
+    """One Porcupine engine per sensitivity, fed identical frames."""
+
+    def __init__(self, model, sensitivities, access_key, model_path=None):
+        import pvporcupine
+
+        self._factories = [
+            functools.partial(
+                pvporcupine.create,
+                access_key=access_key,
+                keyword_paths=[str(model)],
+                model_path=model_path,
+                sensitivities=[sensitivity],
+            )
+            for sensitivity in sensitivities
+        ]
+        self.engines = [factory() for factory in self._factories]
+        self.frame_length = self.engines[0].frame_length
+        self.sample_rate = self.engines[0].sample_rate
+
+    def reset(self):
+        """Start the next file on fresh engines; Porcupine has no reset."""
+        self.close()
+        self.engines = [factory() for factory in self._factories]
+
+    def process(self, pcm):
+        """Detections per sensitivity: a list of frame indices for each."""
+        results = []
+        for engine in self.engines:
+            keyword_indices, _ = _process_frames(engine, pcm)
+            results.append([i for i, k in enumerate(keyword_indices) if k >= 0])
+        return results
+
+    def close(self):
+        for engine in self.engines:
+            engine.delete()
+
+
+class OpenWakeWordSweep:
+    """One openWakeWord model scored once per frame, thresholded per sensitivity.
+
+    Runs on the server's ``OpenWakeWordRuntime``: the model is scored as if
+    loaded once per sensitivity, each firing at ``1 - sensitivity`` with the
+    server's warm-up and re-arming, so a sensitivity here means what it
+    means in ``--sensitivity``.
+    """
+
+    def __init__(self, model, sensitivities, frontend_dir=None):
+        from engines import OpenWakeWordRuntime
+
+        self.runtime = OpenWakeWordRuntime(frontend_dir)
+        self.stream = self.runtime.create_stream(
+            [str(model)] * len(sensitivities), sensitivities
+        )
+        self.frame_length = self.stream.frame_length
+        self.sample_rate = self.stream.sample_rate
+
+    def process(self, pcm):
+        """Detections per sensitivity: a list of frame indices for each."""
+        scores = self.runtime.score_batch([(self.stream, pcm)])[0]
+        fired = self.stream.fired(scores)
+        return [np.flatnonzero(column).tolist() for column in fired.T]
+
+    def reset(self):
+        """Forget the previous file's audio, scores and re-arm state."""
+        self.stream.reset()
+
+    def close(self):
+        self.stream.delete()
+
+
+def create_sweep(
+    model, sensitivities, access_key=None, model_path=None, frontend_dir=None
+):
+    if Path(model).suffix == ".ppn":
+        if not access_key:
+            raise ValueError("A Picovoice access key is required for .ppn models")
+        return PorcupineSweep(model, sensitivities, access_key, model_path)
+    return OpenWakeWordSweep(model, sensitivities, frontend_dir)
+
+
+# -----------------------------------------------------------------------------
+# Worker processes
+# -----------------------------------------------------------------------------
+
+_SWEEP = None
+_SETTINGS = {}
+
+
+def _init_worker(
+    model, sensitivities, access_key, model_path, frontend_dir, chunk_samples, gap_ms
+):
+    global _SWEEP
+    _SWEEP = create_sweep(model, sensitivities, access_key, model_path, frontend_dir)
+    _SETTINGS.update(
+        sensitivities=len(sensitivities), chunk_samples=chunk_samples, gap_ms=gap_ms
+    )
+
+
+def _stream_file(wav):
+    """Stream one file plus a silence gap; returns detection times (ms) per sensitivity."""
+    sweep = _SWEEP
+    # Score every file on its own, whatever the files before it left behind
+    sweep.reset()
+    ring = AudioRingBuffer.for_duration(sweep.frame_length, sweep.sample_rate, 2000)
+    clock = SampleClock(sweep.sample_rate)
+    clock.reset(0)
+    converter = None
+    if (wav.sample_rate, wav.sample_width, wav.channels) != (sweep.sample_rate, 2, 1):
+        converter = StreamingConverter(
+            wav.sample_rate, wav.sample_width, wav.channels, out_rate=sweep.sample_rate
+        )
+
+    gap_bytes = int(wav.sample_rate * _SETTINGS["gap_ms"] / 1000)
+    gap_bytes *= wav.sample_width * wav.channels
+    silence = b"\x80" if wav.sample_width == 1 else b"\x00"
+    chunk_bytes = _SETTINGS["chunk_samples"] * wav.sample_width * wav.channels
+
+    detections = [[] for _ in range(_SETTINGS["sensitivities"])]
+    sources = (wav.data, memoryview(silence * gap_bytes))
+    for source in sources:
+        for offset in range(0, len(source), chunk_bytes):
+            audio = source[offset : offset + chunk_bytes]
+            if converter is not None:
+                audio = converter.process(audio)
+            clock.add_chunk(len(audio) // 2)
+            ring.write(audio)
+
+            batch_start = ring.read_position
+            frames = ring.read_frames()
+            if not frames:
+                continue
+            for i, frame_indices in enumerate(sweep.process(frames)):
+                for frame_index in frame_indices:
+                    frame_end = batch_start + (frame_index + 1) * sweep.frame_length
+                    detections[i].append(clock.to_ms(frame_end))
+
+    return detections
+
+
+def _evaluate_shard(kind, paths):
+    """Evaluate a shard of files; returns one result dict per readable file."""
+    results = []
+    for path in paths:
+        try:
+            wav = MappedWav(path)
+        except (OSError, ValueError) as e:
+            results.append({"path": str(path), "kind": kind, "error": str(e)})
+            continue
+
+        try:
+            detections = _stream_file(wav)
+        finally:
+            wav.close()
+
+        results.append(
+            {
+                "path": str(path),
+                "kind": kind,
+                "duration_ms": wav.duration_ms,
+                "detections": detections,
+            }
+        )
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Corpus and report
+# -----------------------------------------------------------------------------
+
+
+def find_wavs(paths):
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(path.rglob("*.wav")))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+def make_shards(kind, files, files_per_task):
+    """Group files into tasks; large files (long recordings) get their own."""
+    shards = []
+    batch = []
+    for path in sorted(files, key=lambda p: p.stat().st_size, reverse=True):
+        if path.stat().st_size > 50 * 1024 * 1024:
+            shards.append((kind, [path]))
+            continue
+        batch.append(path)
+        if len(batch) >= files_per_task:
+            shards.append((kind, batch))
+            batch = []
+    if batch:
+        shards.append((kind, batch))
+    return shards
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def summarize(results, sensitivities):
+    """Recall, false accepts per hour and latency for each sensitivity."""
+    positives = [r for r in results if r["kind"] == "positive" and "error" not in r]
+    negatives = [r for r in results if r["kind"] != "positive" and "error" not in r]
+    negative_hours = sum(r["duration_ms"] for r in negatives) / 3_600_000
+
+    summary = []
+    for i, sensitivity in enumerate(sensitivities):
+        # Latency: first detection relative to the end of the positive clip
+        latencies = [
+            r["detections"][i][0] - r["duration_ms"]
+            for r in positives
+            if r["detections"][i]
+        ]
+        false_accepts = sum(len(r["detections"][i]) for r in negatives)
+        summary.append(
+            {
+                "sensitivity": sensitivity,
+                "recall": len(latencies) / len(positives) if positives else None,
+                "detected": len(latencies),
+                "false_accepts": false_accepts,
+                "false_accepts_per_hour": (
+                    false_accepts / negative_hours if negative_hours else None
+                ),
+                "latency_p50_ms": _percentile(latencies, 50),
+                "latency_p90_ms": _percentile(latencies, 90),
+            }
+        )
+
+    return {
+        "positive_files": len(positives),
+        "negative_files": len(negatives),
+        "negative_hours": negative_hours,
+        "sensitivities": summary,
+    }
+
+
+def _fmt(value, spec):
+    width = int(spec.split(".")[0])
+    return "-".rjust(width) if value is None else format(value, spec)
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"Model: {report['model']}")
+    print(
+        f"Positives: {report['positive_files']} files, "
+        f"negatives: {report['negative_files']} files "
+        f"({report['negative_hours']:.2f} h)"
+    )
+    print(f"Evaluated in {report['elapsed_seconds']:.1f}s")
+    print("=" * 60)
+    print(f"{'sens':>6} {'recall':>8} {'FA':>6} {'FA/h':>8} {'p50 ms':>8} {'p90 ms':>8}")
+    for row in report["sensitivities"]:
+        print(
+            f"{row['sensitivity']:>6.2f} "
+            f"{_fmt(row['recall'], '8.3f')} "
+            f"{row['false_accepts']:>6d} "
+            f"{_fmt(row['false_accepts_per_hour'], '8.2f')} "
+            f"{_fmt(row['latency_p50_ms'], '8.0f')} "
+            f"{_fmt(row['latency_p90_ms'], '8.0f')}"
+        )
+
+    for error in report["errors"]:
+        print(f"Skipped {error['path']}: {error['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate a wake word model over WAV corpora"
+    )
+    parser.add_argument(
+        "--model", required=True, help="Keyword model (.ppn, .tflite or .onnx)"
+    )
+    parser.add_argument(
+        "--access-key",
+        default=os.environ.get("PORCUPINE_ACCESS_KEY") or os.environ.get("ACCESS_KEY"),
+        help="Picovoice access key for .ppn models (default: $PORCUPINE_ACCESS_KEY)",
+    )
+    parser.add_argument(
+        "--model-path", help="Porcupine language model (.pv) for non-English keywords"
+    )
+    parser.add_argument(
+        "--oww-model-dir",
+        help="Directory with openWakeWord's melspectrogram and embedding_model "
+        "files (default: the installed openwakeword package's models)",
+    )
+    parser.add_argument(
+        "--positive",
+        nargs="+",
+        default=["data/positive"],
+        help="Positive WAV files or directories (default: data/positive)",
+    )
+    parser.add_argument(
+        "--negative",
+        nargs="+",
+        default=["data/negative"],
+        help="Negative WAV files or directories (default: data/negative)",
+    )
+    parser.add_argument(
+        "--background",
+        nargs="+",
+        default=[],
+        help="Long background recordings, counted as negatives",
+    )
+    parser.add_argument(
+        "--sensitivities",
+        nargs="+",
+        type=float,
+        default=DEFAULT_SENSITIVITIES,
+        help="Sensitivities to sweep; openWakeWord models fire at a score of "
+        "1 - sensitivity, as in the server",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--chunk-samples",
+        type=int,
+        default=CHUNK_SAMPLES,
+        help=f"Samples per streamed chunk (default: {CHUNK_SAMPLES})",
+    )
+    parser.add_argument(
+        "--gap-ms",
+        type=int,
+        default=GAP_MS,
+        help=f"Silence streamed after each file (default: {GAP_MS})",
+    )
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    shards = (
+        make_shards("positive", find_wavs(args.positive), FILES_PER_TASK)
+        + make_shards("negative", find_wavs(args.negative), FILES_PER_TASK)
+        + make_shards("background", find_wavs(args.background), FILES_PER_TASK)
+    )
+    if not shards:
+        print("Error: no WAV files found")
+        sys.exit(1)
+
+    if Path(args.model).suffix != ".ppn":
+        # Refuse models the server cannot load (e.g. log-mel heads) here,
+        # rather than as a broken pool when every worker fails to start
+        try:
+            OpenWakeWordSweep(args.model, [0.5], args.oww_model_dir).close()
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    print(f"Evaluating {args.model} on {len(shards)} shards, {args.workers} workers...")
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(
+            args.model,
+            args.sensitivities,
+            args.access_key,
+            args.model_path,
+            args.oww_model_dir,
+            args.chunk_samples,
+            args.gap_ms,
+        ),
+    ) as pool:
+        futures = [pool.submit(_evaluate_shard, kind, paths) for kind, paths in shards]
+        for done, future in enumerate(futures, 1):
+            results.extend(future.result())
+            print(f"\r  {done}/{len(futures)} shards", end="", flush=True)
+    print()
+
+    report = summarize(results, args.sensitivities)
+    report["model"] = args.model
+    report["elapsed_seconds"] = time.perf_counter() - start_time
+    report["errors"] = [r for r in results if "error" in r]
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Sharded, memory-mappable feature dataset for wake word training
+
+Computes fixed-length features once per source WAV file and stores them
+in shard_NNNNN.npy files of up to SHARD_ROWS rows, plus a manifest.json
+holding, for every sample, its label, source file, shard/row and any
+metadata (TTS parameters, augmentation parameters, mining provenance)
+found next to the source in metadata.jsonl / augmentations.jsonl /
+mined.jsonl.
+
+Rebuilds are incremental: files whose size and mtime match the manifest
+keep their rows, new or changed files are featurized into new shards,
+and shards are compacted once too many of their rows are stale.
+
+Features are openWakeWord speech embeddings by default (requires
+openwakeword), the only kind the server can serve, or log-mel spectrograms
+with --kind logmel.
+
+Usage:
+    python features.py                      # data/positive + data/negative
+    python features.py --kind logmel --workers 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from augment import load_wav
+
+SAMPLE_RATE = 16000
+CLIP_SECONDS = 1.5  # Clips are padded/cropped to this length, aligned at the end
+SHARD_ROWS = 4096
+FILES_PER_TASK = 256
+COMPACT_STALE_FRACTION = 0.25
+
+# Log-mel parameters
+N_FFT = 512
+WIN_LENGTH = 400  # 25 ms
+HOP_LENGTH = 160  # 10 ms
+N_MELS = 40
+F_MIN = 60.0
+F_MAX = 7600.0
+
+LABELS = {"positive": 1, "negative": 0}
+
+
+# -----------------------------------------------------------------------------
+# Feature extraction
+# -----------------------------------------------------------------------------
+
+
+def feature_config(kind):
+    """Everything that changes feature values; a change invalidates the dataset"""
+    config = {"kind": kind, "sample_rate": SAMPLE_RATE, "clip_seconds": CLIP_SECONDS}
+    if kind == "logmel":
+        config.update(
+            n_fft=N_FFT,
+            win_length=WIN_LENGTH,
+            hop_length=HOP_LENGTH,
+            n_mels=N_MELS,
+            f_min=F_MIN,
+            f_max=F_MAX,
+        )
+    return config
+
+
+def mel_filterbank():
+    def hz_to_mel(f):
+        return 2595.0 * np.log10(1.0 + f / 700.0)
+
+    def mel_to_hz(m):
+        return 700.0 * (10 ** (m / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(F_MIN), hz_to_mel(F_MAX), N_MELS + 2)
+    bins = mel_to_hz(mels) * N_FFT / SAMPLE_RATE
+    freqs = np.arange(N_FFT // 2 + 1)[:, None]
+    lower, center, upper = bins[:-2], bins[1:-1], bins[2:]
+    rising = (freqs - lower) / (center - lower)
+    falling = (upper - freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def fit_clips(clips):
+    """Pad or crop clips to CLIP_SECONDS, keeping the end (where the word ends)"""
+    length = int(CLIP_SECONDS * SAMPLE_RATE)
+    batch = np.zeros((len(clips), length), dtype=np.float32)
+    for i, clip in enumerate(clips):
+        clip = clip[-length:]
+        batch[i, length - len(clip) :] = clip
+    return batch
+
+
+def logmel_batch(batch):
+    """(N, samples) float32 audio to (N, frames, N_MELS) log-mel features"""
+    num_frames = 1 + (batch.shape[1] - WIN_LENGTH) // HOP_LENGTH
+    frames = np.lib.stride_tricks.sliding_window_view(batch, WIN_LENGTH, axis=1)
+    frames = frames[:, ::HOP_LENGTH][:, :num_frames] * np.hanning(WIN_LENGTH)
+    power = np.abs(np.fft.rfft(frames, n=N_FFT, axis=2)) ** 2
+    return np.log(power.astype(np.float32) @ mel_filterbank() + 1e-6)
+
+
+def embedding_batch(batch):
+    """(N, samples) float32 audio to openWakeWord speech embeddings"""
+    from openwakeword.utils import AudioFeatures
+
+    pcm = np.clip(np.rint(batch * 32767), -32768, 32767).astype(np.int16)
+    return AudioFeatures().embed_clips(pcm, batch_size=64)
+
+
+def _featurize(kind, paths):
+    """Worker: features for a list of files; unreadable files are skipped"""
+    clips = []
+    kept = []
+    for path in paths:
+        try:
+            clip = load_wav(path)
+        except (OSError, ValueError):
+            continue
+        if len(clip):
+            clips.append(clip)
+            kept.append(path)
+
+    if not clips:
+        return kept, None
+
+    batch = fit_clips(clips)
+    features = embedding_batch(batch) if kind == "embedding" else logmel_batch(batch)
+    return kept, features.astype(np.float16)
+
+
+# -----------------------------------------------------------------------------
+# Dataset
+# -----------------------------------------------------------------------------
+
+
+def _read_jsonl(path):
+    records = {}
+    if path.is_file():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record.get("file")] = record
+    return records
+
+
+def _file_signature(path):
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class FeatureDataset:
+    """Feature shards memory-mapped read-only, with labels and provenance"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        self.samples = self.manifest["samples"]
+        self.shards = {
+            name: np.load(self.directory / name, mmap_mode="r")
+            for name in self.manifest["shards"]
+        }
+        self.labels = np.array([s["label"] for s in self.samples], dtype=np.float32)
+        self.shape = tuple(self.manifest["shape"])
+
+    def __len__(self):
+        return len(self.samples)
+
+    def read(self, indices):
+        """Features and labels for ``indices``, one fancy-indexed read per shard"""
+        out = np.empty((len(indices),) + self.shape, dtype=np.float32)
+        positions = {}
+        for j, i in enumerate(indices):
+            positions.setdefault(self.samples[i]["shard"], []).append(j)
+        for shard, js in positions.items():
+            rows = [self.samples[indices[j]]["row"] for j in js]
+            out[js] = self.shards[shard][rows]
+        return out, self.labels[indices]
+
+    def batches(self, batch_size, indices=None, rng=None):
+        """Yield (features, labels) batches, shuffled if ``rng`` is given
+
+        Each batch is read in (shard, row) order, so the memory-mapped
+        shards are scanned forwards rather than hit at random.
+        """
+        indices = np.arange(len(self.samples)) if indices is None else np.asarray(indices)
+        if rng is not None:
+            indices = rng.permutation(indices)
+        for start in range(0, len(indices), batch_size):
+            chunk = sorted(
+                indices[start : start + batch_size].tolist(),
+                key=lambda i: (self.samples[i]["shard"], self.samples[i]["row"]),
+            )
+            yield self.read(chunk)
+
+
+def build_dataset(source_dirs, output_dir, kind="embedding", workers=None, log=print):
+    """Create or incrementally update the feature dataset in ``output_dir``
+
+    ``source_dirs`` maps a label name ("positive"/"negative") to a list of
+    directories. Returns the number of samples featurized in this run.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = output_dir / "manifest.json"
+
+    config = feature_config(kind)
+    config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    manifest = {"config": config, "config_hash": config_hash, "shards": {}, "samples": []}
+    if manifest_file.is_file():
+        with open(manifest_file, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("config_hash") == config_hash:
+            manifest = previous
+        else:
+            log("  Feature settings changed, rebuilding all features")
+
+    # Current source files, with any metadata recorded next to them
+    sources = {}
+    for label_name, directories in source_dirs.items():
+        for directory in directories:
+            directory = Path(directory)
+            if not directory.is_dir():
+                continue
+            metadata = _read_jsonl(directory / "metadata.jsonl")
+            augmentations = _read_jsonl(directory / "augmentations.jsonl")
+            mined = _read_jsonl(directory / "mined.jsonl")
+            for path in sorted(directory.rglob("*.wav")):
+                info = {}
+                if path.name in metadata:
+                    info["tts"] = {
+                        k: v for k, v in metadata[path.name].items() if k != "file"
+                    }
+                if path.name in augmentations:
+                    info["augmentation"] = {
+                        k: v for k, v in augmentations[path.name].items() if k != "file"
+                    }
+                if path.name in mined:
+                    info["mined"] = {
+                        k: v for k, v in mined[path.name].items() if k != "file"
+                    }
+                sources[str(path)] = (LABELS[label_name], info, path)
+
+    # Keep samples whose source is unchanged; everything else is re-featurized
+    kept = []
+    for sample in manifest["samples"]:
+        source = sources.get(sample["source"])
+        if source is not None and _file_signature(source[2]) == sample["signature"]:
+            sample["label"], sample["info"] = source[0], source[1]
+            kept.append(sample)
+    kept_sources = {sample["source"] for sample in kept}
+    todo = [source for source in sources if source not in kept_sources]
+
+    stale = len(manifest["samples"]) - len(kept)
+    manifest["samples"] = kept
+    log(f"  Features: {len(kept)} up to date, {len(todo)} to compute, {stale} stale")
+
+    if todo:
+        tasks = [todo[i : i + FILES_PER_TASK] for i in range(0, len(todo), FILES_PER_TASK)]
+        pending_features = []
+        pending_samples = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_featurize, kind, task) for task in tasks]
+            for done, future in enumerate(futures, 1):
+                paths, features = future.result()
+                if features is None:
+                    continue
+                manifest["shape"] = list(features.shape[1:])
+                for path in paths:
+                    label, info, source = sources[path]
+                    pending_samples.append(
+                        {
+                            "source": path,
+                            "label": label,
+                            "signature": _file_signature(source),
+                            "info": info,
+                        }
+                    )
+                pending_features.append(features)
+                if sum(len(f) for f in pending_features) >= SHARD_ROWS:
+                    _write_shards(output_dir, manifest, pending_features, pending_samples)
+                    pending_features, pending_samples = [], []
+                    log(f"  Featurized {done}/{len(futures)} batches")
+
+        # The last batches may hold fewer rows than a shard, or none at all
+        if pending_features:
+            _write_shards(output_dir, manifest, pending_features, pending_samples)
+        log(f"  Featurized {len(futures)}/{len(futures)} batches")
+
+    _compact(output_dir, manifest, log)
+
+    tmp_file = manifest_file.with_suffix(".json.part")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+    # Shards no longer referenced by the manifest
+    for path in output_dir.glob("shard_*.npy"):
+        if path.name not in manifest["shards"]:
+            path.unlink()
+
+    return len(todo)
+
+
+def _next_shard_name(manifest, output_dir):
+    numbers = [int(Path(name).stem.split("_")[1]) for name in manifest["shards"]]
+    numbers += [int(p.stem.split("_")[1]) for p in output_dir.glob("shard_*.npy")]
+    return f"shard_{max(numbers, default=-1) + 1:05d}.npy"
+
+
+def _write_shards(output_dir, manifest, features_list, samples):
+    features = np.concatenate(features_list)
+    for start in range(0, len(features), SHARD_ROWS):
+        name = _next_shard_name(manifest, output_dir)
+        rows = features[start : start + SHARD_ROWS]
+        np.save(output_dir / name, rows)
+        manifest["shards"][name] = len(rows)
+        for row, sample in enumerate(samples[start : start + SHARD_ROWS]):
+            sample.update(shard=name, row=row)
+            manifest["samples"].append(sample)
+
+
+def _compact(output_dir, manifest, log):
+    """Rewrite shards where too many rows belong to removed or changed files"""
+    live = {}
+    for sample in manifest["samples"]:
+        live.setdefault(sample["shard"], []).append(sample)
+
+    sparse = [
+        name
+        for name, rows in manifest["shards"].items()
+        if len(live.get(name, [])) < rows * (1 - COMPACT_STALE_FRACTION)
+    ]
+    for name in sparse:
+        del manifest["shards"][name]
+    if not sparse:
+        return
+
+    moved = [sample for name in sparse for sample in live.get(name, [])]
+    if moved:
+        shards = {name: np.load(output_dir / name, mmap_mode="r") for name in sparse}
+        features = [shards[s["shard"]][s["row"]][None] for s in moved]
+        moved_ids = {id(s) for s in moved}
+        manifest["samples"] = [s for s in manifest["samples"] if id(s) not in moved_ids]
+        _write_shards(output_dir, manifest, features, moved)
+        del shards
+    log(f"  Compacted {len(sparse)} shards ({len(moved)} rows kept)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the training feature dataset")
+    parser.add_argument("--positive", nargs="+", default=["data/positive"])
+    parser.add_argument("--negative", nargs="+", default=["data/negative"])
+    parser.add_argument("--output", default="data/features", help="Dataset directory")
+    parser.add_argument("--kind", choices=["embedding", "logmel"], default="embedding")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPUs)")
+    args = parser.parse_args()
+
+    count = build_dataset(
+        {"positive": args.positive, "negative": args.negative},
+        args.output,
+        kind=args.kind,
+        workers=args.workers,
+    )
+    dataset = FeatureDataset(args.output)
+    print(
+        f"Featurized {count} files; dataset has {len(dataset)} samples "
+        f"({int(dataset.labels.sum())} positive) of shape {dataset.shape}"
+    )
+
+
+if __name__ == "__main__":
+    main()
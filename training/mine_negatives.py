@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Hard-negative mining from long negative audio
+
+Runs one or more candidate models (.tflite classifiers trained by
+train_cpu.py on openWakeWord embedding features, the kind the server can
+serve; other models are refused) over long recordings known to contain no wake word (TV, conversation, spooled
+detection clips reviewed as false triggers...) in a sliding window.
+Windows scoring at or above a threshold are false accepts: they are
+saved into the negative directory as mined_<fingerprint>.wav, with a
+provenance record (source file, offset, scores, models) appended to
+mined.jsonl.
+
+Recordings are memory-mapped and split into chunks scored in parallel
+by a process pool. Overlapping hits are reduced to the best-scoring
+window, and a window whose audio fingerprint matches an already mined
+clip (the same advert aired twice, a satellite spooling the same false
+trigger repeatedly) is skipped.
+
+Usage:
+    python mine_negatives.py --model models/roberto_lb.tflite \\
+        --source recordings/ /mnt/user/appdata/ai/wakeword-clips
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+from features import (
+    CLIP_SECONDS,
+    SAMPLE_RATE,
+    embedding_batch,
+    fit_clips,
+    logmel_batch,
+)
+
+# Mining configuration
+THRESHOLD = 0.5
+HOP_SECONDS = 0.25  # Window step; a multiple of the 10 ms feature hop
+CHUNK_SECONDS = 600  # Audio per parallel task
+SCORE_BATCH = 512  # Windows per model invocation
+MAX_BIT_ERRORS = 0.35  # Fingerprint bit error rate below which clips are duplicates
+CANDIDATES = 8  # Most similar mined clips compared per window
+
+EMBEDDING_SIZE = 96  # Values per frame of an openWakeWord speech embedding
+WINDOW = int(CLIP_SECONDS * SAMPLE_RATE)
+HOP = int(HOP_SECONDS * SAMPLE_RATE)
+
+
+# -----------------------------------------------------------------------------
+# Fingerprints
+# -----------------------------------------------------------------------------
+
+
+def fingerprint(logmel):
+    """32 fingerprint bits per frame from log-mel band energy differences
+
+    Bit b of frame t is set when the energy difference between bands b and
+    b+1 grew from frame t-1 to t, which survives gain changes and mild
+    noise (Haitsma & Kalker).
+    """
+    bands = logmel[:, 4:37]
+    diff = bands[:, :-1] - bands[:, 1:]
+    return (diff[1:] - diff[:-1]) > 0
+
+
+def spectrum_summary(logmel):
+    """Unit-length mean spectrum shape, a cheap shift-invariant prefilter"""
+    mean = logmel.mean(axis=0)
+    mean = mean - mean.mean()
+    return mean / max(float(np.linalg.norm(mean)), 1e-6)
+
+
+class FingerprintIndex:
+    """Fingerprints of mined clips, searched for near-duplicates
+
+    The clips with the most similar mean spectrum are compared bit by bit
+    at every time shift that overlaps at least half the frames; a bit
+    error rate below MAX_BIT_ERRORS at any shift is a duplicate.
+    """
+
+    def __init__(self):
+        self._prints = []
+        self._summaries = []
+
+    def add(self, logmel):
+        self._prints.append(fingerprint(logmel))
+        self._summaries.append(spectrum_summary(logmel))
+
+    def is_duplicate(self, logmel):
+        if not self._prints:
+            return False
+        prints = fingerprint(logmel)
+        similarity = np.array(self._summaries) @ spectrum_summary(logmel)
+        for i in np.argsort(similarity)[::-1][:CANDIDATES]:
+            if bit_error_rate(prints, self._prints[i]) < MAX_BIT_ERRORS:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self._prints)
+
+
+def bit_error_rate(a, b):
+    """Lowest share of differing bits over time shifts of ``b`` against ``a``"""
+    frames = min(len(a), len(b))
+    best = 1.0
+    for shift in range(-(frames // 2), frames // 2 + 1):
+        if shift >= 0:
+            x, y = a[shift:frames], b[: frames - shift]
+        else:
+            x, y = a[: frames + shift], b[-shift:frames]
+        best = min(best, float(np.mean(x != y)))
+    return best
+
+
+# -----------------------------------------------------------------------------
+# Scoring (worker processes)
+# -----------------------------------------------------------------------------
+
+_models = None
+
+
+def _interpreter_class():
+    """LiteRT, tflite-runtime or full TensorFlow, whichever is installed"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def check_models(model_files):
+    """Raise ValueError unless every model takes openWakeWord embeddings
+
+    The server only loads such models, so mining with a log-mel model would
+    tune the negative set for a model that is never deployed.
+    """
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    Interpreter = _interpreter_class()
+    for model_file in model_files:
+        details = Interpreter(model_path=str(model_file)).get_input_details()[0]
+        shape = [int(d) for d in details["shape"]]
+        if len(shape) != 3 or shape[-1] != EMBEDDING_SIZE:
+            raise ValueError(
+                f"{model_file} takes input of shape {shape}, not openWakeWord "
+                f"embeddings (frames, {EMBEDDING_SIZE}); the server cannot serve it"
+            )
+
+
+def _init_worker(model_files):
+    global _models
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    Interpreter = _interpreter_class()
+
+    _models = []
+    for model_file in model_files:
+        interpreter = Interpreter(model_path=str(model_file), num_threads=1)
+        _models.append(
+            (
+                interpreter,
+                interpreter.get_input_details()[0]["index"],
+                interpreter.get_output_details()[0]["index"],
+            )
+        )
+
+
+def _score(clips):
+    """(windows, models) scores of every candidate model"""
+    features = embedding_batch(clips).astype(np.float32)
+    scores = np.empty((len(clips), len(_models)), dtype=np.float32)
+    for m, (interpreter, input_index, output_index) in enumerate(_models):
+        interpreter.resize_tensor_input(input_index, features.shape)
+        interpreter.allocate_tensors()
+        interpreter.set_tensor(input_index, features)
+        interpreter.invoke()
+        scores[:, m] = interpreter.get_tensor(output_index).reshape(-1)
+    return scores
+
+
+def read_chunk(path, start, length):
+    """Float32 mono 16 kHz audio of ``length`` source samples from ``start``"""
+    rate, data = wavfile.read(str(path), mmap=True)
+    data = data[start : None if length is None else start + length]
+    if data.dtype == np.uint8:
+        audio = (data.astype(np.float32) - 128) / 128
+    elif data.dtype.kind == "i":
+        audio = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        audio = data.astype(np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if rate != SAMPLE_RATE:
+        g = np.gcd(rate, SAMPLE_RATE)
+        audio = resample_poly(audio, SAMPLE_RATE // g, rate // g).astype(np.float32)
+    return audio
+
+
+def _mine_chunk(path, start, length, offset_seconds, threshold):
+    """Worker: windows of one chunk scoring >= ``threshold``, best first
+
+    Hits closer than a window length to a better one are dropped, so one
+    false trigger yields one clip.
+    """
+    audio = read_chunk(path, start, length)
+    if len(audio) < WINDOW:
+        # Short files (spooled clips) are scored once, padded at the start
+        starts = [len(audio) - WINDOW]
+    else:
+        starts = list(range(0, len(audio) - WINDOW + 1, HOP))
+
+    hits = []
+    for i in range(0, len(starts), SCORE_BATCH):
+        batch_starts = starts[i : i + SCORE_BATCH]
+        clips = fit_clips([audio[max(0, s) : s + WINDOW] for s in batch_starts])
+        scores = _score(clips)
+        best = scores.max(axis=1)
+        for j in np.flatnonzero(best >= threshold):
+            hits.append((float(best[j]), batch_starts[j], scores[j], clips[j]))
+
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    kept = []
+    for score, window_start, scores, clip in hits:
+        if all(abs(window_start - k["start"]) >= WINDOW for k in kept):
+            kept.append(
+                {
+                    "start": window_start,
+                    "offset": round(
+                        offset_seconds + max(0, window_start) / SAMPLE_RATE, 3
+                    ),
+                    "score": round(score, 4),
+                    "scores": [round(float(s), 4) for s in scores],
+                    "audio": clip,
+                }
+            )
+    return str(path), kept
+
+
+# -----------------------------------------------------------------------------
+# Mining
+# -----------------------------------------------------------------------------
+
+
+def find_wavs(paths):
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(path.rglob("*.wav")))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+def make_chunks(files, log=print):
+    """(path, start, length, offset seconds) tasks covering every file
+
+    Chunks overlap by one window so no window is lost at a boundary.
+    """
+    chunks = []
+    for path in files:
+        try:
+            rate, data = wavfile.read(str(path), mmap=True)
+        except (OSError, ValueError) as e:
+            log(f"  Skipping {path}: {e}")
+            continue
+        chunk = CHUNK_SECONDS * rate
+        overlap = int(CLIP_SECONDS * rate)
+        for start in range(0, max(1, len(data) - overlap), chunk):
+            chunks.append((path, start, chunk + overlap, start / rate))
+    return chunks
+
+
+def load_index(negative_dir):
+    """Fingerprints of the clips mined in earlier runs"""
+    index = FingerprintIndex()
+    for path in sorted(Path(negative_dir).glob("mined_*.wav")):
+        try:
+            audio = read_chunk(path, 0, None)
+        except (OSError, ValueError):
+            continue
+        index.add(logmel_batch(fit_clips([audio]))[0])
+    return index
+
+
+def mine(
+    model_files, sources, negative_dir, threshold=THRESHOLD, workers=None, log=print
+):
+    """Mine false accepts from ``sources`` into ``negative_dir``
+
+    Returns the number of new clips written. Raises ValueError if a model
+    does not take openWakeWord embeddings.
+    """
+    check_models(model_files)
+    negative_dir = Path(negative_dir)
+    negative_dir.mkdir(parents=True, exist_ok=True)
+    model_names = [Path(m).name for m in model_files]
+
+    files = find_wavs(sources)
+    chunks = make_chunks(files, log)
+    index = load_index(negative_dir)
+    log(
+        f"  Mining {len(files)} files ({len(chunks)} chunks) with {len(model_files)} "
+        f"models at threshold {threshold}; {len(index)} clips already mined"
+    )
+
+    hits = duplicates = written = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(model_files,)
+    ) as pool, open(negative_dir / "mined.jsonl", "a", encoding="utf-8") as provenance:
+        futures = [pool.submit(_mine_chunk, *chunk, threshold) for chunk in chunks]
+        for done, future in enumerate(futures, 1):
+            source, windows = future.result()
+            for window in windows:
+                hits += 1
+                logmel = logmel_batch(window["audio"][None])[0]
+                if index.is_duplicate(logmel):
+                    duplicates += 1
+                    continue
+                index.add(logmel)
+
+                prints = np.packbits(fingerprint(logmel))
+                digest = hashlib.sha256(prints.tobytes()).hexdigest()[:16]
+                output_file = negative_dir / f"mined_{digest}.wav"
+                pcm = np.clip(np.rint(window["audio"] * 32767), -32768, 32767)
+                wavfile.write(str(output_file), SAMPLE_RATE, pcm.astype(np.int16))
+                record = {
+                    "file": output_file.name,
+                    "source": source,
+                    "offset": window["offset"],
+                    "duration": CLIP_SECONDS,
+                    "score": window["score"],
+                    "scores": dict(zip(model_names, window["scores"])),
+                    "threshold": threshold,
+                    "mined_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                provenance.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += 1
+
+            if done % 50 == 0 or done == len(futures):
+                provenance.flush()
+                log(f"  Chunks {done}/{len(futures)}: {hits} hits, {written} new")
+
+    log(f"  Mined {written} new hard negatives ({duplicates} duplicates skipped)")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine hard negatives from long audio")
+    parser.add_argument(
+        "--model", nargs="+", required=True, help="Candidate .tflite models"
+    )
+    parser.add_argument(
+        "--source",
+        nargs="+",
+        required=True,
+        help="WAV files or directories without the wake word",
+    )
+    parser.add_argument(
+        "--negative-dir", default="data/negative", help="Where mined clips go"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=f"Minimum score of a mined window (default: {THRESHOLD})",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Worker processes (default: CPU count)"
+    )
+    args = parser.parse_args()
+
+    try:
+        mine(args.model, args.source, args.negative_dir, args.threshold, args.workers)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
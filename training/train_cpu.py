@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+CPU training of the wake word classifier, resumable and early-stopped
+
+Trains a small 1-D convolutional classifier on the feature dataset built
+by features.py, tuned for a many-core host without a GPU:
+
+  - batches are read from the memory-mapped shards by a pool of loader
+    threads and prefetched while TensorFlow runs the previous step
+  - every batch mixes a fixed fraction of positives (oversampled) with
+    negatives, so no batch is all one class
+  - checkpoints (model, optimizer, epoch and position in the epoch) are
+    written every few minutes, at the end of each epoch and on SIGTERM;
+    rerunning the same command resumes from the latest one
+  - 10% of the sources are held out; after each epoch the false accepts
+    per hour at the threshold reaching TARGET_RECALL on held-out
+    positives is measured, and training stops once it has not improved
+    for PATIENCE epochs
+
+The best epoch's weights are exported as a .tflite model.
+
+Usage:
+    python features.py && python train_cpu.py
+    python train_cpu.py --threads 32 --epochs 200 --restart
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import signal
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from features import FeatureDataset
+
+# Training configuration
+MODEL_NAME = "roberto_lb"
+MAX_EPOCHS = 100
+BATCH_SIZE = 256
+POSITIVE_FRACTION = 0.25  # Share of each batch drawn from positives
+LEARNING_RATE = 1e-3
+PREFETCH_BATCHES = 16
+HOLDOUT_PERCENT = 10
+TARGET_RECALL = 0.9  # Held-out FA/h is measured at this recall
+PATIENCE = 8  # Epochs without improvement before stopping
+CHECKPOINT_MINUTES = 10
+SEED = 1234
+
+
+# -----------------------------------------------------------------------------
+# Data loading
+# -----------------------------------------------------------------------------
+
+
+def split_holdout(dataset, percent=HOLDOUT_PERCENT):
+    """Split sample indices into (train, held-out) by source file
+
+    Augmented copies are grouped with the clip they were made from, so no
+    variant of a held-out recording is ever trained on.
+    """
+    train, holdout = [], []
+    for i, sample in enumerate(dataset.samples):
+        group = sample["info"].get("augmentation", {}).get("source")
+        group = group or Path(sample["source"]).name
+        bucket = zlib.crc32(f"{sample['label']}:{group}".encode()) % 100
+        (holdout if bucket < percent else train).append(i)
+    return np.array(train, dtype=np.int64), np.array(holdout, dtype=np.int64)
+
+
+def dataset_hash(dataset):
+    """Identity of the samples in a dataset, for telling runs apart"""
+    digest = hashlib.sha256()
+    for sample in dataset.samples:
+        digest.update(json.dumps([sample["source"], sample["signature"]]).encode())
+    return digest.hexdigest()
+
+
+class MixedBatchLoader:
+    """Balanced batches read by a thread pool ahead of the training loop
+
+    The batch plan for an epoch depends only on the seed and epoch number,
+    so an interrupted epoch can be resumed at the exact batch it stopped.
+    """
+
+    def __init__(
+        self,
+        dataset,
+        indices,
+        batch_size=BATCH_SIZE,
+        positive_fraction=POSITIVE_FRACTION,
+        threads=4,
+        prefetch=PREFETCH_BATCHES,
+        seed=SEED,
+    ):
+        self.dataset = dataset
+        labels = dataset.labels[indices]
+        self.positives = indices[labels == 1]
+        self.negatives = indices[labels == 0]
+        if len(self.positives) == 0 or len(self.negatives) == 0:
+            raise ValueError("Training needs both positive and negative samples")
+
+        self.positives_per_batch = max(1, round(batch_size * positive_fraction))
+        self.negatives_per_batch = batch_size - self.positives_per_batch
+        self.steps_per_epoch = math.ceil(len(self.negatives) / self.negatives_per_batch)
+        self.prefetch = prefetch
+        self.seed = seed
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="loader")
+
+    def plan(self, epoch):
+        """Index arrays of every batch in ``epoch``"""
+        rng = np.random.default_rng([self.seed, epoch])
+        negatives = rng.permutation(self.negatives)
+        needed = self.steps_per_epoch * self.positives_per_batch
+        positives = np.concatenate(
+            [
+                rng.permutation(self.positives)
+                for _ in range(math.ceil(needed / len(self.positives)))
+            ]
+        )
+
+        batches = []
+        for step in range(self.steps_per_epoch):
+            n = negatives[
+                step * self.negatives_per_batch : (step + 1) * self.negatives_per_batch
+            ]
+            p = positives[
+                step * self.positives_per_batch : (step + 1) * self.positives_per_batch
+            ]
+            batches.append(np.concatenate([p, n]))
+        return batches
+
+    def _read(self, indices):
+        return self.dataset.read(sorted(indices.tolist(), key=self._order))
+
+    def _order(self, i):
+        sample = self.dataset.samples[i]
+        return sample["shard"], sample["row"]
+
+    def epoch(self, epoch, skip=0):
+        """Yield (step, features, labels) from step ``skip`` onwards"""
+        batches = self.plan(epoch)[skip:]
+        pending = deque()
+        for step, indices in enumerate(batches, skip):
+            pending.append((step, self.pool.submit(self._read, indices)))
+            if len(pending) >= self.prefetch:
+                done_step, future = pending.popleft()
+                yield (done_step, *future.result())
+        while pending:
+            done_step, future = pending.popleft()
+            yield (done_step, *future.result())
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+# -----------------------------------------------------------------------------
+# Model and metrics
+# -----------------------------------------------------------------------------
+
+
+def build_model(shape):
+    """1-D convolutions over time, for (frames, features) inputs"""
+    from tensorflow import keras
+
+    inputs = keras.Input(shape=shape, name="features")
+    x = keras.layers.BatchNormalization()(inputs)
+    for filters, kernel in [(64, 5), (96, 5), (128, 3)]:
+        x = keras.layers.Conv1D(filters, kernel, padding="same", use_bias=False)(x)
+        x = keras.layers.BatchNormalization()(x)
+        x = keras.layers.ReLU()(x)
+        x = keras.layers.MaxPooling1D(2)(x)
+    x = keras.layers.GlobalMaxPooling1D()(x)
+    x = keras.layers.Dropout(0.3)(x)
+    x = keras.layers.Dense(64, activation="relu")(x)
+    outputs = keras.layers.Dense(1, activation="sigmoid", name="score")(x)
+    return keras.Model(inputs, outputs, name=MODEL_NAME)
+
+
+def predict(model, dataset, indices, batch_size=1024):
+    scores = []
+    for start in range(0, len(indices), batch_size):
+        features, _ = dataset.read(indices[start : start + batch_size].tolist())
+        scores.append(model(features, training=False).numpy()[:, 0])
+    return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def holdout_metrics(model, dataset, indices, target_recall=TARGET_RECALL):
+    """False accepts per hour at the threshold reaching ``target_recall``
+
+    Each held-out negative counts as one clip-length window of audio.
+    """
+    scores = predict(model, dataset, indices)
+    labels = dataset.labels[indices]
+    positive_scores = scores[labels == 1]
+    negative_scores = scores[labels == 0]
+
+    eps = 1e-7
+    clipped = np.clip(scores, eps, 1 - eps)
+    loss = float(
+        -np.mean(labels * np.log(clipped) + (1 - labels) * np.log(1 - clipped))
+    )
+
+    threshold = float(np.quantile(positive_scores, 1 - target_recall))
+    hours = len(negative_scores) * dataset.manifest["config"]["clip_seconds"] / 3600
+    false_accepts = int(np.sum(negative_scores >= threshold))
+    return {
+        "loss": round(loss, 5),
+        "threshold": round(threshold, 4),
+        "false_accepts": false_accepts,
+        "fa_per_hour": round(false_accepts / hours, 3),
+        "recall_at_0.5": round(float(np.mean(positive_scores >= 0.5)), 4),
+        "fa_per_hour_at_0.5": round(float(np.sum(negative_scores >= 0.5)) / hours, 3),
+    }
+
+
+def export_tflite(model, output_file):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    tmp_file = Path(f"{output_file}.part")
+    tmp_file.write_bytes(converter.convert())
+    os.replace(tmp_file, output_file)
+
+
+# -----------------------------------------------------------------------------
+# Training loop
+# -----------------------------------------------------------------------------
+
+
+def train(
+    features_dir,
+    output_file,
+    work_dir,
+    threads=None,
+    epochs=MAX_EPOCHS,
+    batch_size=BATCH_SIZE,
+    patience=PATIENCE,
+    checkpoint_minutes=CHECKPOINT_MINUTES,
+    restart=False,
+    log=print,
+):
+    """Train, resuming from ``work_dir`` if it holds a checkpoint
+
+    Returns the path of the exported model, or None if training was
+    interrupted before it finished.
+    """
+    threads = threads or os.cpu_count()
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+
+    # Must happen before TensorFlow creates its thread pools
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(2)
+
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    best_weights = work_dir / "best.weights.h5"
+    history_file = work_dir / "history.jsonl"
+    dataset_file = work_dir / "dataset.json"
+
+    dataset = FeatureDataset(features_dir)
+    if dataset.manifest["config"]["kind"] != "embedding":
+        log(
+            f"  WARNING: {dataset.manifest['config']['kind']} features; the wake word "
+            "server can only load models trained on embedding features"
+        )
+    dataset_id = dataset_hash(dataset)
+    train_indices, holdout_indices = split_holdout(dataset)
+    holdout_labels = dataset.labels[holdout_indices]
+    if holdout_labels.min(initial=1) == 1 or holdout_labels.max(initial=0) == 0:
+        raise ValueError("Too few samples to hold out both positives and negatives")
+    loader = MixedBatchLoader(
+        dataset, train_indices, batch_size, threads=max(2, threads // 4)
+    )
+    log(
+        f"  {len(train_indices)} training / {len(holdout_indices)} held-out samples, "
+        f"{loader.steps_per_epoch} steps per epoch, {threads} threads"
+    )
+
+    model = build_model(dataset.shape)
+    optimizer = tf.keras.optimizers.Adam(LEARNING_RATE)
+    model.compile(optimizer=optimizer, loss="binary_crossentropy")
+
+    state = {
+        "epoch": tf.Variable(0, dtype=tf.int64),
+        "step": tf.Variable(0, dtype=tf.int64),  # Next step within the epoch
+        "best_fa": tf.Variable(np.inf, dtype=tf.float64),
+        "best_loss": tf.Variable(np.inf, dtype=tf.float64),
+        "bad_epochs": tf.Variable(0, dtype=tf.int64),
+    }
+    checkpoint = tf.train.Checkpoint(model=model, optimizer=optimizer, **state)
+    manager = tf.train.CheckpointManager(
+        checkpoint, work_dir / "checkpoints", max_to_keep=3
+    )
+    if manager.latest_checkpoint and not restart and dataset_file.is_file():
+        # Checkpoints of another dataset (e.g. before hard-negative mining)
+        # would resume with a different split and batch plan
+        if json.loads(dataset_file.read_text())["hash"] != dataset_id:
+            log("  Feature dataset changed since the last run, starting over")
+            restart = True
+    dataset_file.write_text(json.dumps({"hash": dataset_id}))
+
+    if manager.latest_checkpoint and not restart:
+        # Build the optimizer's slots so they are restored, not deferred
+        optimizer.build(model.trainable_variables)
+        checkpoint.restore(manager.latest_checkpoint).expect_partial()
+        log(
+            f"  Resumed from {manager.latest_checkpoint} "
+            f"(epoch {int(state['epoch']) + 1}, step {int(state['step'])})"
+        )
+    elif restart:
+        history_file.unlink(missing_ok=True)
+
+    stop_requested = []
+    previous_handler = signal.signal(
+        signal.SIGTERM, lambda *_: stop_requested.append(1)
+    )
+
+    try:
+        last_save = time.monotonic()
+        while int(state["epoch"]) < epochs and int(state["bad_epochs"]) < patience:
+            epoch = int(state["epoch"])
+            started = time.monotonic()
+            losses = []
+
+            for step, features, labels in loader.epoch(epoch, skip=int(state["step"])):
+                losses.append(float(model.train_on_batch(features, labels)))
+                state["step"].assign(step + 1)
+
+                if stop_requested:
+                    manager.save()
+                    log(
+                        f"  Stopped at epoch {epoch + 1} step {step + 1}; rerun to resume"
+                    )
+                    return None
+                if time.monotonic() - last_save > checkpoint_minutes * 60:
+                    manager.save()
+                    last_save = time.monotonic()
+
+            metrics = holdout_metrics(model, dataset, holdout_indices)
+            improved = (metrics["fa_per_hour"], metrics["loss"]) < (
+                float(state["best_fa"]),
+                float(state["best_loss"]),
+            )
+            if improved:
+                state["best_fa"].assign(metrics["fa_per_hour"])
+                state["best_loss"].assign(metrics["loss"])
+                state["bad_epochs"].assign(0)
+                model.save_weights(best_weights)
+            else:
+                state["bad_epochs"].assign_add(1)
+
+            record = {
+                "epoch": epoch + 1,
+                "train_loss": round(float(np.mean(losses)), 5) if losses else None,
+                "seconds": round(time.monotonic() - started, 1),
+                **metrics,
+            }
+            with open(history_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            log(
+                f"  Epoch {epoch + 1}/{epochs}: loss {record['train_loss']}, held-out "
+                f"{metrics['fa_per_hour']} FA/h at {TARGET_RECALL:.0%} recall "
+                f"(threshold {metrics['threshold']}){' *' if improved else ''}"
+            )
+
+            state["epoch"].assign_add(1)
+            state["step"].assign(0)
+            manager.save()
+            last_save = time.monotonic()
+
+        if int(state["bad_epochs"]) >= patience:
+            log(f"  Early stop: no held-out improvement for {patience} epochs")
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        loader.close()
+
+    if best_weights.is_file():
+        model.load_weights(best_weights)
+    export_tflite(model, output_file)
+    log(f"  Best held-out FA/h: {float(state['best_fa'])}")
+    return str(output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the wake word model on CPU")
+    parser.add_argument("--features", default="data/features", help="Feature dataset")
+    parser.add_argument(
+        "--output", default=f"models/{MODEL_NAME}.tflite", help="Exported model"
+    )
+    parser.add_argument(
+        "--work-dir",
+        default=f"checkpoints/{MODEL_NAME}",
+        help="Checkpoints and training history",
+    )
+    parser.add_argument(
+        "--threads", type=int, help="TensorFlow threads (default: CPUs)"
+    )
+    parser.add_argument("--epochs", type=int, default=MAX_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--patience", type=int, default=PATIENCE)
+    parser.add_argument(
+        "--checkpoint-minutes",
+        type=float,
+        default=CHECKPOINT_MINUTES,
+        help=f"Minutes between mid-epoch checkpoints (default: {CHECKPOINT_MINUTES})",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore existing checkpoints"
+    )
+    args = parser.parse_args()
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    model_file = train(
+        args.features,
+        args.output,
+        args.work_dir,
+        threads=args.threads,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        patience=args.patience,
+        checkpoint_minutes=args.checkpoint_minutes,
+        restart=args.restart,
+    )
+    if model_file:
+        print(f"Model written to {model_file}")
+
+
+if __name__ == "__main__":
+    main()
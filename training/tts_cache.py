@@ -0,0 +1,170 @@
+"""
+Content-addressed on-disk cache for TTS responses
+
+Entries are keyed by a SHA-256 of the normalized request parameters
+(text, quantized speed, voice, language, variant) and stored under
+objects/<2 hex>/<key>. An index.json records each entry's size, content
+hash, parameters and last use; the least recently used entries are
+evicted when the cache grows beyond its size bound, and an entry whose
+content no longer matches its hash is dropped on read.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+SPEED_STEP = 0.05  # Speeds are rounded to this grid before keying
+INDEX_SAVE_INTERVAL = 50  # Index writes are batched to every N changes
+
+
+def quantize_speed(speed, step=SPEED_STEP):
+    """Round a speed to the cache grid, so nearby speeds share entries"""
+    return round(round(speed / step) * step, 4)
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def request_key(text, speed, voice=None, language=None, variant=0):
+    """Cache key for a TTS request"""
+    params = {
+        "text": normalize_text(text),
+        "speed": quantize_speed(speed),
+        "voice": voice or "",
+        "language": language or "",
+        "variant": variant,
+    }
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest(), params
+
+
+class TTSCache:
+    """Size-bounded LRU cache of TTS audio, safe to share between threads"""
+
+    def __init__(self, directory, max_bytes=2 * 1024**3):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        self.index_file = self.directory / "index.json"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._index = self._load_index()
+        self.total_bytes = sum(entry["size"] for entry in self._index.values())
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        # Drop entries whose object file went missing or changed size
+        return {
+            key: entry
+            for key, entry in index.items()
+            if self._object_path(key).is_file()
+            and self._object_path(key).stat().st_size == entry["size"]
+        }
+
+    def _object_path(self, key):
+        return self.objects_dir / key[:2] / key
+
+    def get(self, key):
+        """Cached audio for ``key``, or None on a miss or a corrupt entry"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+        try:
+            data = self._object_path(key).read_bytes()
+        except OSError:
+            data = None
+
+        with self._lock:
+            if data is None or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self._mark_dirty()
+        return data
+
+    def put(self, key, data, params=None):
+        """Store audio for ``key``, evicting least recently used entries"""
+        path = self._object_path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.part")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._index.get(key)
+            if old is not None:
+                self.total_bytes -= old["size"]
+            self._index[key] = {
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "last_used": time.time(),
+                "params": params or {},
+            }
+            self.total_bytes += len(data)
+            self._evict()
+            self._mark_dirty()
+
+    def discard(self, key):
+        """Drop ``key``, e.g. when its audio turned out to be unusable"""
+        with self._lock:
+            if key in self._index:
+                self._remove(key)
+                self._mark_dirty()
+
+    def _remove(self, key):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+        try:
+            self._object_path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+
+    def _mark_dirty(self):
+        self._dirty += 1
+        if self._dirty >= INDEX_SAVE_INTERVAL:
+            self._save_index()
+
+    def _save_index(self):
+        tmp_file = self.index_file.with_suffix(".json.part")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+        self._dirty = 0
+
+    def flush(self):
+        """Write the index to disk"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def __len__(self):
+        return len(self._index)